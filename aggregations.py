@@ -0,0 +1,92 @@
+# ======================================================
+# MOTEUR D'AGRÉGATION VECTORISÉ (siren distincts, fermetures, survie)
+# ======================================================
+#
+# Remplace les `agg(nb_total=("siren", lambda s: s.dropna().nunique()), ...)`
+# des ventilations par ancienneté / effectif : une seule passe par dimension.
+#   1. chaque ligne reçoit un numéro de cellule (codes catégoriels combinés) ;
+#   2. lignes et indicateurs (fermée, survivante) : np.bincount ;
+#   3. siren distincts : tri unique des clés 64 bits (cellule << 32 | siren),
+#      détection des ruptures entre voisins, puis np.bincount sur les cellules.
+# Sémantique identique au groupby(dropna=False, observed=True) : la modalité
+# manquante forme sa propre cellule, les cellules vides sont omises.
+# Option `precision` : croquis HyperLogLog des siren de chaque cellule
+# (sketch.py), fusionnables entre blocs de données.
+
+import numpy as np
+import pandas as pd
+
+from sketch import sketch_cells, to_bytes
+
+
+def _codes(s: pd.Series):
+    """Codes entiers ≥ 0 d'une dimension ; le dernier code est réservé aux NaN."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy().astype(np.int64)
+        categories = s.cat.categories
+    else:
+        codes, categories = pd.factorize(s, sort=True)
+        codes = codes.astype(np.int64)
+    codes[codes < 0] = len(categories)
+    return codes, categories
+
+
+def _decode(s: pd.Series, codes: np.ndarray, categories) -> pd.Series:
+    """Valeurs de dimension à partir des codes (le code NaN redevient manquant)."""
+    missing = codes == len(categories)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return pd.Series(pd.Categorical.from_codes(np.where(missing, -1, codes), dtype=s.dtype), name=s.name)
+    values = pd.Series(categories.take(np.where(missing, 0, codes)) if len(categories) else
+                       np.full(len(codes), np.nan), name=s.name)
+    return values.where(~missing) if missing.any() else values
+
+
+def aggregate(dims, siren: pd.Series, flag: pd.Series = None, precision: int = None) -> pd.DataFrame:
+    """
+    Une ligne par cellule observée de `dims` (Series ou liste de Series) :
+    - nb_siren : siren distincts de la cellule,
+    - nb_lignes : nombre de lignes,
+    - nb_flag : somme de `flag` (booléen/0-1), ex. lignes fermées ou survivantes,
+    - hll_siren (si `precision`) : croquis HyperLogLog des siren, en octets.
+    """
+    if isinstance(dims, pd.Series):
+        dims = [dims]
+    cell = np.zeros(len(siren), dtype=np.int64)
+    decoders = []
+    stride = 1
+    for s in reversed(dims):
+        codes, categories = _codes(s)
+        cell += codes * stride
+        decoders.insert(0, (s, categories, stride, len(categories) + 1))
+        stride *= len(categories) + 1
+
+    nb_lignes = np.bincount(cell, minlength=stride)
+    nb_flag = (np.bincount(cell, weights=np.asarray(flag, dtype=np.float64), minlength=stride)
+               if flag is not None else np.zeros(stride))
+
+    # Couples (cellule, siren) distincts : tri des clés 64 bits puis ruptures
+    keys = np.sort((cell << 32) | siren.to_numpy().astype(np.int64))
+    first = np.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    nb_siren = np.bincount(keys[first] >> 32, minlength=stride)
+
+    observed = np.flatnonzero(nb_lignes)
+    out = {}
+    for s, categories, step, size in decoders:
+        out[s.name] = _decode(s, (observed // step) % size, categories)
+    out = pd.DataFrame(out)
+    out["nb_siren"] = nb_siren[observed]
+    out["nb_lignes"] = nb_lignes[observed]
+    out["nb_flag"] = nb_flag[observed].round().astype(np.int64)
+    if precision is not None:
+        registers = sketch_cells(np.searchsorted(observed, cell), siren.to_numpy(), len(observed), precision)
+        out["hll_siren"] = [to_bytes(r) for r in registers]
+    return out
+
+
+def rate(num, den) -> np.ndarray:
+    """Taux en % (NaN si dénominateur nul)."""
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(den > 0, 100 * num / den, np.nan)
@@ -0,0 +1,506 @@
+# ======================================================
+# CALCULS DES PARTIES 1 À 4 (SANS STREAMLIT)
+# ======================================================
+#
+# Fonctions pures partagées par le dashboard (app.py : affichage et mise en
+# cache) et par le mode rapport en ligne de commande (main.py). Entrées : cube
+# d'agrégats, cohorte chargée (DataFrame), tables d'aides ; sorties : KPI
+# (dict) et tables (DataFrame) prêtes à tracer ou à exporter.
+
+import numpy as np
+import pandas as pd
+
+from aggregations import rate
+from aides import aid_by_measure, aid_intensity
+from asof import cohort_as_of
+from causal import COVARIATES, estimate_effect
+from cube import view
+from geo import DEPARTEMENT, DEPARTEMENTS
+from inference import DEFAULT_RESAMPLES, DEFAULT_SEED, resampling_summary
+from mesures import explode_measures, measure_breakdown
+from naf import NAF_COLUMN, NOMENCLATURE_COLUMN, rollup
+from schema import age_bins, tranche_labels
+from stratified import STRATA, stratified_tests
+from survival import cohort_kaplan_meier, reference_dates
+
+# Colonnes lues par la Partie 4 (projection, + Survie_<h>m) ; les Parties 1 et 2 lisent le cube.
+# La nomenclature accompagne le code APE : section NAF des strates (rév. 1 et rév. 2 mêlées)
+COLS_TEST = ("siren", "annee", "categorieEntreprise", "trancheEffectifsUniteLegale", NAF_COLUMN, NOMENCLATURE_COLUMN)
+# Seuils de décision proposés (Partie 4)
+ALPHAS = (0.01, 0.05, 0.10)
+
+
+def read_aides_etat(path: str = "df_participationEtat.csv") -> pd.DataFrame:
+    """Table des aides de l'État par catégorie (ou par projet), colonnes harmonisées."""
+    dfa = pd.read_csv(path)
+    # Renommer pour harmoniser
+    rename_map = {
+        "Somme de MONTANT_PARTICIPATION_ETAT": "montant_participation_etat",
+        "MONTANT_PARTICIPATION_ETAT": "montant_participation_etat",  # export par projet
+        "MESURE_LIGHT": "mesure_light",
+        "MESURE": "mesure",
+    }
+    dfa = dfa.rename(columns=rename_map)
+
+    # Nettoyage minimal
+    if "montant_participation_etat" not in dfa.columns:
+        raise ValueError("La colonne 'Somme de MONTANT_PARTICIPATION_ETAT' doit être présente.")
+    dfa["montant_participation_etat"] = pd.to_numeric(
+        dfa["montant_participation_etat"], errors="coerce"
+    ).fillna(0.0)
+
+    for col in ["categorieEntreprise", "mesure", "mesure_light"]:
+        if col in dfa.columns:
+            dfa[col] = dfa[col].astype(str).str.strip()
+
+    return dfa
+
+
+def gini_index(values) -> float:
+    """Indice de Gini de montants positifs (NaN si moins de 2 valeurs)."""
+    x = np.sort(np.asarray(values, dtype=float))
+    n = len(x)
+    if n < 2 or x.sum() <= 0:
+        return np.nan
+    return float((2 * np.arange(1, n + 1) - n - 1) @ x / (n * x.sum()))
+
+
+def select_cohort(df: pd.DataFrame, annee: int, events=None) -> pd.DataFrame:
+    """
+    Cohorte `annee` : une ligne par siren observé cette année-là ; avec l'index
+    as-of (historique), état, catégorie, tranche et ancienneté au 31/12/annee.
+    """
+    cohort = df.loc[df["annee"] == annee].dropna(subset=["siren"]).drop_duplicates(subset=["siren"])
+    return cohort_as_of(events, cohort, annee)
+
+
+# --------------------------------------------
+# Partie 1 — Fermetures (cube)
+# --------------------------------------------
+def closures(cube: pd.DataFrame) -> dict:
+    """KPI de fermeture et taux par catégorie, année, ancienneté et tranche d'effectif."""
+    glob = view(cube, "global")
+    nb_total = int(glob["nb_siren"].sum())
+    nb_fermees = int(glob["nb_siren_fermees"].sum())
+    out = {"kpi": {"nb_total": nb_total, "nb_fermees": nb_fermees,
+                   "taux_fermeture": (nb_fermees / nb_total * 100) if nb_total else 0.0}}
+
+    ferm_cat = view(cube, "categorie")
+    if not ferm_cat.empty:
+        ferm_cat = (
+            ferm_cat[["categorieEntreprise", "nb_siren_fermees"]]
+                    .rename(columns={"nb_siren_fermees": "nb_fermees"})
+                    .sort_values("nb_fermees", ascending=False)
+        )
+    out["par_categorie"] = ferm_cat
+
+    ferm = view(cube, "annee_etat").rename(columns={"nb_lignes": "count"})
+    if not ferm.empty:
+        totaux = ferm.groupby("annee")["count"].sum().reset_index(name="total")
+        ferm = ferm[["annee", "etatAdministratifUniteLegale", "count"]].merge(totaux, on="annee", how="left")
+        ferm["taux_fermeture"] = np.where(ferm["total"] > 0, 100 * ferm["count"] / ferm["total"], np.nan)
+        ferm = ferm[ferm["etatAdministratifUniteLegale"] == "C"].sort_values("annee")
+    out["par_annee"] = ferm
+
+    for key, name, order in (("par_anciennete", "age", None), ("par_tranche", "tranche", "trancheEffectifs_label")):
+        table = view(cube, name).rename(columns={"nb_siren": "nb_total"})
+        if not table.empty:
+            table["taux_fermeture"] = np.where(table["nb_total"] > 0, 100 * table["nb_fermees"] / table["nb_total"], np.nan)
+            if order:
+                table = table.sort_values(order)
+        out[key] = table
+    return out
+
+
+# --------------------------------------------
+# Partie 2 — Survie de la cohorte (cube)
+# --------------------------------------------
+def cohort_cells(cube: pd.DataFrame, name: str, annee: int, horizon: int) -> pd.DataFrame:
+    """Cellules d'une vue « cohorte_* » pour une année de cohorte et un horizon."""
+    out = view(cube, name)
+    keep = (out["annee"] == annee) & (out["horizon"] == horizon)
+    return out.loc[keep].drop(columns=["annee", "horizon"]).reset_index(drop=True)
+
+
+def is_censored(cube: pd.DataFrame, annee: int, horizon: int) -> bool:
+    """Horizon au-delà de la fin des données : survie non encore observable (censure)."""
+    annee_max = view(cube, "annee_etat")["annee"].max()
+    return bool(pd.notna(annee_max) and
+                reference_dates([annee], horizon)[0] > np.datetime64(f"{int(annee_max)}-12-31"))
+
+
+def cohort_survival(cube: pd.DataFrame, annee: int, horizon: int) -> dict:
+    """KPI de survie de la cohorte et taux par catégorie, ancienneté et tranche d'effectif."""
+    cohort = cohort_cells(cube, "cohorte", annee, horizon)
+    out = {"disponible": not (cohort.empty and "cohorte" not in set(cube["vue"])),
+           "censure": is_censored(cube, annee, horizon)}
+    nb_cohorte = int(cohort["nb_siren"].sum())
+    nb_survivantes = int(cohort["nb_survivantes"].sum())
+    out["kpi"] = {"nb_cohorte": nb_cohorte, "nb_survivantes": nb_survivantes,
+                  "taux_survie": nb_survivantes / int(cohort["nb_lignes"].sum()) * 100 if nb_cohorte else np.nan}
+
+    par_cat = cohort_cells(cube, "cohorte_categorie", annee, horizon)
+    if not par_cat.empty:
+        par_cat = par_cat.assign(taux_survie=100 * par_cat["nb_survivantes"] / par_cat["nb_lignes"])
+    out["par_categorie"] = par_cat
+
+    par_age = cohort_cells(cube, "cohorte_age", annee, horizon).dropna(subset=["age_bin"])
+    if not par_age.empty:
+        par_age = par_age.rename(columns={"nb_siren": "nb_total"})
+        par_age["taux_survie"] = 100 * par_age["nb_survivantes"] / par_age["nb_lignes"]
+    out["par_anciennete"] = par_age
+
+    par_eff = cohort_cells(cube, "cohorte_tranche", annee, horizon)
+    if not par_eff.empty:
+        par_eff = par_eff.rename(columns={"nb_siren": "nb_total"}).sort_values("trancheEffectifs_label")
+        par_eff["taux_survie"] = 100 * par_eff["nb_survivantes"] / par_eff["nb_lignes"]
+    out["par_tranche"] = par_eff
+    return out
+
+
+# --------------------------------------------
+# Partie 2 ter — Secteurs d'activité (NAF, cube)
+# --------------------------------------------
+def sector_rates(cube: pd.DataFrame, annee: int, horizon: int, level: str = "section",
+                 parents: dict = None) -> pd.DataFrame:
+    """
+    Taux de fermeture (lignes siren × année fermées, toutes années) et taux de
+    survie de la cohorte par code NAF au niveau `level`, sommés depuis les
+    classes du cube ; `parents` restreint au sous-arbre ({"nomenclature": …, "section": …}).
+    """
+    keys = ["nomenclature", level]
+    ferm = rollup(view(cube, "naf"), level, parents, ["nb_lignes", "nb_fermees"])
+    surv = (rollup(cohort_cells(cube, "cohorte_naf", annee, horizon), level, parents, ["nb_lignes", "nb_survivantes"])
+              .rename(columns={"nb_lignes": "nb_cohorte"}))
+    out = ferm.merge(surv, on=keys, how="outer").fillna(0)
+    for col in ("nb_lignes", "nb_fermees", "nb_cohorte", "nb_survivantes"):
+        out[col] = out[col].astype("int64")
+    out["taux_fermeture"] = rate(out["nb_fermees"], out["nb_lignes"])
+    out["taux_survie"] = rate(out["nb_survivantes"], out["nb_cohorte"])
+    return out.sort_values(keys, ignore_index=True)
+
+
+# --------------------------------------------
+# Partie 2 quater — Départements du siège (cube)
+# --------------------------------------------
+def department_rates(cube: pd.DataFrame, annee: int, horizon: int) -> pd.DataFrame:
+    """
+    Taux de fermeture (toutes années) et de survie de la cohorte par département
+    du siège, avec nom et coordonnées du chef-lieu (carte) ; vide sans géographie.
+    """
+    ferm = view(cube, "departement").groupby(DEPARTEMENT)[["nb_lignes", "nb_fermees"]].sum()
+    surv = (cohort_cells(cube, "cohorte_departement", annee, horizon)
+              .groupby(DEPARTEMENT)[["nb_lignes", "nb_survivantes"]].sum()
+              .rename(columns={"nb_lignes": "nb_cohorte"}))
+    out = ferm.join(surv, how="outer").fillna(0).astype("int64").reset_index()
+    out["taux_fermeture"] = rate(out["nb_fermees"], out["nb_lignes"])
+    out["taux_survie"] = rate(out["nb_survivantes"], out["nb_cohorte"])
+    infos = out[DEPARTEMENT].map(DEPARTEMENTS)
+    out["nom"] = infos.str[0]
+    out["lat"] = infos.str[1]
+    out["lon"] = infos.str[2]
+    return out.sort_values(DEPARTEMENT, ignore_index=True)
+
+
+# --------------------------------------------
+# Partie 2 bis — Kaplan–Meier
+# --------------------------------------------
+def km_strata(df: pd.DataFrame, dimension: str):
+    """Strate de chaque siren pour une dimension de stratification (None si indisponible)."""
+    if dimension == "age_bin" and "anciennete" in df.columns:
+        return age_bins(df["anciennete"])
+    if dimension == "trancheEffectifs_label" and "trancheEffectifsUniteLegale" in df.columns:
+        eff = df["trancheEffectifsUniteLegale"]
+        return tranche_labels(eff).where(~eff.isin(["NN", "00"]))
+    if dimension in df.columns:
+        return df[dimension]
+    return None
+
+
+def cohort_km(events, df: pd.DataFrame, annee: int, dimension: str) -> pd.DataFrame:
+    """Courbes de Kaplan–Meier de la cohorte `annee` (index as-of `events`), par strate."""
+    df = select_cohort(df, annee, events)
+    strata = km_strata(df, dimension)
+    if strata is None:
+        return pd.DataFrame()
+    return cohort_kaplan_meier(events.events, df["siren"], annee, strata)
+
+
+def km_table(km: pd.DataFrame, horizons) -> pd.DataFrame:
+    """Survie (%) lue sur les courbes aux horizons usuels (dernier mois observé ≤ horizon)."""
+    points = [h for h in horizons if h <= km["mois"].max()] if not km.empty else []
+    if not points:
+        return pd.DataFrame()
+    return (
+        km.loc[km["mois"].isin(points)]
+          .assign(survie_pct=lambda t: 100 * t["survie"])
+          .pivot_table(index="strate", columns="mois", values="survie_pct", observed=True)
+          .rename(columns=lambda m: f"{m} mois")
+    )
+
+
+# --------------------------------------------
+# Partie 3 — Aides de l'État
+# --------------------------------------------
+def aid_by_category(dfa: pd.DataFrame) -> dict:
+    """Total, concentration (Top-3, Gini) et répartition par catégorie ({} sans catégorie)."""
+    if "categorieEntreprise" not in dfa.columns:
+        return {}
+    cat_agg = (
+        dfa.groupby("categorieEntreprise", dropna=False)["montant_participation_etat"]
+           .sum()
+           .reset_index(name="participation_etat")
+           .sort_values("participation_etat", ascending=False)
+    )
+    total_etat = float(cat_agg["participation_etat"].sum())
+    top3_share = (100 * cat_agg.head(3)["participation_etat"].sum() / total_etat) if total_etat > 0 else np.nan
+    gini = gini_index(cat_agg["participation_etat"].values)
+    cat_agg["part_%"] = 100 * cat_agg["participation_etat"] / total_etat if total_etat else 0.0
+    return {"kpi": {"total": total_etat, "top3_%": top3_share, "gini": gini}, "par_categorie": cat_agg}
+
+
+def aid_measures(dfa: pd.DataFrame) -> dict:
+    """MESURE / MESURE_LIGHT concaténés → une ligne par catégorie × mesure, puis ventilation."""
+    if dfa is None or dfa.empty or not {"mesure", "mesure_light"} & set(dfa.columns):
+        return {}
+    return measure_breakdown(explode_measures(dfa))
+
+
+def cohort_with_aid(df: pd.DataFrame, annee: int, col_survie: str, aid_index, events=None) -> pd.DataFrame:
+    """Cohorte (une ligne par SIREN) + aide reçue par chaque entreprise (jointure indexée)."""
+    cohort = select_cohort(df, annee, events)
+    cohort = cohort[[c for c in ("siren", *STRATA, NOMENCLATURE_COLUMN, col_survie) if c in cohort.columns]].copy()
+    cohort["intensite_par_entreprise"] = aid_intensity(aid_index, cohort["siren"])
+    cohort.attrs["memoire"] = df.attrs.get("memoire")
+    return cohort
+
+
+def aid_summary_siren(cohort: pd.DataFrame, aid_index, col_survie: str) -> dict:
+    """Agrégats de la cohorte à partir de l'aide reçue par chaque entreprise (niveau SIREN)."""
+    aide = cohort["intensite_par_entreprise"].to_numpy()
+    aidee = aide > 0
+    res = {"nb": len(cohort), "nb_aidees": int(aidee.sum()), "total": float(aide.sum()),
+           "gini": gini_index(aide[aidee]),
+           "par_mesure": aid_by_measure(aid_index, cohort["siren"]).rename_axis("mesure").reset_index()}
+    if "categorieEntreprise" in cohort.columns:
+        res["par_categorie"] = (
+            cohort.assign(aidee=aidee)
+                  .groupby("categorieEntreprise", observed=True)
+                  .agg(participation_etat=("intensite_par_entreprise", "sum"), nb_aidees=("aidee", "sum"))
+                  .reset_index()
+                  .sort_values("participation_etat", ascending=False)
+        )
+    if col_survie in cohort.columns:
+        res["survie"] = (
+            cohort.assign(statut=np.where(aidee, "Aidée", "Non aidée"))
+                  .groupby("statut")[col_survie]
+                  .agg(["size", "mean"])
+                  .rename(columns={"size": "nb", "mean": "taux_survie_%"})
+                  .assign(**{"taux_survie_%": lambda t: 100 * t["taux_survie_%"]})
+                  .reset_index()
+        )
+    return res
+
+
+# --------------------------------------------
+# Partie 4 — Test Chi² / Fisher
+# --------------------------------------------
+def prepare_test(df_test: pd.DataFrame, annee: int, col_survie: str, dfa: pd.DataFrame = None,
+                 aid_index=None, n_resamples: int = DEFAULT_RESAMPLES, events=None) -> dict:
+    """
+    Tout ce qui ne dépend pas de α : groupes d'intensité, table de contingence,
+    test asymptotique / exact et rééchantillonnage. `etape` indique où le calcul
+    s'est arrêté (« ok » s'il est complet).
+    """
+    if aid_index is not None:
+        # Intensité individuelle : aide reçue par chaque SIREN (fichier des lauréats)
+        base = cohort_with_aid(df_test, annee, col_survie, aid_index, events)
+        res = {"memoire": base.attrs.get("memoire"), "etape": "donnees", "niveau": "siren"}
+        if col_survie not in base.columns:
+            return res
+        res["etape"] = "intensite"
+        if base.empty:
+            return res
+        return run_test(res, base, col_survie, make_groups_siren, n_resamples, STRATA)
+
+    res = {"memoire": df_test.attrs.get("memoire"), "etape": "donnees", "niveau": "categorie"}
+    need_cols = {"siren", "annee", col_survie, "categorieEntreprise"}
+    if dfa is None or dfa.empty or not need_cols.issubset(df_test.columns):
+        return res
+
+    # 5.0 Cohorte sélectionnée (une ligne par SIREN)
+    cohort = select_cohort(df_test, annee, events)
+    cohort = cohort[[c for c in ("siren", *STRATA, NOMENCLATURE_COLUMN, col_survie) if c in cohort.columns]].copy()
+    res["etape"] = "cohorte"
+    if cohort.empty:
+        return res
+
+    # 5.1 Intensité d'aide par entreprise (au niveau catégorie)
+    res["etape"] = "aides"
+    if "categorieEntreprise" not in dfa.columns or "montant_participation_etat" not in dfa.columns:
+        return res
+    aides_cat = (
+        dfa.groupby("categorieEntreprise", dropna=False)["montant_participation_etat"]
+           .sum()
+           .reset_index(name="participation_etat")
+    )
+    # Nb d'entreprises par catégorie l'année de cohorte
+    nb_cat_cohorte = cohort.groupby("categorieEntreprise", observed=True)["siren"].nunique().reset_index(name="nb_cohorte")
+
+    # Jointure et intensité moyenne par entreprise (catégorie)
+    mix = aides_cat.merge(nb_cat_cohorte, on="categorieEntreprise", how="inner")
+    mix["intensite_par_entreprise"] = np.where(
+        mix["nb_cohorte"] > 0, mix["participation_etat"] / mix["nb_cohorte"], np.nan
+    )
+
+    # 5.2 Joindre l'intensité à chaque SIREN (via sa catégorie)
+    base = cohort.merge(
+        mix[["categorieEntreprise", "intensite_par_entreprise"]],
+        on="categorieEntreprise", how="left"
+    )
+    base = base.dropna(subset=["intensite_par_entreprise"]).copy()
+    res["etape"] = "intensite"
+    if base.empty:
+        return res
+    # Intensité constante dans une catégorie : strates sans la catégorie
+    strata = tuple(d for d in STRATA if d != "categorieEntreprise")
+    return run_test(res, base, col_survie, make_groups_auto, n_resamples, strata)
+
+
+def run_test(res: dict, base: pd.DataFrame, col_survie: str, make_groups,
+             n_resamples: int = DEFAULT_RESAMPLES, strata=STRATA) -> dict:
+    # 5.3 Groupes d'intensité
+    grouped, meta = make_groups(base)
+    res["etape"] = "groupes"
+    if grouped["groupe_intensite"].nunique() < 2:
+        return res
+    res["etape"] = "ok"
+    res["methode"] = meta["method"]
+
+    # 5.4 Table de contingence et taux par groupe
+    tab = pd.crosstab(grouped["groupe_intensite"], grouped[col_survie]).sort_index()
+    res["tab"] = tab
+    res["surv_by_group"] = grouped.groupby("groupe_intensite", observed=True)[col_survie].mean().mul(100).reset_index(name="taux_survie_%")
+
+    # 5.5 Test du Chi² (ou Fisher si 2×2)
+    try:
+        from scipy.stats import chi2_contingency, fisher_exact
+        res["scipy"] = True
+    except Exception:
+        res["scipy"] = False
+    if res["scipy"]:
+        if tab.shape == (2, 2):
+            # Test exact de Fisher si 2 groupes × 2 issues
+            oddsratio, p_fisher = fisher_exact(tab.values)
+            res["test"] = {"nom": "fisher", "p_value": float(p_fisher), "oddsratio": oddsratio}
+        else:
+            chi2, p, dof, expected = chi2_contingency(tab.values)
+            res["test"] = {"nom": "chi2", "p_value": float(p), "chi2": chi2, "ddl": dof,
+                           "attendus": pd.DataFrame(expected, index=tab.index, columns=tab.columns)}
+
+    # 5.6 Permutation (p-value) et bootstrap (IC des taux) — sans hypothèse asymptotique
+    res["permutation"], res["ic_taux"] = resampling_summary(tab, n_resamples=n_resamples, seed=DEFAULT_SEED)
+
+    # 5.7 Même test dans chaque strate (catégorie × tranche × section NAF), par lots + CMH et Benjamini–Hochberg
+    res["stratifie"] = stratified_tests(grouped, col_survie, strata)
+    return res
+
+
+def make_groups_auto(df_base: pd.DataFrame):
+    """
+    Tente un binning par quantiles 4 → 3 → 2.
+    En dernier recours, split binaire par médiane (High vs Low).
+    Retourne df_grouped avec 'groupe_intensite' et une info 'method'.
+    """
+    df = df_base.copy()
+
+    # Tentatives quantiles
+    for q in [4, 3, 2]:
+        try:
+            df["groupe_intensite"] = pd.qcut(
+                df["intensite_par_entreprise"], q=q, duplicates="drop"
+            )
+            if df["groupe_intensite"].nunique() >= 2:
+                return df, {"method": f"quantiles_{q}"}
+        except Exception:
+            # Fallback sur cut si qcut échoue
+            try:
+                df["groupe_intensite"] = pd.cut(
+                    df["intensite_par_entreprise"], bins=q, include_lowest=True
+                )
+                if df["groupe_intensite"].nunique() >= 2:
+                    return df, {"method": f"cut_{q}"}
+            except Exception:
+                pass
+
+    # Dernier recours : split médian
+    med = np.nanmedian(df_base["intensite_par_entreprise"])
+    df_base = df_base.copy()
+    df_base["groupe_intensite"] = np.where(
+        df_base["intensite_par_entreprise"] <= med, "Low (≤ médiane)", "High (> médiane)"
+    )
+    if df_base["groupe_intensite"].nunique() >= 2:
+        return df_base, {"method": "median_split"}
+
+    return df_base, {"method": "failed"}
+
+
+def make_groups_siren(df_base: pd.DataFrame):
+    """
+    Intensités individuelles (niveau SIREN) : groupe « Non aidée » (aide nulle)
+    + groupes de quantiles (make_groups_auto) parmi les entreprises aidées.
+    """
+    aidee = df_base["intensite_par_entreprise"] > 0
+    groupes = pd.Series("Non aidée", index=df_base.index, dtype=object)
+    ordre = ["Non aidée"]
+    method = "non_aidees"
+    if aidee.sum() >= 2:
+        grouped, meta = make_groups_auto(df_base.loc[aidee])
+        g = grouped["groupe_intensite"]
+        if isinstance(g.dtype, pd.CategoricalDtype):
+            # Intervalles de montants → libellés en k€, dans l'ordre croissant
+            labels = {iv: f"{iv.left / 1e3:,.0f} – {iv.right / 1e3:,.0f} k€".replace(",", " ")
+                      for iv in g.cat.remove_unused_categories().cat.categories}
+            groupes.loc[g.index] = g.map(labels).astype(object)
+            ordre += list(labels.values())
+        else:
+            groupes.loc[g.index] = g
+            ordre += ["Low (≤ médiane)", "High (> médiane)"]
+        method += f"+{meta['method']}"
+    elif aidee.any():
+        groupes.loc[aidee] = "Aidée"
+        ordre.append("Aidée")
+    df = df_base.copy()
+    df["groupe_intensite"] = pd.Categorical(groupes, categories=ordre, ordered=True).remove_unused_categories()
+    return df, {"method": method}
+
+
+def decisions(res: dict, alphas=ALPHAS) -> pd.DataFrame:
+    """Décision (rejet de H0 ou non) pour chaque seuil α, test asymptotique / exact et permutation."""
+    if res.get("etape") != "ok":
+        return pd.DataFrame(columns=["alpha", "p_value", "rejet_h0", "p_value_permutation", "rejet_h0_permutation"])
+    p_value = res["test"]["p_value"] if res.get("scipy") else np.nan
+    p_perm = res["permutation"]["p_value"]
+    return pd.DataFrame({
+        "alpha": list(alphas),
+        "p_value": p_value,
+        "rejet_h0": [bool(p_value < a) for a in alphas],
+        "p_value_permutation": p_perm,
+        "rejet_h0_permutation": [bool(p_perm < a) for a in alphas],
+    })
+
+
+# --------------------------------------------
+# Partie 4 bis — Effet des aides (PSM / AIPW)
+# --------------------------------------------
+def aid_effect(df: pd.DataFrame, annee: int, col_survie: str, aid_index, events=None, **kwargs) -> dict:
+    """Effet de l'aide sur la survie à covariables comparables ({} sans aidées ou sans témoins)."""
+    cohort = select_cohort(df, annee, events)
+    if cohort.empty or col_survie not in cohort.columns:
+        return {}
+    treated = aid_intensity(aid_index, cohort["siren"]) > 0
+    if treated.all() or not treated.any():
+        return {}
+    res = estimate_effect(cohort, treated, cohort[col_survie].to_numpy(), **kwargs)
+    res["covariables"] = [c for c in COVARIATES if c in cohort.columns]
+    return res
@@ -1,87 +1,208 @@
 # ======================================================
-# DASHBOARD STREAMLIT : FERMETURES & SURVIE 24M & AIDES ÉTAT
+# DASHBOARD STREAMLIT : FERMETURES & SURVIE (COHORTE × HORIZON) & AIDES ÉTAT
 # ======================================================
 
+import json
+import os
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 
+from aides import load_aid_index, resolve_laureates
+from asof import load_asof
+from analytics import (
+    ALPHAS, COLS_TEST, aid_by_category, aid_effect, aid_measures, aid_summary_siren, closures, cohort_km,
+    cohort_survival, cohort_with_aid, department_rates, km_table, prepare_test as compute_test, read_aides_etat,
+    sector_rates,
+)
+from causal import COVARIATE_COLUMNS
+from diagnostics import ENABLED as DIAGNOSTICS, TRACE_PATH, cache_table, chrome_trace, counted, export, resume, span, \
+    start_trace, traced
+from data_loader import has_geography, open_shared_table, resolve_source, table_to_frame
+from geo import DEPARTEMENT, DEPARTEMENTS
+from inference import DEFAULT_SEED
+from naf import LEVELS, NOMENCLATURES
+from cube import compute_cube, is_approximate, load_or_build_cube, source_fingerprint, view
+from sketch import SKETCH_ERROR, precision_for, standard_error
+from survival import column_horizon, has_history, survival_column
+
 # --------------------------------------------
 # 0) CONFIG STREAMLIT (doit être la 1ère commande)
 # --------------------------------------------
 st.set_page_config(page_title="Analyse des chances de survie d'une entreprise en fonction des mesures prises par l'État à 24 mois post-covid", layout="wide")
 
+# Instrumentation (DIAGNOSTICS=1) : une trace par exécution, les dernières gardées dans la session
+MAX_TRACES = 50
+if DIAGNOSTICS:
+    traces = st.session_state.setdefault("diagnostics", [])
+    traces.append(start_trace("exécution"))
+    del traces[:-MAX_TRACES]
+
+def resume_trace():
+    # Fragment réexécuté seul : ses intervalles rejoignent la dernière trace de la session
+    if DIAGNOSTICS and st.session_state.get("diagnostics"):
+        resume(st.session_state["diagnostics"][-1])
+
+def plotly_chart(fig, name: str):
+    # Sérialisation Plotly → front-end, chronométrée (DIAGNOSTICS=1) ; lignes = points tracés
+    with span(name, "graphique") as info:
+        if DIAGNOSTICS:
+            info["lignes"] = sum(len(next((t[k] for k in ("x", "values", "z") if k in t and t[k] is not None), ()))
+                                 for t in fig.data)
+        st.plotly_chart(fig, use_container_width=True)
+
 # --------------------------------------------
 # 1) CHARGEMENT & PRÉPARATION DES DONNÉES
 # --------------------------------------------
-@st.cache_data
-def load_data(path="data.csv") -> pd.DataFrame:
-    df = pd.read_csv(path)
-
-    # Normalisations (sans écraser Survie_24m)
-    if "etatAdministratifUniteLegale" in df.columns:
-        df["etatAdministratifUniteLegale"] = (
-            df["etatAdministratifUniteLegale"].astype(str).str.upper().str.strip()
-        )
-    if "annee" in df.columns:
-        df["annee"] = pd.to_numeric(df["annee"], errors="coerce").astype("Int64")
-    if "anciennete" in df.columns:
-        df["anciennete"] = pd.to_numeric(df["anciennete"], errors="coerce")
-    if "categorieEntreprise" in df.columns:
-        df["categorieEntreprise"] = df["categorieEntreprise"].astype(str).str.strip()
-    if "trancheEffectifsUniteLegale" in df.columns:
-        df["trancheEffectifsUniteLegale"] = df["trancheEffectifsUniteLegale"].astype(str).str.strip()
-    if "siren" in df.columns:
-        df["siren"] = pd.to_numeric(df["siren"], errors="coerce").astype("Int64")
-
-    # Contrôle cible Survie_24m (existe déjà)
-    if "Survie_24m" not in df.columns:
-        raise ValueError("La colonne 'Survie_24m' doit exister (0/1).")
-    df["Survie_24m"] = pd.to_numeric(df["Survie_24m"], errors="coerce").fillna(0).astype(int).clip(0, 1)
+# Dataset Parquet partitionné par année si présent, sinon data.csv
+DATA_PATH = resolve_source()
+
+# Cohorte et horizon par défaut (modifiables dans la barre latérale)
+ANNEE_COHORTE = 2020
+HORIZON = 24
+AIDES_PATH = "df_participationEtat.csv"
+# Aides au niveau SIREN (fichier des lauréats France Relance), si disponible
+LAUREATS_PATH = resolve_laureates()
+# Durée de validité de l'empreinte de la source (s) : l'arborescence n'est reparcourue qu'à expiration
+FINGERPRINT_TTL = 60
+# Cubes restreints à une sélection de départements gardés en cache (les plus récents)
+CUBES_DEPARTEMENTS = 8
+
+@counted(st.cache_resource)
+def load_shared_table(path=DATA_PATH, fingerprint=None):
+    # Dataset de base chargé une fois par processus : table Arrow projetée en mémoire (mmap),
+    # en lecture seule et partagée sans copie par toutes les sessions
+    return open_shared_table(path, fingerprint)
+
+@traced("chargement")
+def load_data(path=DATA_PATH, fingerprint=None, columns=None, years=None, departements=None) -> pd.DataFrame:
+    # Tranche (années, départements) + projection (colonnes) de la table partagée, au schéma compact.
+    # Non mis en cache : seuls les résultats dérivés le sont (st.cache_data, par section).
+    df = table_to_frame(load_shared_table(path, fingerprint), columns=columns, years=years, path=path,
+                        departements=departements)
+
+    # Contrôle des cibles Survie_<h>m (précalculées, ou dérivées de l'historique par read_table)
+    wanted = columns if columns is not None else (survival_column(HORIZON),)
+    for col in wanted:
+        if column_horizon(col) and col not in df.columns:
+            raise ValueError(f"La colonne '{col}' doit exister (0/1) ou être dérivable de l'historique.")
 
     return df
 
-@st.cache_data
+@counted(st.cache_resource)
 def load_aides_etat(path="df_participationEtat.csv") -> pd.DataFrame:
-    dfa = pd.read_csv(path)
-    # Renommer pour harmoniser
-    rename_map = {
-        "Somme de MONTANT_PARTICIPATION_ETAT": "montant_participation_etat",
-        "MESURE_LIGHT": "mesure_light",
-        "MESURE": "mesure",
-    }
-    dfa = dfa.rename(columns=rename_map)
-
-    # Nettoyage minimal
-    if "montant_participation_etat" not in dfa.columns:
-        raise ValueError("La colonne 'Somme de MONTANT_PARTICIPATION_ETAT' doit être présente.")
-    dfa["montant_participation_etat"] = pd.to_numeric(
-        dfa["montant_participation_etat"], errors="coerce"
-    ).fillna(0.0)
-
-    for col in ["categorieEntreprise", "mesure", "mesure_light"]:
-        if col in dfa.columns:
-            dfa[col] = dfa[col].astype(str).str.strip()
-
-    return dfa
-
-def safe_nunique(s: pd.Series) -> int:
-    return s.dropna().nunique()
-
-# Charger
-df = load_data("data.csv")
+    # Partagé entre sessions (cache_resource) : ne jamais modifier le DataFrame retourné
+    return read_aides_etat(path)
+
+@counted(st.cache_data)
+def load_mesures_etat(path=AIDES_PATH, fingerprint=None, _dfa=None) -> dict:
+    # MESURE / MESURE_LIGHT concaténés → une ligne par catégorie × mesure, puis ventilation
+    return aid_measures(_dfa)
+
+@counted(st.cache_resource)
+def load_aides_siren(path=LAUREATS_PATH, fingerprint=None):
+    # Index trié des siren lauréats (montants par siren et par mesure), partagé entre sessions
+    return load_aid_index(path)
+
+@traced("cohorte")
+def load_cohort_with_aid(path, fingerprint, annee, col_survie, aid_index, departements=None) -> pd.DataFrame:
+    # Cohorte (une ligne par SIREN, attributs au 31/12 si historique) + aide reçue par chaque entreprise
+    df = load_data(path, fingerprint, columns=COLS_TEST + (col_survie,), years=(annee,), departements=departements)
+    return cohort_with_aid(df, annee, col_survie, aid_index, load_event_index(path, fingerprint))
+
+@counted(st.cache_resource)
+def load_cube(path=DATA_PATH, fingerprint=None, exact=False) -> pd.DataFrame:
+    # Agrégats précalculés (cube.py) : reconstruits seulement si l'empreinte de la source change.
+    # Par défaut siren distincts estimés (croquis HLL, source lue par blocs) ; exact=True pour les audits
+    return load_or_build_cube(path, exact=exact)
+
+@counted(st.cache_resource(max_entries=CUBES_DEPARTEMENTS))
+def load_cube_departements(path=DATA_PATH, fingerprint=None, departements=None) -> pd.DataFrame:
+    # Cube exact restreint aux départements choisis : seuls leurs row groups sont lus.
+    # Une entrée par sélection : au plus CUBES_DEPARTEMENTS cubes gardés en mémoire (LRU)
+    return compute_cube(path, departements=departements)
+
+@counted(st.cache_resource)
+def load_event_index(path=DATA_PATH, fingerprint=None):
+    # Historique trié (siren, dateDebut, état + catégorie, tranche, création) en tableaux NumPy,
+    # partagé entre sessions : survie, Kaplan–Meier et cohortes « as-of » ; None sans historique
+    return load_asof(path) if has_history(path) else None
+
+# Strates proposées pour les courbes de Kaplan–Meier
+KM_DIMENSIONS = {
+    "Catégorie d’entreprise": "categorieEntreprise",
+    "Ancienneté (années)": "age_bin",
+    "Tranche d’effectif": "trancheEffectifs_label",
+}
+
+@counted(st.cache_data)
+def load_km(path=DATA_PATH, fingerprint=None, annee=None, dimension=None, departements=None) -> pd.DataFrame:
+    # Courbes d'une cohorte pour une dimension de stratification (cache par cohorte × dimension)
+    cols = ("siren", "annee", "categorieEntreprise", "anciennete", "trancheEffectifsUniteLegale")
+    df = load_data(path, fingerprint, columns=cols, years=(annee,), departements=departements)
+    return cohort_km(load_event_index(path, fingerprint), df, annee, dimension)
+
+@counted(st.cache_data(ttl=FINGERPRINT_TTL))
+def data_fingerprint(path=DATA_PATH) -> str:
+    # Parcours de la source (un stat par fichier) au plus une fois par FINGERPRINT_TTL, pas à chaque rerun
+    return source_fingerprint(path)
+
+# Charger (Parties 1 et 2 : cube d'agrégats ; Partie 4 : cohorte sélectionnée uniquement)
+# Empreinte de la source, clé de tous les caches
+data_fp = data_fingerprint(DATA_PATH)
+comptage_exact = st.sidebar.checkbox(
+    "Comptages exacts (audit)", value=False,
+    help="Siren distincts comptés exactement (source entière en mémoire) plutôt qu'estimés par croquis HyperLogLog.",
+)
+cube_france = load_cube(DATA_PATH, data_fp, comptage_exact)
+# Filtre géographique (dataset construit avec --etablissements) : toutes les parties sont
+# restreintes aux sièges des départements choisis ; la carte garde la France entière
+departements = None
+if has_geography(DATA_PATH):
+    choix_departements = st.sidebar.multiselect(
+        "Départements du siège", sorted(view(cube_france, "departement")[DEPARTEMENT].dropna().unique()),
+        format_func=lambda d: f"{d} — {DEPARTEMENTS[d][0]}" if d in DEPARTEMENTS else d,
+        help="Vide : France entière. Seuls les row groups des départements choisis sont lus.",
+    )
+    departements = tuple(sorted(choix_departements)) or None
+cube = load_cube_departements(DATA_PATH, data_fp, departements) if departements else cube_france
 try:
-    dfa = load_aides_etat("df_participationEtat.csv")
+    dfa = load_aides_etat(AIDES_PATH)
 except Exception as e:
     st.error(f"❌ Chargement des aides de l'État impossible : {e}")
     dfa = pd.DataFrame()
+aides_fp = source_fingerprint(AIDES_PATH) if os.path.exists(AIDES_PATH) else None
+laureats_fp = source_fingerprint(LAUREATS_PATH) if LAUREATS_PATH else None
+try:
+    aid_index = load_aides_siren(LAUREATS_PATH, laureats_fp) if LAUREATS_PATH else None
+except Exception as e:
+    st.error(f"❌ Chargement des lauréats France Relance impossible : {e}")
+    aid_index = None
 
 # --------------------------------------------
 # 2) EN-TÊTE
 # --------------------------------------------
 st.title("Analyse des chances de survie d'une entreprise en fonction des mesures prises par l'État à 24 mois post-covid")
-st.caption("La survie 24 mois est interprétée **à partir de la cohorte 2020** (variable `Survie_24m` fournie).")
+
+# Cohorte et horizon analysés (Parties 2 et 4) : toutes les combinaisons sont dans le cube
+cohortes = view(cube, "cohorte")
+annees_cohorte = sorted(cohortes["annee"].dropna().unique().tolist()) or [ANNEE_COHORTE]
+horizons = sorted(cohortes["horizon"].dropna().unique().tolist()) or [HORIZON]
+annee_cohorte = st.sidebar.selectbox(
+    "Année de cohorte", annees_cohorte,
+    index=annees_cohorte.index(ANNEE_COHORTE) if ANNEE_COHORTE in annees_cohorte else len(annees_cohorte) - 1,
+)
+horizon = st.sidebar.selectbox(
+    "Horizon de survie (mois)", horizons,
+    index=horizons.index(HORIZON) if HORIZON in horizons else 0,
+)
+col_survie = survival_column(horizon)
+
+st.caption(f"La survie {horizon} mois est interprétée **à partir de la cohorte {annee_cohorte}** (variable `{col_survie}` fournie).")
+if departements:
+    st.caption("📍 Sièges situés en : " + ", ".join(f"{DEPARTEMENTS.get(d, (d,))[0]} ({d})" for d in departements) + ".")
 
 st.divider()
 
@@ -92,28 +213,25 @@ st.header("Partie 1 — Analyse des fermetures d'entreprise")
 
 # KPI
 col1, col2, col3 = st.columns(3)
-nb_total = safe_nunique(df["siren"]) if "siren" in df.columns else len(df)
-nb_fermees = (
-    safe_nunique(df.loc[df["etatAdministratifUniteLegale"] == "C", "siren"])
-    if "siren" in df.columns else int((df["etatAdministratifUniteLegale"] == "C").sum())
-)
-tx_ferm_glob = (nb_fermees / nb_total * 100) if nb_total else 0.0
-
-col1.metric("Entreprises analysées", f"{nb_total:,}")
-col2.metric("Entreprises fermées", f"{nb_fermees:,}")
-col3.metric("Taux global de fermeture", f"{tx_ferm_glob:.2f} %")
+with span("Partie 1 — fermetures", "agregation"):
+    fermetures = closures(cube)
+nb_total = fermetures["kpi"]["nb_total"]
+nb_fermees = fermetures["kpi"]["nb_fermees"]
+tx_ferm_glob = fermetures["kpi"]["taux_fermeture"]
+
+approche = "≈ " if is_approximate(cube) else ""
+col1.metric("Entreprises analysées", f"{approche}{nb_total:,}")
+col2.metric("Entreprises fermées", f"{approche}{nb_fermees:,}")
+col3.metric("Taux global de fermeture", f"{approche}{tx_ferm_glob:.2f} %")
+if approche:
+    st.caption(f"Siren distincts estimés (HyperLogLog, erreur type ± {100 * standard_error(precision_for(SKETCH_ERROR)):.1f} %) "
+               "— cocher « Comptages exacts (audit) » dans la barre latérale pour les valeurs exactes.")
 st.divider()
 
 # Camembert fermetures / catégorie (toutes années)
 st.subheader("Répartition des **fermetures** par **catégorie d’entreprise**")
-if {"etatAdministratifUniteLegale", "categorieEntreprise", "siren"}.issubset(df.columns):
-    ferm_cat = (
-        df.loc[df["etatAdministratifUniteLegale"] == "C"]
-          .groupby("categorieEntreprise", dropna=False)["siren"]
-          .nunique()
-          .reset_index(name="nb_fermees")
-          .sort_values("nb_fermees", ascending=False)
-    )
+ferm_cat = fermetures["par_categorie"]
+if not ferm_cat.empty:
     if ferm_cat["nb_fermees"].sum() == 0:
         st.info("Aucune entreprise marquée 'C' (cessée).")
     else:
@@ -123,7 +241,7 @@ if {"etatAdministratifUniteLegale", "categorieEntreprise", "siren"}.issubset(df.
             color_discrete_sequence=px.colors.qualitative.Safe, hole=0.45
         )
         fig_pie_ferm.update_traces(textinfo="percent+label")
-        st.plotly_chart(fig_pie_ferm, use_container_width=True)
+        plotly_chart(fig_pie_ferm, "fig_pie_ferm")
         st.caption("Contribution de chaque catégorie au total des cessations.")
 else:
     st.warning("Colonnes manquantes pour ce graphique.")
@@ -132,20 +250,15 @@ st.divider()
 
 # Taux de fermeture par année
 st.subheader("Taux de **fermeture** par **année**")
-if {"annee", "etatAdministratifUniteLegale"}.issubset(df.columns) and df["annee"].notna().any():
-    ferm = df.groupby(["annee", "etatAdministratifUniteLegale"]).size().reset_index(name="count")
-    totaux = ferm.groupby("annee")["count"].sum().reset_index(name="total")
-    ferm = ferm.merge(totaux, on="annee", how="left")
-    ferm["taux_fermeture"] = np.where(ferm["total"] > 0, 100 * ferm["count"] / ferm["total"], np.nan)
-    ferm = ferm[ferm["etatAdministratifUniteLegale"] == "C"].sort_values("annee")
-
+ferm = fermetures["par_annee"]
+if not view(cube, "annee_etat").empty:
     fig_year_ferm = px.bar(
         ferm, x="annee", y="taux_fermeture", text="taux_fermeture",
         labels={"annee": "Année", "taux_fermeture": "% de fermetures"},
         color_discrete_sequence=["#e74c3c"]
     )
     fig_year_ferm.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
-    st.plotly_chart(fig_year_ferm, use_container_width=True)
+    plotly_chart(fig_year_ferm, "fig_year_ferm")
 else:
     st.info("La colonne 'annee' est absente ou vide — section ignorée.")
 
@@ -153,27 +266,15 @@ st.divider()
 
 # Ancienneté × fermeture
 st.subheader("Impact de **l’ancienneté** sur le **taux de fermeture**")
-if "anciennete" in df.columns and df["anciennete"].notna().any():
-    bins_age = [0, 5, 10, 20, 30, 50, 100, np.inf]
-    labels_age = ["0–5", "5–10", "10–20", "20–30", "30–50", "50–100", "100+"]
-    age_bin = pd.cut(df["anciennete"], bins=bins_age, labels=labels_age, include_lowest=True, right=False)
-
-    ferm_age = (
-        pd.DataFrame({"age_bin": age_bin, "etat": df["etatAdministratifUniteLegale"], "siren": df["siren"]})
-          .groupby("age_bin", dropna=False)
-          .agg(nb_total=("siren", lambda s: s.dropna().nunique()),
-               nb_fermees=("etat", lambda x: (x == "C").sum()))
-          .reset_index()
-    )
-    ferm_age["taux_fermeture"] = np.where(ferm_age["nb_total"] > 0, 100 * ferm_age["nb_fermees"] / ferm_age["nb_total"], np.nan)
-
+ferm_age = fermetures["par_anciennete"]
+if not ferm_age.empty:
     fig_age_ferm = px.bar(
         ferm_age, x="age_bin", y="taux_fermeture", text="taux_fermeture",
         labels={"age_bin": "Tranche d’ancienneté (années)", "taux_fermeture": "Taux de fermeture (%)"},
         color="taux_fermeture", color_continuous_scale="Purples"
     )
     fig_age_ferm.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
-    st.plotly_chart(fig_age_ferm, use_container_width=True)
+    plotly_chart(fig_age_ferm, "fig_age_ferm")
 else:
     st.info("Ancienneté absente ou vide — section ignorée.")
 
@@ -181,28 +282,8 @@ st.divider()
 
 # Effectifs × fermeture (hors NN & 00)
 st.subheader("Taux de **fermeture** par **tranche d’effectif salarié**")
-if "trancheEffectifsUniteLegale" in df.columns:
-    df_eff = df.loc[~df["trancheEffectifsUniteLegale"].isin(["NN", "00"])].copy()
-    tr_map = {
-        "01": "1–2", "02": "3–5", "03": "6–9",
-        "11": "10–19", "12": "20–49", "21": "50–99", "22": "100–199",
-        "31": "200–249", "32": "250–499", "41": "500–999",
-        "42": "1 000–1 999", "51": "2 000–4 999", "52": "5 000–9 999", "53": "10 000+",
-    }
-    order_tr = ["1–2", "3–5", "6–9", "10–19", "20–49", "50–99", "100–199",
-                "200–249", "250–499", "500–999", "1 000–1 999", "2 000–4 999", "5 000–9 999", "10 000+"]
-
-    df_eff["trancheEffectifs_label"] = df_eff["trancheEffectifsUniteLegale"].map(tr_map).fillna("Autre/NA")
-    ferm_eff = (
-        df_eff.groupby("trancheEffectifs_label", dropna=False)
-              .agg(nb_total=("siren", lambda s: s.dropna().nunique()),
-                   nb_fermees=("etatAdministratifUniteLegale", lambda x: (x == "C").sum()))
-              .reset_index()
-    )
-    ferm_eff["taux_fermeture"] = np.where(ferm_eff["nb_total"] > 0, 100 * ferm_eff["nb_fermees"] / ferm_eff["nb_total"], np.nan)
-    ferm_eff["trancheEffectifs_label"] = pd.Categorical(ferm_eff["trancheEffectifs_label"], categories=order_tr + ["Autre/NA"], ordered=True)
-    ferm_eff = ferm_eff.sort_values("trancheEffectifs_label")
-
+ferm_eff = fermetures["par_tranche"]
+if not ferm_eff.empty:
     fig_eff_ferm = px.bar(
         ferm_eff, x="trancheEffectifs_label", y="taux_fermeture", text="taux_fermeture",
         labels={"trancheEffectifs_label": "Tranche d'effectif", "taux_fermeture": "Taux de fermeture (%)"},
@@ -210,57 +291,55 @@ if "trancheEffectifsUniteLegale" in df.columns:
     )
     fig_eff_ferm.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
     fig_eff_ferm.update_layout(xaxis_tickangle=-35)
-    st.plotly_chart(fig_eff_ferm, use_container_width=True)
+    plotly_chart(fig_eff_ferm, "fig_eff_ferm")
 else:
     st.info("La colonne 'trancheEffectifsUniteLegale' est absente — section ignorée.")
 
 st.divider()
 
 # =====================================================
-# === PARTIE 2 — SURVIE 24 MOIS (COHORTE 2020)     ===
+# === PARTIE 2 — SURVIE À h MOIS (COHORTE A)        ===
 # =====================================================
-st.header("Partie 2 — Analyse des chances de survie à 24 mois des entreprises")
+st.header(f"Partie 2 — Analyse des chances de survie à {horizon} mois des entreprises")
 
-needed_cols = {"siren", "annee", "Survie_24m"}
-if not needed_cols.issubset(df.columns):
-    st.warning("Colonnes requises manquantes : 'siren', 'annee', 'Survie_24m'.")
+with span("Partie 2 — survie de la cohorte", "agregation"):
+    survie = cohort_survival(cube, annee_cohorte, horizon)
+
+# Horizon au-delà de la fin des données : survie non encore observable (censure)
+if survie["censure"]:
+    annee_max = view(cube, "annee_etat")["annee"].max()
+    st.warning(f"L'horizon de {horizon} mois dépasse la fin des données ({int(annee_max)}) : "
+               "la survie reflète le dernier état connu (observation censurée).")
+
+if not survie["disponible"]:
+    st.warning(f"Colonnes requises manquantes : 'siren', 'annee', '{col_survie}'.")
 else:
-    cohort = (
-        df.loc[df["annee"] == 2020]
-          .sort_values(["siren"])
-          .drop_duplicates(subset=["siren"])
-          .copy()
-    )
-    nb_cohorte = cohort["siren"].dropna().nunique()
+    nb_cohorte = survie["kpi"]["nb_cohorte"]
 
     if nb_cohorte == 0:
-        st.info("Aucune entreprise observée en 2020 — cohorte vide.")
+        st.info(f"Aucune entreprise observée en {annee_cohorte} — cohorte vide.")
     else:
-        cohort["Survie_24m"] = pd.to_numeric(cohort["Survie_24m"], errors="coerce").fillna(0).astype(int).clip(0, 1)
-
         # KPI
         c1, c2, c3 = st.columns(3)
-        taux_survie_global = cohort["Survie_24m"].mean() * 100
-        nb_survivantes = int(cohort["Survie_24m"].sum())
-        nb_non_survivantes = int((cohort["Survie_24m"] == 0).sum())
-        c1.metric("Cohorte 2020 (entreprises)", f"{nb_cohorte:,}")
-        c2.metric("Survivantes à 24 mois", f"{nb_survivantes:,}")
-        c3.metric("Taux de survie (24m)", f"{taux_survie_global:.2f} %")
-        st.caption("Les profils analysés (catégorie, ancienneté, effectifs) sont ceux **observés en 2020**.")
+        nb_survivantes = survie["kpi"]["nb_survivantes"]
+        taux_survie_global = survie["kpi"]["taux_survie"]
+        c1.metric(f"Cohorte {annee_cohorte} (entreprises)", f"{nb_cohorte:,}")
+        c2.metric(f"Survivantes à {horizon} mois", f"{nb_survivantes:,}")
+        c3.metric(f"Taux de survie ({horizon}m)", f"{taux_survie_global:.2f} %")
+        st.caption(f"Les profils analysés (catégorie, ancienneté, effectifs) sont ceux **observés en {annee_cohorte}**.")
         st.divider()
 
-        # Camembert — survivantes par catégorie (2020)
-        st.subheader("Répartition des **survivantes (24m)** par **catégorie d’entreprise**")
-        if "categorieEntreprise" in cohort.columns:
+        cohort_cat = survie["par_categorie"]
+
+        # Camembert — survivantes par catégorie (cohorte)
+        st.subheader(f"Répartition des **survivantes ({horizon}m)** par **catégorie d’entreprise**")
+        if not cohort_cat.empty:
             surv_cat_counts = (
-                cohort.loc[cohort["Survie_24m"] == 1]
-                      .groupby("categorieEntreprise", dropna=False)["siren"]
-                      .nunique()
-                      .reset_index(name="nb_survivantes")
-                      .sort_values("nb_survivantes", ascending=False)
+                cohort_cat.loc[cohort_cat["nb_survivantes"] > 0, ["categorieEntreprise", "nb_survivantes"]]
+                          .sort_values("nb_survivantes", ascending=False)
             )
             if surv_cat_counts["nb_survivantes"].sum() == 0:
-                st.info("Aucune entreprise survivante dans la cohorte 2020.")
+                st.info(f"Aucune entreprise survivante dans la cohorte {annee_cohorte}.")
             else:
                 fig_pie_surv = px.pie(
                     surv_cat_counts,
@@ -268,46 +347,37 @@ else:
                     color_discrete_sequence=px.colors.qualitative.Prism, hole=0.45
                 )
                 fig_pie_surv.update_traces(textinfo="percent+label")
-                st.plotly_chart(fig_pie_surv, use_container_width=True)
+                plotly_chart(fig_pie_surv, "fig_pie_surv")
         else:
-            st.info("Catégorie d’entreprise (2020) indisponible.")
+            st.info(f"Catégorie d’entreprise ({annee_cohorte}) indisponible.")
 
         st.divider()
 
-        # Taux de survie par catégorie (2020)
+        # Taux de survie par catégorie (cohorte)
         st.subheader("Taux de **survie** par **catégorie d’entreprise**")
-        if "categorieEntreprise" in cohort.columns:
+        if not cohort_cat.empty:
             survie_par_cat = (
-                cohort.groupby("categorieEntreprise")["Survie_24m"]
-                      .mean().mul(100).reset_index()
-                      .sort_values("Survie_24m", ascending=False)
+                cohort_cat.dropna(subset=["categorieEntreprise"])
+                          .rename(columns={"taux_survie": col_survie})[["categorieEntreprise", col_survie]]
+                          .sort_values(col_survie, ascending=False)
             )
             fig_surv_cat = px.bar(
                 survie_par_cat,
-                x="categorieEntreprise", y="Survie_24m", text="Survie_24m",
-                labels={"categorieEntreprise": "Catégorie", "Survie_24m": "Taux de survie (%)"},
-                color="Survie_24m", color_continuous_scale="Teal"
+                x="categorieEntreprise", y=col_survie, text=col_survie,
+                labels={"categorieEntreprise": "Catégorie", col_survie: "Taux de survie (%)"},
+                color=col_survie, color_continuous_scale="Teal"
             )
             fig_surv_cat.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
-            st.plotly_chart(fig_surv_cat, use_container_width=True)
+            plotly_chart(fig_surv_cat, "fig_surv_cat")
         else:
-            st.info("Catégorie d’entreprise (2020) indisponible.")
+            st.info(f"Catégorie d’entreprise ({annee_cohorte}) indisponible.")
 
         st.divider()
 
-        # Ancienneté × survie (2020)
-        st.subheader("**Ancienneté (2020)** × **Survie (24m)**")
-        if "anciennete" in cohort.columns and cohort["anciennete"].notna().any():
-            bins_age = [0, 5, 10, 20, 30, 50, 100, np.inf]
-            labels_age = ["0–5", "5–10", "10–20", "20–30", "30–50", "50–100", "100+"]
-            cohort["age_bin"] = pd.cut(cohort["anciennete"], bins=bins_age, labels=labels_age, include_lowest=True, right=False)
-
-            surv_age = (
-                cohort.groupby("age_bin")
-                      .agg(nb_total=("siren", lambda s: s.dropna().nunique()),
-                           taux_survie=("Survie_24m", lambda s: float(s.mean() * 100) if len(s) else np.nan))
-                      .reset_index()
-            )
+        # Ancienneté × survie (cohorte)
+        st.subheader(f"**Ancienneté ({annee_cohorte})** × **Survie ({horizon}m)**")
+        surv_age = survie["par_anciennete"]
+        if not surv_age.empty:
             fig_age_surv = px.bar(
                 surv_age,
                 x="age_bin", y="taux_survie", text="taux_survie",
@@ -315,45 +385,161 @@ else:
                 color="taux_survie", color_continuous_scale="Greens"
             )
             fig_age_surv.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
-            st.plotly_chart(fig_age_surv, use_container_width=True)
+            plotly_chart(fig_age_surv, "fig_age_surv")
         else:
-            st.info("Ancienneté (2020) absente ou vide.")
+            st.info(f"Ancienneté ({annee_cohorte}) absente ou vide.")
 
         st.divider()
 
-        # Effectifs × survie (2020) hors NN & 00
-        st.subheader("**Survie (24m)** par **tranche d’effectif (2020)**")
-        if "trancheEffectifsUniteLegale" in cohort.columns:
-            cohort_eff = cohort.loc[~cohort["trancheEffectifsUniteLegale"].isin(["NN", "00"])].copy()
-            tr_map = {
-                "01": "1–2", "02": "3–5", "03": "6–9",
-                "11": "10–19", "12": "20–49", "21": "50–99", "22": "100–199",
-                "31": "200–249", "32": "250–499", "41": "500–999",
-                "42": "1 000–1 999", "51": "2 000–4 999", "52": "5 000–9 999", "53": "10 000+",
-            }
-            order_tr = ["1–2", "3–5", "6–9", "10–19", "20–49", "50–99", "100–199",
-                        "200–249", "250–499", "500–999", "1 000–1 999", "2 000–4 999", "5 000–9 999", "10 000+"]
-
-            cohort_eff["trancheEffectifs_label"] = cohort_eff["trancheEffectifsUniteLegale"].map(tr_map).fillna("Autre/NA")
-            surv_eff = (
-                cohort_eff.groupby("trancheEffectifs_label", dropna=False)
-                          .agg(nb_total=("siren", lambda s: s.dropna().nunique()),
-                               taux_survie=("Survie_24m", lambda s: float(s.mean() * 100) if len(s) else np.nan))
-                          .reset_index()
-            )
-            surv_eff["trancheEffectifs_label"] = pd.Categorical(surv_eff["trancheEffectifs_label"], categories=order_tr + ["Autre/NA"], ordered=True)
-            surv_eff = surv_eff.sort_values("trancheEffectifs_label")
-
+        # Effectifs × survie (cohorte) hors NN & 00
+        st.subheader(f"**Survie ({horizon}m)** par **tranche d’effectif ({annee_cohorte})**")
+        surv_eff = survie["par_tranche"]
+        if not surv_eff.empty:
             fig_eff_surv = px.bar(
                 surv_eff, x="trancheEffectifs_label", y="taux_survie", text="taux_survie",
-                labels={"trancheEffectifs_label": "Tranche d'effectif (2020)", "taux_survie": "Taux de survie (%)"},
+                labels={"trancheEffectifs_label": f"Tranche d'effectif ({annee_cohorte})", "taux_survie": "Taux de survie (%)"},
                 color="taux_survie", color_continuous_scale="Tealgrn"
             )
             fig_eff_surv.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
             fig_eff_surv.update_layout(xaxis_tickangle=-35)
-            st.plotly_chart(fig_eff_surv, use_container_width=True)
+            plotly_chart(fig_eff_surv, "fig_eff_surv")
         else:
-            st.info("Tranche d’effectif (2020) absente.")
+            st.info(f"Tranche d’effectif ({annee_cohorte}) absente.")
+
+st.divider()
+
+# =====================================================
+# === PARTIE 2 bis — COURBES DE SURVIE (KAPLAN–MEIER)
+# =====================================================
+st.header("Partie 2 bis — Courbes de survie (Kaplan–Meier)")
+st.caption(f"Entreprises **actives au 31/12/{annee_cohorte}** ; événement = première fermeture, "
+           "observations **censurées** à la fin des données.")
+
+@st.fragment
+def section_kaplan_meier():
+    # Le choix de la strate ne réexécute que ce fragment
+    resume_trace()
+    km_dim_label = st.selectbox("Stratifier par", list(KM_DIMENSIONS))
+    km = load_km(DATA_PATH, data_fp, annee_cohorte, KM_DIMENSIONS[km_dim_label], departements)
+    if km.empty:
+        st.info(f"{km_dim_label} ({annee_cohorte}) indisponible ou cohorte vide.")
+    else:
+        km = km.assign(survie_pct=100 * km["survie"], ic_bas_pct=100 * km["ic_bas"], ic_haut_pct=100 * km["ic_haut"])
+        fig_km = px.line(
+            km, x="mois", y="survie_pct", color="strate", line_shape="hv",
+            hover_data={"a_risque": True, "ic_bas_pct": ":.1f", "ic_haut_pct": ":.1f"},
+            labels={"mois": "Mois après le 31/12 de la cohorte", "survie_pct": "Survie (%)",
+                    "strate": km_dim_label, "a_risque": "À risque",
+                    "ic_bas_pct": "IC 95 % bas", "ic_haut_pct": "IC 95 % haut"},
+            color_discrete_sequence=px.colors.qualitative.Prism,
+        )
+        fig_km.update_layout(yaxis_range=[0, 100])
+        plotly_chart(fig_km, "fig_km")
+
+        # Survie lue sur la courbe aux horizons usuels (dernier mois observé ≤ horizon)
+        table_km = km_table(km, horizons)
+        if not table_km.empty:
+            with st.expander("Survie estimée par horizon (%)"):
+                st.dataframe(table_km.style.format(precision=1), use_container_width=True)
+
+if not has_history(DATA_PATH):
+    st.info("Historique des périodes (`_historique/`) absent : lancer `preprocessing.py` pour obtenir les courbes.")
+else:
+    section_kaplan_meier()
+
+st.divider()
+
+# =====================================================
+# === PARTIE 2 ter — SECTEURS D'ACTIVITÉ (NAF)
+# =====================================================
+st.header("Partie 2 ter — Fermeture et survie par secteur d'activité (NAF)")
+st.caption(f"Taux de fermeture : part des lignes siren × année à l'état « C » (toutes années) ; "
+           f"taux de survie : cohorte {annee_cohorte} à {horizon} mois. Révisions de la NAF présentées séparément.")
+
+@st.fragment
+def section_secteurs():
+    # Descente section → division → groupe → classe : seul ce fragment est réexécuté,
+    # par sommation des classes du cube (aucune relecture des données)
+    resume_trace()
+    presentes = set(view(cube, "naf")["nomenclature"])
+    nomenclature = st.radio("Nomenclature", [n for n in NOMENCLATURES if n in presentes],
+                            format_func=NOMENCLATURES.get, horizontal=True)
+    parents = {"nomenclature": nomenclature}
+    with span("Partie 2 ter — secteurs", "agregation"):
+        for col, niveau in zip(st.columns(len(LEVELS) - 1), LEVELS[:-1]):
+            secteurs = sector_rates(cube, annee_cohorte, horizon, niveau, parents)
+            choix = col.selectbox(niveau.capitalize(), ["Tous"] + secteurs[niveau].tolist(),
+                                  key=f"naf_{'_'.join(parents.values())}_{niveau}")
+            if choix == "Tous":
+                break
+            parents[niveau] = choix
+        else:
+            niveau = LEVELS[-1]
+            secteurs = sector_rates(cube, annee_cohorte, horizon, niveau, parents)
+
+    if secteurs.empty:
+        st.info("Aucun code NAF lisible pour cette sélection.")
+        return
+    taux = secteurs.melt(id_vars=[niveau], value_vars=["taux_fermeture", "taux_survie"],
+                         var_name="indicateur", value_name="taux")
+    taux["indicateur"] = taux["indicateur"].map({"taux_fermeture": "Fermeture (toutes années)",
+                                                 "taux_survie": f"Survie {horizon}m (cohorte {annee_cohorte})"})
+    fig_naf = px.bar(
+        taux, x=niveau, y="taux", color="indicateur", barmode="group",
+        labels={niveau: niveau.capitalize(), "taux": "Taux (%)", "indicateur": ""},
+        color_discrete_sequence=["#e74c3c", "#16a085"],
+    )
+    fig_naf.update_layout(xaxis_type="category")
+    plotly_chart(fig_naf, "fig_naf")
+    with st.expander(f"Détail par {niveau}"):
+        st.dataframe(secteurs.drop(columns="nomenclature").style.format(precision=1), use_container_width=True)
+
+if view(cube, "naf").empty:
+    st.info("Colonne 'activitePrincipaleUniteLegale' absente — section ignorée.")
+else:
+    section_secteurs()
+
+st.divider()
+
+# =====================================================
+# === PARTIE 2 quater — CARTE DES DÉPARTEMENTS (siège)
+# =====================================================
+st.header("Partie 2 quater — Fermeture et survie par département du siège")
+st.caption("Département de l'établissement siège (StockEtablissement) ; un point par chef-lieu, "
+           "taille = nombre de lignes siren × année. France entière, sélection de la barre latérale entourée.")
+
+@st.fragment
+def section_departements():
+    # Indicateur de la carte : seul ce fragment est réexécuté ; cube France entière (aucune relecture)
+    resume_trace()
+    indicateur = st.radio("Indicateur", ["taux_fermeture", "taux_survie"], horizontal=True,
+                          format_func={"taux_fermeture": "Fermeture (toutes années)",
+                                       "taux_survie": f"Survie {horizon}m (cohorte {annee_cohorte})"}.get)
+    with span("Partie 2 quater — départements", "agregation"):
+        deps = department_rates(cube_france, annee_cohorte, horizon)
+    deps["selection"] = deps[DEPARTEMENT].isin(departements or ())
+    # Métropole sur la carte ; outre-mer (trop éloigné pour la même emprise) dans le tableau
+    metropole = deps.loc[deps["lat"] > 40]
+    fig_dep = px.scatter_geo(
+        metropole, lat="lat", lon="lon", color=indicateur, size="nb_lignes", hover_name="nom",
+        hover_data={DEPARTEMENT: True, "lat": False, "lon": False, "taux_fermeture": ":.1f", "taux_survie": ":.1f",
+                    "nb_lignes": ":,", "selection": False},
+        color_continuous_scale="RdYlGn_r" if indicateur == "taux_fermeture" else "RdYlGn",
+        labels={"taux_fermeture": "Fermeture (%)", "taux_survie": "Survie (%)", "nb_lignes": "Lignes",
+                DEPARTEMENT: "Département"},
+    )
+    fig_dep.update_traces(marker_line_width=np.where(metropole["selection"], 3, 0), marker_line_color="black")
+    fig_dep.update_geos(fitbounds="locations", showcountries=True, showland=True, landcolor="#f4f4f4")
+    fig_dep.update_layout(height=600, margin=dict(l=0, r=0, t=0, b=0))
+    plotly_chart(fig_dep, "fig_dep")
+    with st.expander("Détail par département"):
+        st.dataframe(deps.drop(columns=["lat", "lon", "selection"]).set_index(DEPARTEMENT)
+                     .style.format({"taux_fermeture": "{:.1f}", "taux_survie": "{:.1f}"}), use_container_width=True)
+
+if view(cube_france, "departement").empty:
+    st.info("Géographie absente : relancer `preprocessing.py` avec `--etablissements` (StockEtablissement).")
+else:
+    section_departements()
 
 st.divider()
 
@@ -362,25 +548,24 @@ st.divider()
 # =====================================================
 st.header("Partie 3 — Aides de l'État & lien avec la survie des entreprises")
 
-if dfa.empty:
+@counted(st.cache_data)
+def summarize_aides_siren(path=DATA_PATH, fingerprint=None, annee=ANNEE_COHORTE, col_survie="Survie_24m",
+                          laureats_fingerprint=None, _aid_index=None, departements=None) -> dict:
+    # Agrégats de la cohorte à partir de l'aide reçue par chaque entreprise (niveau SIREN)
+    cohort = load_cohort_with_aid(path, fingerprint, annee, col_survie, _aid_index, departements)
+    return aid_summary_siren(cohort, _aid_index, col_survie)
+
+if dfa.empty and aid_index is None:
     st.info("Aucune donnée d’aide d’État chargée pour cette section.")
-else:
+elif not dfa.empty:
     # KPI : total & concentration (Top-3, Gini) par catégorie
-    if "categorieEntreprise" in dfa.columns:
-        cat_agg = (
-            dfa.groupby("categorieEntreprise", dropna=False)["montant_participation_etat"]
-               .sum()
-               .reset_index(name="participation_etat")
-               .sort_values("participation_etat", ascending=False)
-        )
-        total_etat = float(cat_agg["participation_etat"].sum())
-        top3_share = (100 * cat_agg.head(3)["participation_etat"].sum() / total_etat) if total_etat > 0 else np.nan
-        vals = cat_agg["participation_etat"].values.astype(float)
-        if vals.sum() > 0 and len(vals) >= 2:
-            x = np.sort(vals); n = len(x)
-            gini = (2 * np.arange(1, n+1) - n - 1) @ x / (n * x.sum())
-        else:
-            gini = np.nan
+    with span("Partie 3 — aides par catégorie", "agregation"):
+        aides_cat = aid_by_category(dfa)
+    if aides_cat:
+        cat_agg = aides_cat["par_categorie"]
+        total_etat = aides_cat["kpi"]["total"]
+        top3_share = aides_cat["kpi"]["top3_%"]
+        gini = aides_cat["kpi"]["gini"]
 
         c1, c2, c3 = st.columns(3)
         c1.metric("Aides de l'État — Total", f"{total_etat:,.0f}".replace(",", " "))
@@ -392,22 +577,20 @@ else:
         # Répartition par catégorie (bar + pie)
         st.subheader("🏢 Répartition des **aides de l'État** par **catégorie d’entreprise**")
         if not cat_agg.empty:
-            cat_agg["part_%"] = 100 * cat_agg["participation_etat"] / total_etat if total_etat else 0.0
-
             fig_cat_bar = px.bar(
                 cat_agg, x="categorieEntreprise", y="participation_etat", text="part_%",
                 labels={"categorieEntreprise": "Catégorie", "participation_etat": "Participation État (€)"},
                 color="participation_etat", color_continuous_scale="Blues"
             )
             fig_cat_bar.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
-            st.plotly_chart(fig_cat_bar, use_container_width=True)
+            plotly_chart(fig_cat_bar, "fig_cat_bar")
 
             fig_cat_pie = px.pie(
                 cat_agg, values="participation_etat", names="categorieEntreprise",
                 hole=0.45, color_discrete_sequence=px.colors.qualitative.Safe
             )
             fig_cat_pie.update_traces(textinfo="percent+label")
-            st.plotly_chart(fig_cat_pie, use_container_width=True)
+            plotly_chart(fig_cat_pie, "fig_cat_pie")
 
         else:
             st.info("Aucune agrégation par catégorie.")
@@ -415,185 +598,334 @@ else:
         st.info("'categorieEntreprise' absente dans les aides — KPI par catégorie non calculables.")
     st.divider()
 
+    # Ventilation par mesure (cellules MESURE découpées par le dictionnaire des mesures)
+    ventilation = load_mesures_etat(AIDES_PATH, aides_fp, dfa)
+    if "presence" in ventilation:
+        st.subheader("🧩 Répartition par **mesure** France Relance")
+        presence = ventilation["presence"]
+        fig_mesures = px.imshow(
+            presence, text_auto=True, aspect="auto", color_continuous_scale="Blues",
+            labels={"x": "Mesure", "y": "Catégorie", "color": "Lignes"}
+        )
+        fig_mesures.update_layout(xaxis_tickangle=-35)
+        plotly_chart(fig_mesures, "fig_mesures")
+        st.caption(f"{presence.shape[1]} mesures identifiées ; nombre de lignes de la table d'aides "
+                   "(projets, ou 1 = mesure présente dans la catégorie) par catégorie × mesure.")
+        montants = ventilation.get("montants")
+        if montants is not None and len(montants):
+            fig_mesure_montant = px.bar(
+                montants.sort_values("participation_etat"), x="participation_etat", y="mesure_light",
+                orientation="h", labels={"mesure_light": "Mesure", "participation_etat": "Participation État (€)"},
+                color="participation_etat", color_continuous_scale="Blues"
+            )
+            plotly_chart(fig_mesure_montant, "fig_mesure_montant")
+            st.caption(f"Montants des lignes à mesure unique : {100 * ventilation['part_attribuable']:.1f} % "
+                       "de la participation totale.")
+        else:
+            st.caption("Les montants de ce fichier sont sommés sur plusieurs mesures par catégorie : "
+                       "non attribuables à une mesure (voir l'export par projet ou les lauréats au niveau SIREN).")
+        st.divider()
+
+# Aides reçues par chaque entreprise (fichier des lauréats), jointes à la cohorte
+if aid_index is not None:
+    st.subheader(f"🎯 Aides au niveau **SIREN** — cohorte {annee_cohorte} (lauréats France Relance)")
+    aid = summarize_aides_siren(DATA_PATH, data_fp, annee_cohorte, col_survie, laureats_fp, aid_index, departements)
+    c1, c2, c3 = st.columns(3)
+    c1.metric(f"Aides reçues — cohorte {annee_cohorte}", f"{aid['total']:,.0f}".replace(",", " "))
+    c2.metric("Entreprises aidées", f"{aid['nb_aidees']:,}",
+              f"{100 * aid['nb_aidees'] / aid['nb']:.2f} % de la cohorte" if aid["nb"] else None, delta_color="off")
+    c3.metric("Gini (entre entreprises aidées)", f"{aid['gini']:.2f}" if not np.isnan(aid["gini"]) else "n/d")
+
+    if aid["nb_aidees"]:
+        mesures = aid["par_mesure"].loc[lambda t: t["participation_etat"] > 0].sort_values("participation_etat")
+        fig_mesure = px.bar(
+            mesures, x="participation_etat", y="mesure", orientation="h",
+            labels={"mesure": "Mesure", "participation_etat": "Participation État (€)"},
+            color="participation_etat", color_continuous_scale="Blues"
+        )
+        plotly_chart(fig_mesure, "fig_mesure")
+
+        if "par_categorie" in aid:
+            fig_cat_siren = px.bar(
+                aid["par_categorie"], x="categorieEntreprise", y="participation_etat", text="nb_aidees",
+                labels={"categorieEntreprise": "Catégorie", "participation_etat": "Participation État (€)",
+                        "nb_aidees": "Entreprises aidées"},
+                color_discrete_sequence=["#2e86de"]
+            )
+            fig_cat_siren.update_traces(texttemplate="%{text:,} aidées", textposition="outside")
+            plotly_chart(fig_cat_siren, "fig_cat_siren")
+
+        if "survie" in aid:
+            fig_surv_aide = px.bar(
+                aid["survie"], x="statut", y="taux_survie_%", text="taux_survie_%",
+                labels={"statut": "", "taux_survie_%": f"Taux de survie {horizon}m (%)"},
+                color="statut", color_discrete_sequence=["#27ae60", "#95a5a6"]
+            )
+            fig_surv_aide.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
+            plotly_chart(fig_surv_aide, "fig_surv_aide")
+            st.caption("Comparaison brute aidées / non aidées : les lauréats diffèrent des autres entreprises "
+                       "(taille, secteur…) — lecture descriptive.")
+    else:
+        st.info(f"Aucun lauréat parmi les entreprises de la cohorte {annee_cohorte}.")
+    st.divider()
+
 # =====================================================
 # === PARTIE 4 — Test simple : Chi² / Fisher
-# === Survie 24m vs groupes d'intensité d'aide (catégories)
+# === Survie (horizon choisi) vs groupes d'intensité d'aide (SIREN, sinon catégories)
 # =====================================================
 st.header("Partie 4 — Test simple : Chi² / Fisher")
 
 # Hypothèses affichées dans le dashboard
 st.markdown(
-    """
+    f"""
 **Hypothèses du test :**  
-- **H0 (indépendance)** : le **taux de survie à 24 mois** est **indépendant** du **niveau d’intensité d’aide**.  
+- **H0 (indépendance)** : le **taux de survie à {horizon} mois** est **indépendant** du **niveau d’intensité d’aide**.  
   Autrement dit, les proportions de survie sont **identiques** dans tous les groupes d’intensité.  
-- **H1 (dépendance)** : le **taux de survie à 24 mois** **diffère** selon le **niveau d’intensité d’aide** (au moins un groupe diffère).
+- **H1 (dépendance)** : le **taux de survie à {horizon} mois** **diffère** selon le **niveau d’intensité d’aide** (au moins un groupe diffère).
 """
 )
 
-# Seuil de décision (α)
-alpha = st.selectbox("Seuil de décision (α)", options=[0.01, 0.05, 0.10], index=1)
+# 5.0 → 5.6 : tout ce qui ne dépend pas de α, mémoïsé sur les empreintes des sources
+@counted(st.cache_data)
+def prepare_test(path=DATA_PATH, fingerprint=None, annee=ANNEE_COHORTE, col_survie="Survie_24m",
+                 aides_fingerprint=None, _dfa=None, laureats_fingerprint=None, _aid_index=None,
+                 departements=None) -> dict:
+    df_test = load_data(path, fingerprint, columns=COLS_TEST + (col_survie,), years=(annee,), departements=departements)
+    return compute_test(df_test, annee, col_survie, _dfa, _aid_index, events=load_event_index(path, fingerprint))
+
+@st.fragment
+def section_test(res: dict):
+    # Seuil de décision (α) : seul ce fragment est réexécuté quand il change
+    resume_trace()
+    alpha = st.selectbox("Seuil de décision (α)", options=list(ALPHAS), index=1)
+
+    etape = res["etape"]
+    if etape == "donnees":
+        st.info(f"Données insuffisantes : il faut la table d'aides de l'État et, côté cohorte, 'siren', 'annee', '{col_survie}', 'categorieEntreprise'.")
+        return
+    if etape == "cohorte":
+        st.info(f"Cohorte {annee_cohorte} vide — section non calculée.")
+        return
+    if etape == "aides":
+        st.info("La table d'aides ne contient pas 'categorieEntreprise' et/ou 'montant_participation_etat'.")
+        return
+
+    # 🔎 Petite explication de l'intensité (affichée avant le test)
+    if res["niveau"] == "siren":
+        st.markdown(
+            f"""
+**Qu’entend-on par _intensité d’aide_ ?**  
+L’**intensité** est le **montant de participation de l’État reçu par chaque entreprise** de la cohorte {annee_cohorte}
+(somme de ses mesures France Relance, d’après le **fichier des lauréats**, joint par SIREN).
 
-# Pré-conditions
-need_cols = {"siren", "annee", "Survie_24m", "categorieEntreprise"}
-if dfa.empty or not need_cols.issubset(df.columns):
-    st.info("Données insuffisantes : il faut la table d'aides de l'État et, côté cohorte, 'siren', 'annee', 'Survie_24m', 'categorieEntreprise'.")
-else:
-    # 5.0 Cohorte 2020 (une ligne par SIREN)
-    cohort = (
-        df.loc[df["annee"] == 2020, ["siren", "categorieEntreprise", "Survie_24m"]]
-          .dropna(subset=["siren"])
-          .drop_duplicates(subset=["siren"])
-          .copy()
-    )
-    if cohort.empty:
-        st.info("Cohorte 2020 vide — section non calculée.")
+- Les entreprises **non lauréates** (aide nulle) forment le groupe **« Non aidée »**.  
+- Les entreprises **aidées** sont réparties en **groupes de montants** (quantiles).
+            """
+        )
     else:
-        cohort["categorieEntreprise"] = cohort["categorieEntreprise"].astype(str).str.strip()
-        cohort["Survie_24m"] = pd.to_numeric(cohort["Survie_24m"], errors="coerce").fillna(0).astype(int).clip(0, 1)
-
-        # 5.1 Intensité d'aide par entreprise (au niveau catégorie)
-        if "categorieEntreprise" not in dfa.columns or "montant_participation_etat" not in dfa.columns:
-            st.info("La table d'aides ne contient pas 'categorieEntreprise' et/ou 'montant_participation_etat'.")
-        else:
-            aides_cat = (
-                dfa.groupby("categorieEntreprise", dropna=False)["montant_participation_etat"]
-                   .sum()
-                   .reset_index(name="participation_etat")
-            )
-            # Nb d'entreprises par catégorie en 2020
-            nb_cat_2020 = cohort.groupby("categorieEntreprise")["siren"].nunique().reset_index(name="nb_2020")
-
-            # Jointure et intensité moyenne par entreprise (catégorie)
-            mix = aides_cat.merge(nb_cat_2020, on="categorieEntreprise", how="inner")
-            mix["intensite_par_entreprise"] = np.where(
-                mix["nb_2020"] > 0, mix["participation_etat"] / mix["nb_2020"], np.nan
-            )
-
-            # 🔎 Petite explication de l'intensité (affichée avant le test)
-            st.markdown(
-                """
+        st.markdown(
+            f"""
 **Qu’entend-on par _intensité d’aide_ ?**  
-L’**intensité** est le **montant moyen d’aide de l’État par entreprise** dans une **catégorie d’entreprise** (cohorte 2020) :
+L’**intensité** est le **montant moyen d’aide de l’État par entreprise** dans une **catégorie d’entreprise** (cohorte {annee_cohorte}) :
 
 \\[
-\\text{Intensité}_{cat} \= \\frac{\\text{Participation de l’État (€, agrégée) pour la catégorie}}{\\#\\,\\text{d’entreprises observées en 2020 dans cette catégorie}}
+\\text{{Intensité}}_{{cat}} \= \\frac{{\\text{{Participation de l’État (€, agrégée) pour la catégorie}}}}{{\\#\\,\\text{{d’entreprises observées en {annee_cohorte} dans cette catégorie}}}}
 \\]
 
 - **Numérateur** : somme des montants de **participation de l’État** pour la *catégorie*.  
-- **Dénominateur** : **nombre d’entreprises (SIREN uniques) présentes en 2020** dans cette *catégorie*.  
+- **Dénominateur** : **nombre d’entreprises (SIREN uniques) présentes en {annee_cohorte}** dans cette *catégorie*.  
 - **Lecture** : c’est une **moyenne par entreprise** (exprimable en € ou k€ / entreprise).
-                """
-            )
+            """
+        )
+    if etape == "intensite":
+        st.info(f"Aucune intensité disponible pour la cohorte {annee_cohorte} (après jointure).")
+        return
+    if etape == "groupes":
+        st.info("Impossible de constituer ≥ 2 groupes d’intensité (valeurs identiques ou trop peu d’observations).")
+        return
+
+    st.caption(f"Grouping utilisé : **{res['methode']}**.")
+
+    colA, colB = st.columns(2)
+    with colA:
+        st.subheader("Table de contingence (n)")
+        st.dataframe(res["tab"], use_container_width=True)
+    with colB:
+        st.subheader(f"Taux de survie {horizon}m par groupe")
+        fig_rates = px.bar(
+            res["surv_by_group"], x="groupe_intensite", y="taux_survie_%",
+            text="taux_survie_%",
+            labels={"groupe_intensite": "Groupe d'intensité", "taux_survie_%": f"Taux de survie {horizon}m (%)"},
+            color="taux_survie_%", color_continuous_scale="Greens"
+        )
+        fig_rates.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
+        fig_rates.update_layout(xaxis_tickangle=-20)
+        plotly_chart(fig_rates, "fig_rates")
+
+    st.subheader("Test d’indépendance (Survie × Groupe d’intensité) — Décision")
+    if res["scipy"]:
+        test = res["test"]
+        p_value = test["p_value"]
+        if test["nom"] == "fisher":
+            st.write(f"**Test exact de Fisher** (2×2) — p-value = **{p_value:.4f}** (odds ratio ≈ {test['oddsratio']:.2f})")
+        else:
+            st.write(f"**Chi² = {test['chi2']:.3f}**, **ddl = {test['ddl']}**, **p-value = {p_value:.4f}**")
+            with st.expander("Voir les effectifs attendus"):
+                st.dataframe(test["attendus"].style.format(precision=1), use_container_width=True)
+
+        # Décision
+        if p_value < float(alpha):
+            st.success(f"**Décision** : p = {p_value:.4f} < α = {alpha} → **Rejet de H0**. "
+                       "Les taux de survie **diffèrent selon le niveau d’intensité d’aide** (dépendance).")
+        else:
+            st.info(f"ℹ**Décision** : p = {p_value:.4f} ≥ α = {alpha} → **Non-rejet de H0**. "
+                    f"Pas d’évidence suffisante que les taux de survie diffèrent selon l’intensité (au seuil {alpha}).")
+    else:
+        st.warning("SciPy n'est pas disponible : installe `scipy` pour exécuter le test du Chi² / Fisher.")
+
+    st.subheader("Inférence par rééchantillonnage")
+    perm = res["permutation"]
+    st.write(f"**Test de permutation** ({perm['replications']:,} réplications, Chi² = {perm['chi2']:.3f}) — "
+             f"p-value = **{perm['p_value']:.4f}** "
+             f"({'rejet' if perm['p_value'] < float(alpha) else 'non-rejet'} de H0 au seuil {alpha})")
+    st.dataframe(
+        res["ic_taux"].rename(columns={"n": "Entreprises", "taux_survie_%": f"Taux de survie {horizon}m (%)",
+                                       "ic_bas_%": "IC 95 % bas", "ic_haut_%": "IC 95 % haut"})
+                      .style.format(precision=2),
+        use_container_width=True,
+    )
+    st.caption(f"IC bootstrap (percentiles) ; graine fixe {DEFAULT_SEED} pour la reproductibilité.")
+
+    st.subheader("Tests par strate — " + " × ".join(res["stratifie"]["dimensions"] or ["cohorte entière"]))
+    strates, cmh = res["stratifie"]["strates"], res["stratifie"]["cmh"]
+    testees = strates.loc[strates["test"] != "non testable"]
+    rejets = int((testees["q_value"] < float(alpha)).sum())
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Strates testées", f"{len(testees):,}", f"{len(strates) - len(testees):,} non testables",
+              delta_color="off")
+    c2.metric(f"Significatives après Benjamini–Hochberg (α = {alpha})", f"{rejets:,}")
+    c3.metric("Odds ratio commun (Mantel–Haenszel)",
+              f"{cmh['odds_ratio_mh']:.2f}" if not np.isnan(cmh["odds_ratio_mh"]) else "n/d",
+              f"{res['stratifie']['groupes'][0]} = référence", delta_color="off")
+    if not np.isnan(cmh["p_value"]):
+        st.write(f"**Cochran–Mantel–Haenszel** (association générale, {cmh['strates']:,} strates) : "
+                 f"CMH = {cmh['cmh']:.3f}, ddl = {cmh['ddl']}, p-value = **{cmh['p_value']:.4f}** "
+                 f"({'rejet' if cmh['p_value'] < float(alpha) else 'non-rejet'} de H0 au seuil {alpha})")
+    st.dataframe(
+        testees.assign(rejet_h0=testees["q_value"] < float(alpha))
+               .drop(columns=["groupes", "attendu_min"])
+               .rename(columns={"nb": "Entreprises", "groupe_ref": "Groupe de référence",
+                                "taux_survie_ref_%": "Survie groupe de référence (%)",
+                                "taux_survie_autres_%": "Survie autres groupes (%)"}),
+        use_container_width=True, hide_index=True,
+        column_config={c: st.column_config.NumberColumn(format="%.4f") for c in ("p_chi2", "p_fisher", "p_value", "q_value")},
+    )
+    st.caption(f"Classement par q-value (Benjamini–Hochberg, taux de fausses découvertes ≤ α). Fisher exact "
+               f"(premier groupe présent dans la strate contre les autres) si la table est 2 × 2 ou si un effectif "
+               f"attendu est < 5, Chi² sinon ; odds ratio commun > 1 : les autres groupes survivent mieux que "
+               f"« {res['stratifie']['groupes'][0]} ».")
+
+    if res["niveau"] == "siren":
+        st.caption(
+            "⚠️ Rappel : aides **au niveau SIREN**, mais comparaison **non ajustée** (les lauréats diffèrent des "
+            "autres entreprises) → résultat **descriptif**. Estimation ajustée sur les covariables : Partie 4 bis (PSM / AIPW)."
+        )
+    else:
+        st.caption(
+            "⚠️ Rappel : comparaison **agrégée par catégorie** → résultat **descriptif**, non causal. "
+            "Pour inférer un impact, il faut des aides **au niveau SIREN** et un design d’identification (PSM/AIPW, DiD…)."
+        )
 
-            # 5.2 Joindre l'intensité à chaque SIREN (via sa catégorie)
-            base = cohort.merge(
-                mix[["categorieEntreprise", "intensite_par_entreprise"]],
-                on="categorieEntreprise", how="left"
-            )
-            base = base.dropna(subset=["intensite_par_entreprise"]).copy()
-            if base.empty:
-                st.info("Aucune intensité disponible pour la cohorte 2020 (après jointure).")
-            else:
-                # 5.3 Création automatique et robuste des groupes d'intensité
-                def make_groups_auto(df_base: pd.DataFrame):
-                    """
-                    Tente un binning par quantiles 4 → 3 → 2.
-                    En dernier recours, split binaire par médiane (High vs Low).
-                    Retourne df_grouped avec 'groupe_intensite' et une info 'method'.
-                    """
-                    df = df_base.copy()
-
-                    # Tentatives quantiles
-                    for q in [4, 3, 2]:
-                        try:
-                            df["groupe_intensite"] = pd.qcut(
-                                df["intensite_par_entreprise"], q=q, duplicates="drop"
-                            )
-                            if df["groupe_intensite"].nunique() >= 2:
-                                return df, {"method": f"quantiles_{q}"}
-                        except Exception:
-                            # Fallback sur cut si qcut échoue
-                            try:
-                                df["groupe_intensite"] = pd.cut(
-                                    df["intensite_par_entreprise"], bins=q, include_lowest=True
-                                )
-                                if df["groupe_intensite"].nunique() >= 2:
-                                    return df, {"method": f"cut_{q}"}
-                            except Exception:
-                                pass
-
-                    # Dernier recours : split médian
-                    med = np.nanmedian(df_base["intensite_par_entreprise"])
-                    df_base = df_base.copy()
-                    df_base["groupe_intensite"] = np.where(
-                        df_base["intensite_par_entreprise"] <= med, "Low (≤ médiane)", "High (> médiane)"
-                    )
-                    if df_base["groupe_intensite"].nunique() >= 2:
-                        return df_base, {"method": "median_split"}
-
-                    return df_base, {"method": "failed"}
-
-                grouped, meta = make_groups_auto(base)
-
-                if grouped["groupe_intensite"].nunique() < 2:
-                    st.info("Impossible de constituer ≥ 2 groupes d’intensité (valeurs identiques ou trop peu d’observations).")
-                else:
-                    st.caption(f"Grouping utilisé : **{meta['method']}**.")
-
-                    # 5.4 Table de contingence et taux par groupe
-                    tab = pd.crosstab(grouped["groupe_intensite"], grouped["Survie_24m"]).sort_index()
-                    surv_by_group = grouped.groupby("groupe_intensite")["Survie_24m"].mean().mul(100).reset_index(name="taux_survie_%")
-
-                    colA, colB = st.columns(2)
-                    with colA:
-                        st.subheader("Table de contingence (n)")
-                        st.dataframe(tab, use_container_width=True)
-                    with colB:
-                        st.subheader("Taux de survie 24m par groupe")
-                        fig_rates = px.bar(
-                            surv_by_group, x="groupe_intensite", y="taux_survie_%",
-                            text="taux_survie_%",
-                            labels={"groupe_intensite": "Groupe d'intensité", "taux_survie_%": "Taux de survie 24m (%)"},
-                            color="taux_survie_%", color_continuous_scale="Greens"
-                        )
-                        fig_rates.update_traces(texttemplate="%{text:.1f}%", textposition="outside")
-                        fig_rates.update_layout(xaxis_tickangle=-20)
-                        st.plotly_chart(fig_rates, use_container_width=True)
-
-                    # 5.5 Test du Chi² (ou Fisher si 2×2) + décision selon α
-                    try:
-                        from scipy.stats import chi2_contingency, fisher_exact
-                        has_scipy = True
-                    except Exception:
-                        has_scipy = False
-
-                    st.subheader("Test d’indépendance (Survie × Groupe d’intensité) — Décision")
-                    if has_scipy:
-                        if tab.shape == (2, 2):
-                            # Test exact de Fisher si 2 groupes × 2 issues
-                            oddsratio, p_fisher = fisher_exact(tab.values)
-                            p_value = float(p_fisher)
-                            st.write(f"**Test exact de Fisher** (2×2) — p-value = **{p_value:.4f}** (odds ratio ≈ {oddsratio:.2f})")
-                        else:
-                            chi2, p, dof, expected = chi2_contingency(tab.values)
-                            p_value = float(p)
-                            st.write(f"**Chi² = {chi2:.3f}**, **ddl = {dof}**, **p-value = {p_value:.4f}**")
-                            with st.expander("Voir les effectifs attendus"):
-                                exp_df = pd.DataFrame(expected, index=tab.index, columns=tab.columns)
-                                st.dataframe(exp_df.style.format(precision=1), use_container_width=True)
-
-                        # Décision
-                        if p_value < float(alpha):
-                            st.success(f"**Décision** : p = {p_value:.4f} < α = {alpha} → **Rejet de H0**. "
-                                       "Les taux de survie **diffèrent selon le niveau d’intensité d’aide** (dépendance).")
-                        else:
-                            st.info(f"ℹ**Décision** : p = {p_value:.4f} ≥ α = {alpha} → **Non-rejet de H0**. "
-                                    f"Pas d’évidence suffisante que les taux de survie diffèrent selon l’intensité (au seuil {alpha}).")
-                    else:
-                        st.warning("SciPy n'est pas disponible : installe `scipy` pour exécuter le test du Chi² / Fisher.")
-
-                    st.caption(
-                        "⚠️ Rappel : comparaison **agrégée par catégorie** → résultat **descriptif**, non causal. "
-                        "Pour inférer un impact, il faut des aides **au niveau SIREN** et un design d’identification (PSM/AIPW, DiD…)."
-                    )
+res_test = prepare_test(DATA_PATH, data_fp, annee_cohorte, col_survie, aides_fp, dfa, laureats_fp, aid_index,
+                        departements)
+mem = res_test["memoire"]
+if mem:
+    st.sidebar.caption(f"Mémoire de la cohorte (Partie 4) : {mem['avant'] / 1e6:,.1f} Mo partagés (Arrow) → "
+                       f"{mem['apres'] / 1e6:,.1f} Mo (pandas)")
+section_test(res_test)
+
+# =====================================================
+# === PARTIE 4 bis — Effet des aides : appariement sur le score (PSM) et AIPW
+# === Aidées vs non aidées à covariables comparables (aides au niveau SIREN uniquement)
+# =====================================================
+@counted(st.cache_data)
+def estimate_aid_effect(path=DATA_PATH, fingerprint=None, annee=ANNEE_COHORTE, col_survie="Survie_24m",
+                        laureats_fingerprint=None, _aid_index=None, departements=None) -> dict:
+    # Cohorte + covariables (catégorie, tranche, ancienneté, NAF) ; aidée = lauréate (aide > 0)
+    df = load_data(path, fingerprint, columns=("siren", "annee", *COVARIATE_COLUMNS, col_survie), years=(annee,),
+                   departements=departements)
+    return aid_effect(df, annee, col_survie, _aid_index, load_event_index(path, fingerprint))
+
+if aid_index is not None:
+    st.header("Partie 4 bis — Effet des aides : appariement sur le score (PSM) et AIPW")
+    with st.spinner("Score de propension, appariement et bootstrap…"):
+        effet = estimate_aid_effect(DATA_PATH, data_fp, annee_cohorte, col_survie, laureats_fp, aid_index, departements)
+    if not effet:
+        st.info(f"Il faut des entreprises aidées et non aidées dans la cohorte {annee_cohorte}.")
+    else:
+        st.markdown(
+            f"""
+**Effet de l’aide sur la survie à {horizon} mois**, en points de pourcentage, à covariables comparables
+({", ".join(effet["covariables"])}) :
+- **Appariement (ATT)** : chaque entreprise aidée est comparée aux non aidées de **score de propension** le plus proche
+  (caliper {effet["caliper"]:.3f} sur le logit du score) — effet **sur les entreprises aidées** ;
+- **AIPW (ATE)** : pondération par l’inverse du score + modèles de survie, **doublement robuste** — effet **moyen sur la cohorte**.
+            """
+        )
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Entreprises aidées", f"{effet['n_aides']:,}")
+        c2.metric("Aidées appariées", f"{effet['n_apparies']:,}",
+                  f"{100 * effet['n_apparies'] / effet['n_aides']:.1f} % dans le support commun", delta_color="off")
+        c3.metric("Profils de covariables", f"{effet['n_profils']:,}")
+
+        resultats = effet["resultats"].copy()
+        for col in ("effet", "erreur_type", "ic_bas", "ic_haut"):
+            resultats[col] = 100 * resultats[col]
+        st.dataframe(
+            resultats.rename(columns={"estimateur": "Estimateur", "effet": "Effet (points)", "erreur_type": "Erreur type",
+                                      "ic_bas": "IC 95 % bas", "ic_haut": "IC 95 % haut"})
+                     .style.format(precision=2),
+            use_container_width=True,
+        )
+        st.caption(f"Erreurs types et IC : bootstrap ({effet['n_boot']} réplications, graine fixe {DEFAULT_SEED}).")
+
+        with st.expander("Équilibre des covariables (différences moyennes standardisées)"):
+            equilibre = effet["equilibre"].assign(ecart=lambda t: t["smd_avant"].abs()).sort_values("ecart", ascending=False)
+            st.dataframe(equilibre[["smd_avant", "smd_apres"]]
+                         .rename(columns={"smd_avant": "Avant appariement", "smd_apres": "Après appariement"})
+                         .style.format(precision=3), use_container_width=True)
+            st.caption("Équilibre satisfaisant si |SMD| < 0,1 après appariement.")
+        st.caption("⚠️ Hypothèse : pas de facteur de confusion non observé (au-delà des covariables ci-dessus) — "
+                   "l’effet reste une estimation sous cette hypothèse.")
+
+# =====================================================
+# === DIAGNOSTICS (DIAGNOSTICS=1) — temps, mémoire, lignes, caches
+# =====================================================
+if DIAGNOSTICS:
+    with st.sidebar.expander("🩺 Diagnostics", expanded=False):
+        spans = traces[-1].frame()
+        racine = spans.loc[spans["profondeur"] == 0]
+        st.caption(f"Dernière exécution : {racine['duree_s'].sum():.2f} s instrumentées, "
+                   f"pic Python {spans['pic_mo'].max() if len(spans) else 0:,.1f} Mo (mémoire du processus : "
+                   f"approché pour les étapes « pic partagé » avec une autre session).")
+        st.dataframe(
+            racine.groupby("type")[["duree_s"]].sum().sort_values("duree_s", ascending=False)
+                  .rename(columns={"duree_s": "Durée (s)"}).style.format(precision=3),
+            use_container_width=True,
+        )
+        st.dataframe(
+            spans.assign(etape=lambda t: t["profondeur"].map(lambda d: "· " * d) + t["etape"])
+                 .drop(columns=["profondeur", "debut_s"])
+                 .rename(columns={"etape": "Étape", "type": "Type", "duree_s": "Durée (s)", "pic_mo": "Pic Python (Mo)",
+                                  "pic_partage": "Pic partagé", "arrow_mo": "Δ Arrow (Mo)", "lignes": "Lignes"})
+                 .style.format({"Durée (s)": "{:.3f}", "Pic Python (Mo)": "{:.1f}", "Δ Arrow (Mo)": "{:.1f}",
+                                "Lignes": "{:,.0f}"}, na_rep=""),
+            use_container_width=True, hide_index=True,
+        )
+        st.caption(f"Caches (session, {len(traces)} exécutions)")
+        st.dataframe(cache_table(traces).style.format({"taux_succes_%": "{:.0f} %"}), use_container_width=True,
+                     hide_index=True)
+        st.download_button("Exporter la trace (Chrome / Perfetto)", json.dumps(chrome_trace(traces)),
+                           file_name="trace_dashboard.json", mime="application/json")
+    if TRACE_PATH:
+        export(traces, TRACE_PATH)
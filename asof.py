@@ -0,0 +1,120 @@
+# ======================================================
+# INDEX « AS-OF » : ÉTAT ET ATTRIBUTS DES UNITÉS LÉGALES À UNE DATE
+# ======================================================
+#
+# Le notebook gardait une ligne quelconque par siren × année
+# (drop_duplicates) : une entreprise fermée puis rouverte la même année avait
+# un état au hasard, et catégorie, tranche d'effectif et ancienneté n'étaient
+# qu'« à peu près » celles de l'année observée.
+#
+# Ici, l'historique trié par (siren, dateDebut) (EventIndex de survival.py)
+# porte, pour chaque période, des codes compacts (int8 / int16) :
+#   - état administratif (historisé par Sirene) ;
+#   - catégorie d'entreprise et tranche d'effectif : l'INSEE ne les historise
+#     pas (une valeur courante par unité légale, celle du stock), elles sont
+#     donc reportées sur toutes les périodes ; un historique qui les fournirait
+#     par période serait lu tel quel ;
+#   - année de création (ancienneté à la date demandée).
+# « État, catégorie, tranche de ces N siren à la date D » est une seule
+# recherche dichotomique vectorisée (survival.locate) : la période en vigueur
+# est la dernière dont dateDebut <= D, à date égale la dernière lue.
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from schema import CATEGORIE_DTYPE, ETAT_DTYPE, TRANCHE_DTYPE
+from survival import HISTORY_DIR, EventIndex, build_index, locate, reference_dates
+
+# Colonnes d'attributs de l'historique (_historique/), en plus de siren, dateDebut, état
+ATTRIBUTES = {"categorieEntreprise": CATEGORIE_DTYPE, "trancheEffectifsUniteLegale": TRANCHE_DTYPE}
+CREATION = "anneeCreation"
+
+
+@dataclass(frozen=True)
+class AsOfIndex:
+    """Historique trié + attributs par période (None si absents de l'historique)."""
+    events: EventIndex
+    attributes: dict       # colonne → codes int8 par période (-1 si inconnu)
+    creation: np.ndarray   # int16, année de création par période (-1 si inconnue), ou None
+
+
+def attribute_codes(s: pd.Series, dtype: pd.CategoricalDtype) -> np.ndarray:
+    """Codes int8 d'une colonne d'attribut (chaînes ou catégorielle) ; -1 si inconnu."""
+    # Nettoyage des seules valeurs distinctes, puis report sur les lignes
+    codes, uniques = pd.factorize(s)
+    cleaned = pd.Series(uniques, dtype="string").str.strip().str.upper()
+    lookup = np.append(pd.Categorical(cleaned, dtype=dtype).codes, -1).astype(np.int8)
+    return lookup[codes]
+
+
+def creation_years(s: pd.Series) -> np.ndarray:
+    """Année de création (int16, -1 si inconnue) depuis une date ou une année."""
+    if not pd.api.types.is_numeric_dtype(s):
+        s = pd.to_datetime(s, errors="coerce").dt.year
+    return pd.to_numeric(s, errors="coerce").fillna(-1).astype(np.int16).to_numpy()
+
+
+def build_asof(events: pd.DataFrame) -> AsOfIndex:
+    """
+    Index depuis (siren, dateDebut, etatAdministratifUniteLegale [, catégorie,
+    tranche, anneeCreation]). À date égale, l'ordre d'entrée est conservé.
+    """
+    days = pd.to_datetime(events["dateDebut"]).to_numpy().astype("datetime64[D]")
+    # Tri ici (stable) : build_index le retrouve tel quel et les attributs restent alignés
+    events = events.iloc[np.lexsort((days, events["siren"].to_numpy().astype(np.uint32)))]
+    return AsOfIndex(
+        events=build_index(events),
+        attributes={col: attribute_codes(events[col], dtype) for col, dtype in ATTRIBUTES.items()
+                    if col in events.columns},
+        creation=creation_years(events[CREATION]) if CREATION in events.columns else None,
+    )
+
+
+def load_asof(path: str) -> AsOfIndex:
+    """Index de l'historique écrit par preprocessing.py dans `<dataset>/_historique`."""
+    table = ds.dataset(os.path.join(path, HISTORY_DIR), format="parquet").to_table()
+    return build_asof(table.to_pandas())
+
+
+def as_of(index: AsOfIndex, sirens, dates) -> pd.DataFrame:
+    """
+    État, catégorie, tranche d'effectif et ancienneté de chaque siren à la date
+    correspondante (NaN si le siren n'a aucune période connue à cette date).
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    pos, found = locate(index.events, sirens, dates)
+    pos = np.where(found, pos, 0)
+
+    def pick(codes):
+        return np.where(found, codes[pos], -1) if len(codes) else np.full(len(pos), -1, dtype=np.int8)
+
+    out = pd.DataFrame({"etatAdministratifUniteLegale": pd.Categorical.from_codes(pick(index.events.etats),
+                                                                                  dtype=ETAT_DTYPE)})
+    for col, codes in index.attributes.items():
+        out[col] = pd.Categorical.from_codes(pick(codes), dtype=ATTRIBUTES[col])
+    if index.creation is not None:
+        creation = pick(index.creation).astype(np.float32)
+        age = dates.astype("datetime64[Y]").astype(np.int64) + 1970 - creation
+        out["anciennete"] = np.where((creation >= 0) & (age >= 0), age, np.nan).astype(np.float32)
+    return out
+
+
+def cohort_as_of(index: AsOfIndex, cohort: pd.DataFrame, annee: int) -> pd.DataFrame:
+    """
+    Cohorte `annee` (une ligne par siren) avec état, catégorie, tranche et
+    ancienneté lus dans l'index au 31/12/annee ; les siren absents de l'historique
+    gardent les valeurs de leur ligne. Sans index, `cohort` est rendue telle quelle.
+    """
+    if index is None or cohort.empty:
+        return cohort
+    snap = as_of(index, cohort["siren"].to_numpy(), reference_dates(np.full(len(cohort), annee), 0))
+    known = snap["etatAdministratifUniteLegale"].notna().to_numpy()
+    cohort = cohort.copy()
+    for col in snap.columns.intersection(cohort.columns):
+        value = snap[col].set_axis(cohort.index)
+        cohort[col] = value.where(known, cohort[col].astype(value.dtype))
+    return cohort
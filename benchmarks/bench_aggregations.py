@@ -0,0 +1,90 @@
+# ======================================================
+# BENCHMARK : lambdas par groupe vs moteur vectorisé (aggregations.py)
+# ======================================================
+#
+#     python benchmarks/bench_aggregations.py [nb_lignes]   (défaut : 10 000 000)
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregations import aggregate  # noqa: E402
+from schema import ETAT_DTYPE, TRANCHE_DTYPE, age_bins, tranche_labels  # noqa: E402
+
+
+def make_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "siren": rng.integers(100_000_000, 100_000_000 + n // 3, n, dtype=np.uint32),
+        "etatAdministratifUniteLegale": pd.Categorical.from_codes(rng.choice(2, n, p=[0.8, 0.2]), dtype=ETAT_DTYPE),
+        "trancheEffectifsUniteLegale": pd.Categorical.from_codes(rng.integers(0, 16, n), dtype=TRANCHE_DTYPE),
+        "anciennete": rng.integers(0, 120, n).astype(np.float32),
+        "Survie_24m": rng.integers(0, 2, n, dtype=np.int8),
+    })
+
+
+# Implémentations historiques (app.py avant le moteur vectorisé)
+def lambdas_closures(df, dim):
+    return (
+        pd.DataFrame({"dim": dim, "etat": df["etatAdministratifUniteLegale"], "siren": df["siren"]})
+          .groupby("dim", dropna=False, observed=True)
+          .agg(nb_total=("siren", lambda s: s.dropna().nunique()),
+               nb_fermees=("etat", lambda x: (x == "C").sum()))
+          .reset_index()
+    )
+
+
+def lambdas_survival(df, dim):
+    return (
+        pd.DataFrame({"dim": dim, "Survie_24m": df["Survie_24m"], "siren": df["siren"]})
+          .groupby("dim", dropna=False, observed=True)
+          .agg(nb_total=("siren", lambda s: s.dropna().nunique()),
+               taux_survie=("Survie_24m", lambda s: float(s.mean() * 100) if len(s) else np.nan))
+          .reset_index()
+    )
+
+
+def vectorized_closures(df, dim):
+    return aggregate(dim, df["siren"], df["etatAdministratifUniteLegale"] == "C")
+
+
+def vectorized_survival(df, dim):
+    return aggregate(dim, df["siren"], df["Survie_24m"])
+
+
+def timed(fn, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(n: int) -> None:
+    df = make_frame(n)
+    dims = {
+        "age": age_bins(df["anciennete"]).rename("dim"),
+        "tranche": tranche_labels(df["trancheEffectifsUniteLegale"]).rename("dim"),
+    }
+    print(f"{n:,} lignes")
+    print(f"{'bloc':<18}{'lambdas (s)':>14}{'vectorisé (s)':>16}{'gain':>8}")
+    for dim_name, dim in dims.items():
+        for kind, old, new, num in (("fermeture", lambdas_closures, vectorized_closures, "nb_fermees"),
+                                    ("survie", lambdas_survival, vectorized_survival, "taux_survie")):
+            t_old, ref = timed(old, df, dim)
+            t_new, res = timed(new, df, dim)
+            # Contrôle de parité
+            assert (ref["nb_total"].to_numpy() == res["nb_siren"].to_numpy()).all()
+            got = res["nb_flag"] if num == "nb_fermees" else 100 * res["nb_flag"] / res["nb_lignes"]
+            assert np.allclose(ref[num].to_numpy(dtype=float), got.to_numpy(dtype=float))
+            print(f"{kind + '_' + dim_name:<18}{t_old:>14.3f}{t_new:>16.3f}{t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
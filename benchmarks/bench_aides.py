@@ -0,0 +1,71 @@
+# ======================================================
+# BENCHMARK : jointure cohorte × lauréats (aides.py) vs merge pandas
+# ======================================================
+#
+#     python benchmarks/bench_aides.py [nb_siren_cohorte] [nb_laureats]   (défaut : 5 000 000, 200 000)
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aides import aid_by_measure, aid_intensity, build_aid_index  # noqa: E402
+
+MESURES = ["Efficacité énergétique", "Relocalisation", "Aéronautique", "Automobile", "Nucléaire",
+           "Projets territoriaux", "Santé - Capacités Covid", "Soutien à la chaleur bas carbone"]
+
+
+def make_data(n: int, k: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    cohort = rng.choice(999_999_999, n, replace=False).astype(np.int64)
+    # Lauréats : majoritairement dans la cohorte, 1 à 3 mesures chacun
+    laureats = np.concatenate([rng.choice(cohort, k - k // 10, replace=False),
+                               rng.choice(999_999_999, k // 10).astype(np.int64)])
+    rows = rng.integers(1, 4, len(laureats))
+    siren = np.repeat(laureats, rows)
+    df = pd.DataFrame({
+        "siren": siren,
+        "mesure": "",
+        "mesure_light": rng.choice(MESURES, len(siren)),
+        "montant": np.round(rng.lognormal(11, 1.2, len(siren)), 2),
+        "investissement": 0.0,
+    })
+    return cohort, df
+
+
+def main(n: int, k: int) -> None:
+    cohort, laureats = make_data(n, k)
+
+    t0 = time.perf_counter()
+    index = build_aid_index(laureats)
+    t_index = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    intensite = aid_intensity(index, cohort)
+    t_join = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    par_mesure = aid_by_measure(index, cohort)
+    t_mesure = time.perf_counter() - t0
+
+    # Référence : agrégation groupby + merge pandas
+    t0 = time.perf_counter()
+    totaux = laureats.groupby("siren")["montant"].sum()
+    ref = (pd.DataFrame({"siren": cohort}).merge(totaux.rename("aide").reset_index(), on="siren", how="left")
+             ["aide"].fillna(0.0).to_numpy())
+    t_pandas = time.perf_counter() - t0
+
+    assert np.allclose(intensite, ref)
+    ref_mesure = laureats.loc[laureats["siren"].isin(cohort)].groupby("mesure_light")["montant"].sum()
+    assert np.allclose(par_mesure.reindex(ref_mesure.index).to_numpy(), ref_mesure.to_numpy())
+    print(f"{n:,} siren de cohorte, {len(index):,} lauréats ({len(laureats):,} lignes)")
+    print(f"index {t_index:.3f} s, jointure (répertoire) {t_join:.3f} s, par mesure {t_mesure:.3f} s "
+          f"— groupby + merge pandas {t_pandas:.3f} s ({t_pandas / t_join:.1f}x)")
+    print(f"{int((intensite > 0).sum()):,} entreprises aidées, {intensite.sum():,.0f} € au total")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
@@ -0,0 +1,76 @@
+# ======================================================
+# BENCHMARK + PARITÉ : secteurs NAF par sommation des classes du cube (naf.rollup)
+# ======================================================
+#
+#     python benchmarks/bench_naf.py [nb_lignes]   (défaut : 5 000 000)
+#
+# Pour chaque niveau (section, division, groupe, classe) : taux de fermeture
+# et de survie obtenus en sommant les classes du cube, comparés à un groupby
+# direct sur les lignes (codes APE rév. 1 et rév. 2 mêlés).
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import sector_rates  # noqa: E402
+from bench_aggregations import make_frame  # noqa: E402
+from cube import build_cube  # noqa: E402
+from naf import LEVELS, NAF_COLUMN, NOMENCLATURE_COLUMN, parse  # noqa: E402
+
+ANNEE, HORIZON = 2020, 24
+CODES = {"NAFRev2": ["62.01Z", "62.02A", "62.09Z", "47.11B", "47.91A", "01.11Z", "10.71C", "86.21Z"],
+         "NAFRev1": ["74.1A", "74.1G", "52.1D", "15.8C", "55.3A"]}
+
+
+def make_dataset(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = make_frame(n, seed)
+    df["annee"] = rng.integers(2015, 2025, n).astype(np.int16)
+    df = df.drop_duplicates(subset=["siren", "annee"], ignore_index=True)
+    pairs = [(nom, code) for nom, codes in CODES.items() for code in codes]
+    pick = rng.integers(0, len(pairs), len(df))
+    df[NOMENCLATURE_COLUMN] = np.array([nom for nom, _ in pairs], dtype=object)[pick]
+    df[NAF_COLUMN] = np.array([code for _, code in pairs], dtype=object)[pick]
+    return df
+
+
+def direct(df: pd.DataFrame, level: str) -> pd.DataFrame:
+    """Référence : niveaux NAF des codes distincts, joints aux lignes brutes, puis groupby."""
+    codes = df[[NAF_COLUMN, NOMENCLATURE_COLUMN]].drop_duplicates()
+    levels = pd.DataFrame([parse(c, n) for c, n in zip(codes[NAF_COLUMN], codes[NOMENCLATURE_COLUMN])],
+                          columns=["nomenclature"] + LEVELS, index=codes.index)
+    levels = pd.concat([codes, levels.drop(columns="nomenclature")], axis=1)
+    rows = (df.merge(levels, on=[NAF_COLUMN, NOMENCLATURE_COLUMN])
+              .rename(columns={NOMENCLATURE_COLUMN: "nomenclature"})
+              .assign(ferme=lambda d: d["etatAdministratifUniteLegale"] == "C"))
+    ferm = rows.groupby(["nomenclature", level]).agg(nb_lignes=("siren", "size"), nb_fermees=("ferme", "sum"))
+    cohort = rows.loc[rows["annee"] == ANNEE]
+    surv = cohort.groupby(["nomenclature", level]).agg(nb_cohorte=("siren", "size"),
+                                                       nb_survivantes=("Survie_24m", "sum"))
+    return ferm.join(surv, how="outer").fillna(0).astype("int64").reset_index()
+
+
+def main(n: int) -> None:
+    df = make_dataset(n)
+    t0 = time.perf_counter()
+    cube = build_cube(df)
+    print(f"{len(df):,} lignes : cube {time.perf_counter() - t0:.2f} s")
+    for level in LEVELS:
+        t0 = time.perf_counter()
+        ref = direct(df, level)
+        t_direct = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        res = sector_rates(cube, ANNEE, HORIZON, level)
+        t_rollup = time.perf_counter() - t0
+        pd.testing.assert_frame_equal(res[ref.columns], ref, check_dtype=False)
+        print(f"  {level:9s} {len(res):3d} codes : groupby direct {t_direct:7.3f} s, sommation du cube {t_rollup:7.4f} s")
+    print("parité OK")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
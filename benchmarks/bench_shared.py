@@ -0,0 +1,77 @@
+# ======================================================
+# BENCHMARK : copie par session (st.cache_data) vs table Arrow partagée (mmap)
+# ======================================================
+#
+#     python benchmarks/bench_shared.py [nb_lignes] [nb_sessions]   (défaut : 10 000 000, 20)
+#
+# st.cache_data renvoie à chaque session une copie désérialisée (pickle) du
+# DataFrame ; la table partagée (data_loader.open_shared_table) est projetée
+# une fois en mémoire et chaque session n'en convertit que la tranche utile.
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_loader  # noqa: E402
+from bench_aggregations import make_frame  # noqa: E402
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def main(n: int, sessions: int) -> None:
+    df = make_frame(n).drop(columns="anciennete")
+    df["annee"] = np.random.default_rng(1).integers(2015, 2025, n).astype(np.int16)
+    workdir = tempfile.mkdtemp(prefix="bench-shared-")
+    data_loader.SHARED_DIR = os.path.join(workdir, "shared")
+    try:
+        src = os.path.join(workdir, "data_parquet")
+        data_loader.write_partitioned(df, src)
+        blob = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # st.cache_data : une copie complète par session
+        t0 = time.perf_counter()
+        copies = [pickle.loads(blob) for _ in range(sessions)]
+        t_copy = (time.perf_counter() - t0) / sessions
+        mem_copy = sum(data_loader.memory_footprint(c) for c in copies)
+        del copies
+
+        # Table partagée : construite une fois, ouverte (mmap) une fois par processus
+        t0 = time.perf_counter()
+        table = data_loader.open_shared_table(src, "bench")
+        t_build = time.perf_counter() - t0
+        rss_before = rss_mb()
+        t0 = time.perf_counter()
+        frames = [data_loader.table_to_frame(table, ["siren", "annee", "Survie_24m"], years=[2020])
+                  for _ in range(sessions)]
+        t_slice = (time.perf_counter() - t0) / sessions
+        mem_slice = sum(data_loader.memory_footprint(f) for f in frames)
+
+        ref = df.loc[df["annee"] == 2020, ["siren", "annee", "Survie_24m"]]
+        assert len(frames[0]) == len(ref) and frames[0]["siren"].sum() == ref["siren"].sum()
+        print(f"{n:,} lignes, {sessions} sessions")
+        print(f"cache_data : {t_copy * 1e3:8.1f} ms / session, {mem_copy / 1e6:8.1f} Mo au total")
+        print(f"partagée   : {t_slice * 1e3:8.1f} ms / session (tranche 2020), {mem_slice / 1e6:8.1f} Mo au total"
+              f" + table mmap {table.nbytes / 1e6:.1f} Mo (construite en {t_build:.1f} s)")
+        print(f"mémoire Arrow allouée : {pa.total_allocated_bytes() / 1e6:.1f} Mo, "
+              f"RSS +{rss_mb() - rss_before:.1f} Mo pendant les tranches")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,61 @@
+# ======================================================
+# BENCHMARK : cube exact vs cube approché en flux (croquis HyperLogLog)
+# ======================================================
+#
+#     python benchmarks/bench_sketch.py [nb_lignes] [lignes_par_bloc]   (défaut : 5 000 000, 1 000 000)
+#
+# Le cube approché lit la source par blocs d'années ; les siren distincts
+# toutes années confondues sont estimés par fusion des croquis. Contrôle :
+# écart relatif de chaque cellule < 4 erreurs types.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_sql import make_dataset  # noqa: E402
+from cube import SKETCHES, VIEWS, build_cube_streaming, compute_cube, view  # noqa: E402
+from sketch import SKETCH_ERROR, precision_for, standard_error  # noqa: E402
+
+
+def timed(fn, *args, **kwargs):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main(n: int, max_rows: int) -> None:
+    workdir = tempfile.mkdtemp(prefix="bench-sketch-")
+    try:
+        source = os.path.join(workdir, "data_parquet")
+        make_dataset(n, source)
+        p = precision_for(SKETCH_ERROR)
+        exact, t_exact, mem_exact = timed(compute_cube, source, backend="pandas")
+        approx, t_approx, mem_approx = timed(build_cube_streaming, source, p, max_rows)
+        print(f"{n:,} lignes, p = {p} (erreur type {100 * standard_error(p):.2f} %), blocs de {max_rows:,} lignes")
+        print(f"exact   : {t_exact:6.2f} s, pic mémoire Python {mem_exact / 1e6:8.1f} Mo")
+        print(f"approché: {t_approx:6.2f} s, pic mémoire Python {mem_approx / 1e6:8.1f} Mo")
+        for name in VIEWS:
+            a, b = view(exact, name), view(approx, name)
+            assert a.shape == b.shape, name
+            for measure in SKETCHES.values():
+                if measure not in a or not a[measure].any():
+                    continue
+                err = ((b[measure] - a[measure]).abs() / a[measure].clip(lower=1)).max()
+                print(f"  {name:10s} {measure:17s} écart relatif max {100 * err:.2f} %")
+                assert err < 4 * standard_error(p), (name, measure, err)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000)
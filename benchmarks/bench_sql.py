@@ -0,0 +1,80 @@
+# ======================================================
+# BENCHMARK + PARITÉ : cube pandas vs cube SQL DuckDB (sql_backend.py)
+# ======================================================
+#
+#     python benchmarks/bench_sql.py [nb_lignes] [source]   (défaut : 5 000 000, dataset synthétique)
+#
+# Avec `source` (dataset Parquet, fichier Parquet ou CSV), la parité est
+# vérifiée sur ces données plutôt que sur le jeu synthétique.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sql_backend  # noqa: E402
+from bench_aggregations import make_frame  # noqa: E402
+from cube import VIEWS, compute_cube, view  # noqa: E402
+from data_loader import write_partitioned  # noqa: E402
+from naf import NAF_COLUMN, NOMENCLATURE_COLUMN  # noqa: E402
+from schema import CATEGORIE_DTYPE  # noqa: E402
+from survival import SURVIVAL_COLUMNS  # noqa: E402
+
+
+def make_dataset(n: int, dst: str, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    df = make_frame(n, seed)
+    df["annee"] = rng.integers(2015, 2025, n).astype(np.int16)
+    df["categorieEntreprise"] = pd.Categorical.from_codes(rng.integers(-1, 3, n), dtype=CATEGORIE_DTYPE)
+    df.loc[rng.random(n) < 0.05, "anciennete"] = np.nan
+    for col in SURVIVAL_COLUMNS:
+        df[col] = rng.integers(0, 2, n, dtype=np.int8)
+    # Codes APE des deux révisions côte à côte (nomenclature parfois absente)
+    codes = np.array(["62.01Z", "47.11B", "01.11Z", "74.1A", "52.1D", "15.8C"], dtype=object)
+    pick = rng.integers(0, len(codes), n)
+    df[NAF_COLUMN] = codes[pick]
+    df[NOMENCLATURE_COLUMN] = np.where(rng.random(n) < 0.02, None, np.where(pick < 3, "NAFRev2", "NAFRev1"))
+    # Une ligne par siren × année, comme en sortie de preprocessing.py
+    write_partitioned(df.drop_duplicates(subset=["siren", "annee"]), dst)
+
+
+def check_parity(source: str) -> dict:
+    """Construit le cube par les deux backends et compare chaque vue ; retourne les durées."""
+    t0 = time.perf_counter()
+    ref = compute_cube(source, backend="pandas")
+    t_pandas = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    res = compute_cube(source, backend="duckdb")
+    t_sql = time.perf_counter() - t0
+    for name in VIEWS:
+        a, b = view(ref, name), view(res, name)
+        assert a.equals(b), f"vue « {name} » différente :\n{a.compare(b) if a.shape == b.shape else (a.shape, b.shape)}"
+    return {"pandas_s": t_pandas, "duckdb_s": t_sql}
+
+
+def main(n: int, source: str = None) -> None:
+    if not sql_backend.available():
+        sys.exit("Paquet `duckdb` absent : pip install duckdb")
+    workdir = None
+    if source is None:
+        workdir = tempfile.mkdtemp(prefix="bench-sql-")
+        source = os.path.join(workdir, "data_parquet")
+        make_dataset(n, source)
+    try:
+        t = check_parity(source)
+        print(f"{source} : parité OK sur {len(VIEWS)} vues")
+        print(f"pandas {t['pandas_s']:.2f} s, DuckDB {t['duckdb_s']:.2f} s ({os.cpu_count()} cœurs)")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000,
+         sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,126 @@
+# ======================================================
+# BENCHMARK + PARITÉ : tests d'indépendance par strate, par lots (stratified.py)
+# ======================================================
+#
+#     python benchmarks/bench_stratified.py [nb_siren]   (défaut : 3 000 000)
+#
+# Cohorte synthétique stratifiée par catégorie × tranche d'effectif × section
+# NAF (plusieurs milliers de strates, de quelques siren à plusieurs dizaines de
+# milliers) : tests par lots comparés, strate par strate, à une boucle
+# scipy.stats (chi2_contingency / fisher_exact). Cas de régression : strate
+# sans le groupe de référence global ; codes NAF rév. 1 et rév. 2 mêlés.
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from naf import NAF_COLUMN, NOMENCLATURE_COLUMN  # noqa: E402
+from stratified import MIN_EXPECTED, strata_labels, stratified_tests  # noqa: E402
+
+COL_SURVIE = "Survie_24m"
+GROUPES = ["Non aidée", "0 – 50 k€", "50 – 200 k€", "> 200 k€"]
+
+
+def make_cohort(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Divisions NAF rév. 2 et tranches d'effectif tirées selon des lois très inégales : strates de toutes tailles
+    divisions = np.array([f"{d:02d}" for d in range(1, 100) if d not in (4, 34, 40, 44, 48, 54, 57, 67, 76, 83, 89)])
+    tranches = np.array(["NN", "00", "01", "02", "03", "11", "12", "21", "22", "31", "32", "41", "42", "51", "52", "53"])
+    categories = np.array(["PME", "ETI", "GE", None], dtype=object)
+    df = pd.DataFrame({
+        "siren": np.arange(n, dtype=np.int64),
+        "categorieEntreprise": categories[rng.choice(4, n, p=[0.85, 0.08, 0.02, 0.05])],
+        "trancheEffectifsUniteLegale": tranches[np.minimum(rng.geometric(0.35, n) - 1, len(tranches) - 1)],
+        "activitePrincipaleUniteLegale": np.char.add(divisions[np.minimum(rng.zipf(1.3, n) - 1, len(divisions) - 1)],
+                                                     ".01Z"),
+    })
+    groupe = rng.choice(len(GROUPES), n, p=[0.9, 0.05, 0.03, 0.02])
+    df["groupe_intensite"] = pd.Categorical.from_codes(groupe, GROUPES, ordered=True)
+    # Survie : effet de l'aide dans la section A (divisions 01 à 03) seulement
+    effet = np.where(df["activitePrincipaleUniteLegale"].str[:2].astype(int) <= 3, 0.08, 0.0)
+    df[COL_SURVIE] = (rng.random(n) < 0.55 + effet * (groupe > 0)).astype(np.int8)
+    return df
+
+
+def loop_reference(grouped: pd.DataFrame, dims) -> pd.DataFrame:
+    """Une table et un appel SciPy par strate."""
+    from scipy.stats import chi2_contingency, fisher_exact
+    p_chi2, p_fisher = [], []
+    for _, strate in grouped.groupby(dims, sort=True, observed=True):
+        tab = pd.crosstab(strate["groupe_intensite"], strate[COL_SURVIE]).reindex(columns=[0, 1], fill_value=0)
+        tab = tab.reindex(GROUPES, fill_value=0)
+        ok = tab.loc[tab.sum(axis=1) > 0]
+        testable = len(ok) > 1 and (ok.sum(axis=0) > 0).all()
+        p_chi2.append(chi2_contingency(ok.to_numpy(), correction=False)[1] if testable else np.nan)
+        # Premier groupe présent dans la strate contre les autres
+        if len(ok) > 1:
+            collapsed = np.array([ok.iloc[0].to_numpy(), ok.iloc[1:].sum().to_numpy()])[:, ::-1]
+            p_fisher.append(fisher_exact(collapsed)[1])
+        else:
+            p_fisher.append(np.nan)
+    return pd.DataFrame({"p_chi2": p_chi2, "p_fisher": p_fisher})
+
+
+def check_missing_reference() -> None:
+    """Strate à deux groupes sans « Non aidée » : Fisher sur les deux groupes présents."""
+    from scipy.stats import fisher_exact
+    df = pd.DataFrame({
+        "categorieEntreprise": "PME", "trancheEffectifsUniteLegale": "01", "activitePrincipaleUniteLegale": "01.01Z",
+        "groupe_intensite": pd.Categorical([GROUPES[1]] * 40 + [GROUPES[2]] * 40, GROUPES, ordered=True),
+        COL_SURVIE: [1] * 40 + [0] * 40,
+    })
+    # Autre strate avec le groupe de référence global, pour qu'il existe dans les codes de groupe
+    df = pd.concat([df, df.assign(trancheEffectifsUniteLegale="02", groupe_intensite=GROUPES[0])], ignore_index=True)
+    strate = stratified_tests(df, COL_SURVIE)["strates"].set_index("tranche").loc["1–2"]
+    attendu = fisher_exact([[40, 0], [0, 40]])[1]
+    assert strate["test"] == "fisher" and strate["groupe_ref"] == GROUPES[1], strate
+    np.testing.assert_allclose(strate["p_value"], attendu, rtol=1e-7)
+    print(f"strate sans groupe de référence : p = {strate['p_value']:.2e} (scipy {attendu:.2e}) OK")
+
+
+def check_nomenclatures() -> None:
+    """Section NAF selon la nomenclature de chaque ligne : 52.1D et 74.1A (rév. 1) en G et K, pas H et M."""
+    df = pd.DataFrame({NAF_COLUMN: ["52.1D", "74.1A", "47.11Z", "52.10A", None],
+                       NOMENCLATURE_COLUMN: ["NAFRev1", "NAFRev1", "NAFRev2", "NAFRev2", None]})
+    sections = strata_labels(df, (NAF_COLUMN,))["section"].tolist()
+    assert sections == ["G", "K", "G", "H", "n/d"], sections
+    print("sections NAF rév. 1 / rév. 2 OK")
+
+
+def main(n: int) -> None:
+    check_missing_reference()
+    check_nomenclatures()
+    df = make_cohort(n)
+    t0 = time.perf_counter()
+    res = stratified_tests(df, COL_SURVIE)
+    t_batch = time.perf_counter() - t0
+    strates = res["strates"]
+    print(f"{n:,} siren, {len(strates):,} strates ({(strates['test'] != 'non testable').sum():,} testables, "
+          f"{(strates['attendu_min'] < MIN_EXPECTED).sum():,} à effectif attendu < {MIN_EXPECTED}) : "
+          f"tests par lots {t_batch:.2f} s")
+
+    # Même découpage que stratified_tests (libellés de strate), puis une boucle SciPy
+    labels = strata_labels(df)
+    grouped = pd.concat([labels, df[["groupe_intensite", COL_SURVIE]]], axis=1)
+    t0 = time.perf_counter()
+    ref = loop_reference(grouped, list(labels.columns))
+    t_loop = time.perf_counter() - t0
+    ordered = strates.sort_values(list(labels.columns), ignore_index=True)
+    for col in ("p_chi2", "p_fisher"):
+        np.testing.assert_allclose(ordered[col].to_numpy(), ref[col].to_numpy(), rtol=1e-7, atol=1e-12)
+    print(f"  boucle SciPy (une strate à la fois) {t_loop:.2f} s → accélération ×{t_loop / t_batch:.0f}")
+
+    cmh = res["cmh"]
+    print(f"  CMH = {cmh['cmh']:.2f} (ddl {cmh['ddl']}, p = {cmh['p_value']:.2e}), "
+          f"odds ratio MH = {cmh['odds_ratio_mh']:.3f}")
+    print(f"  strates significatives après Benjamini–Hochberg (5 %) : {(strates['q_value'] < 0.05).sum():,}")
+    print("parité OK")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3_000_000)
@@ -0,0 +1,146 @@
+# ======================================================
+# BENCHMARK : merge_asof par horizon vs moteur de survie vectorisé (survival.py),
+# courbes de Kaplan–Meier (groupby par strate vs une passe bincount) et état /
+# catégorie / tranche / ancienneté à une date (merge_asof vs index as-of, asof.py)
+# ======================================================
+#
+#     python benchmarks/bench_survival.py [nb_siren]   (défaut : 1 000 000)
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asof import as_of, build_asof  # noqa: E402
+from schema import CATEGORIES, TRANCHES  # noqa: E402
+from survival import (HORIZONS, build_index, closure_durations, cohort_kaplan_meier, reference_dates,  # noqa: E402
+                      state_at, survival_column, survival_table)
+
+
+def make_history(n_siren: int, seed: int = 0):
+    """Historique synthétique (1 à 6 périodes par siren) et lignes siren × année."""
+    rng = np.random.default_rng(seed)
+    per_siren = rng.integers(1, 7, n_siren)
+    siren = np.repeat(np.arange(100_000_000, 100_000_000 + n_siren, dtype=np.int64), per_siren)
+    days = rng.integers(np.datetime64("1990-01-01").astype(int), np.datetime64("2025-06-30").astype(int), len(siren))
+    events = pd.DataFrame({
+        "siren": siren,
+        "dateDebut": days.astype("datetime64[D]").astype("datetime64[us]"),
+        "etatAdministratifUniteLegale": np.where(rng.random(len(siren)) < 0.8, "A", "C"),
+    })
+    rows = events.assign(annee=events["dateDebut"].dt.year).drop_duplicates(subset=["siren", "annee"])
+    return events, rows[["siren", "annee"]].reset_index(drop=True)
+
+
+# Implémentation historique (preprocessing.py avant le moteur vectorisé)
+def merge_asof_flags(rows, events, months):
+    ref = pd.to_datetime(pd.DataFrame({"year": rows["annee"] + months // 12, "month": 12, "day": 31}))
+    left = pd.DataFrame({"siren": rows["siren"].to_numpy(), "date_ref": ref.to_numpy(),
+                         "pos": np.arange(len(rows))}).sort_values("date_ref", kind="stable")
+    right = events[["siren", "dateDebut", "etatAdministratifUniteLegale"]].sort_values("dateDebut", kind="stable")
+    merged = pd.merge_asof(left, right, left_on="date_ref", right_on="dateDebut", by="siren", direction="backward")
+    flags = np.zeros(len(rows), dtype=np.int8)
+    flags[merged["pos"].to_numpy()] = (merged["etatAdministratifUniteLegale"] == "A").to_numpy()
+    return flags
+
+
+def merge_asof_all(rows, events):
+    return {survival_column(h): merge_asof_flags(rows, events, h) for h in HORIZONS}
+
+
+def vectorized_all(rows, events):
+    return survival_table(build_index(events), rows["siren"], rows["annee"])
+
+
+def groupby_km(index, sirens, year, strata):
+    """Kaplan–Meier « à la main » : une table d'événements par strate (référence)."""
+    origin = reference_dates(np.full(len(sirens), year), 0)
+    active = state_at(index, sirens, origin) == 0
+    days, closed = closure_durations(index, sirens[active], origin[active])
+    frame = pd.DataFrame({"strate": strata[active], "mois": np.floor(days / (365.25 / 12)).astype(int),
+                          "ferme": closed})
+    out = []
+    for strate, g in frame.groupby("strate"):
+        table = g.groupby("mois").agg(sorties=("ferme", "size"), fermetures=("ferme", "sum"))
+        table = table.reindex(range(table.index.max() + 1), fill_value=0)
+        at_risk = table["sorties"][::-1].cumsum()[::-1]
+        table["survie"] = (1 - table["fermetures"] / at_risk.where(at_risk > 0)).fillna(1).cumprod()
+        out.append(table.loc[at_risk > 0, "survie"].to_numpy())
+    return np.concatenate(out)
+
+
+def vectorized_km(index, sirens, year, strata):
+    return cohort_kaplan_meier(index, sirens, year, pd.Series(strata))["survie"].to_numpy()
+
+
+def with_attributes(events, seed: int = 2):
+    """Catégorie, tranche (variables d'une période à l'autre) et année de création par période."""
+    rng = np.random.default_rng(seed)
+    creation = rng.integers(1950, 2024, events["siren"].max() - events["siren"].min() + 1)
+    return events.assign(
+        categorieEntreprise=rng.choice(CATEGORIES, len(events)),
+        trancheEffectifsUniteLegale=rng.choice(TRANCHES, len(events)),
+        anneeCreation=creation[events["siren"] - events["siren"].min()],
+    )
+
+
+def merge_asof_snapshot(events, sirens, date):
+    """Référence : période en vigueur à `date` par merge_asof (à date égale, la dernière ligne)."""
+    left = pd.DataFrame({"siren": sirens, "date": np.datetime64(date, "us"), "pos": np.arange(len(sirens))})
+    right = events.sort_values("dateDebut", kind="stable")
+    merged = pd.merge_asof(left, right, left_on="date", right_on="dateDebut", by="siren", direction="backward")
+    merged["anciennete"] = (pd.Timestamp(date).year - merged["anneeCreation"]).where(lambda a: a >= 0)
+    return merged.sort_values("pos")
+
+
+def timed(fn, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main(n_siren: int) -> None:
+    events, rows = make_history(n_siren)
+    print(f"{len(events):,} périodes, {len(rows):,} lignes siren × année, horizons {HORIZONS}")
+    t_old, ref = timed(merge_asof_all, rows, events)
+    t_new, res = timed(vectorized_all, rows, events)
+    # Contrôle de parité
+    for col, flags in ref.items():
+        assert (flags == res[col].to_numpy()).all(), col
+    print(f"{'merge_asof (s)':>16}{'vectorisé (s)':>16}{'gain':>8}")
+    print(f"{t_old:>16.3f}{t_new:>16.3f}{t_old / t_new:>7.1f}x")
+
+    # Kaplan–Meier de la cohorte 2015, 16 strates
+    index = build_index(events)
+    sirens = index.sirens
+    strata = np.random.default_rng(1).integers(0, 16, len(sirens))
+    t_old, ref = timed(groupby_km, index, sirens, 2015, strata)
+    t_new, res = timed(vectorized_km, index, sirens, 2015, strata)
+    assert np.allclose(ref, res)
+    print(f"{'KM groupby (s)':>16}{'KM bincount (s)':>16}{'gain':>8}")
+    print(f"{t_old:>16.3f}{t_new:>16.3f}{t_old / t_new:>7.1f}x")
+
+    # État, catégorie, tranche et ancienneté de tous les siren au 31/12/2020
+    events = with_attributes(events)
+    t_build, asof = timed(build_asof, events, repeat=1)
+    dates = np.full(len(sirens), np.datetime64("2020-12-31"))
+    t_old, ref = timed(merge_asof_snapshot, events, sirens.astype(np.int64), "2020-12-31")
+    t_new, res = timed(as_of, asof, sirens, dates)
+    for col in ("etatAdministratifUniteLegale", "categorieEntreprise", "trancheEffectifsUniteLegale", "anciennete"):
+        expected, got = ref[col].to_numpy(dtype=object), res[col].to_numpy(dtype=object)
+        assert (pd.isna(expected) == pd.isna(got)).all() and (expected[pd.notna(expected)] ==
+                                                            got[pd.notna(got)]).all(), col
+    print(f"index as-of construit en {t_build:.2f} s")
+    print(f"{'as-of merge (s)':>16}{'as-of index (s)':>16}{'gain':>8}")
+    print(f"{t_old:>16.3f}{t_new:>16.3f}{t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
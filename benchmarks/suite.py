@@ -0,0 +1,207 @@
+# ======================================================
+# SUITE DE BENCHMARKS : temps et mémoire de chaque étape du dashboard
+# ======================================================
+#
+#     python benchmarks/suite.py [tailles…] [--donnees DOSSIER] [--comparer ancien.json] [--seuil 1.25]
+#     python benchmarks/suite.py 100k 1M 10M 30M
+#
+# Pour chaque taille, un jeu synthétique (synthetic.py, réutilisé d'une
+# exécution à l'autre) est chargé et chaque étape est chronométrée avec son pic
+# de mémoire Python (tracemalloc) :
+#   - chargement : lecture de la source, table Arrow partagée, load_data d'une cohorte ;
+#   - Parties 1 et 2 : cube d'agrégats, puis vues fermetures / survie ;
+#   - Partie 3 : jointure des lauréats et agrégats au niveau SIREN ;
+#   - Partie 4 : make_groups_auto, table de contingence + Chi², rééchantillonnage,
+#     tests par strate (par lots) et prepare_test de bout en bout.
+# Résultats écrits en JSON dans benchmarks/results/ (date, commit, versions) ;
+# --comparer signale les étapes plus lentes que la référence au-delà du seuil
+# (code de sortie 1 en cas de régression).
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+try:
+    from scipy.stats import chi2_contingency
+except ImportError:  # scipy optionnel : seule la table de contingence est mesurée
+    chi2_contingency = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_loader  # noqa: E402
+from aides import build_aid_index  # noqa: E402
+from analytics import (  # noqa: E402
+    COLS_TEST, aid_summary_siren, closures, cohort_survival, cohort_with_aid, make_groups_auto, prepare_test,
+)
+from cube import compute_cube, source_fingerprint  # noqa: E402
+from inference import resampling_summary  # noqa: E402
+from stratified import STRATA, stratified_tests  # noqa: E402
+from synthetic import ensure, parse_size  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_SIZES = ("100k", "1M")
+ANNEE, COL_SURVIE = 2020, "Survie_24m"
+SEUIL = 1.25  # ratio de durée au-delà duquel une étape est signalée
+
+
+def measure(fn, *args, **kwargs):
+    """(résultat, durée en s, pic tracemalloc en Mo)."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak / 1e6
+
+
+def _aides_categorie() -> pd.DataFrame:
+    """Table d'aides par catégorie, au format de df_participationEtat.csv."""
+    return pd.DataFrame({"categorieEntreprise": ["PME", "ETI", "GE"],
+                         "montant_participation_etat": [1.5e9, 0.6e9, 1.4e9]})
+
+
+def _laureats(sirens: np.ndarray, seed: int = 0) -> pd.DataFrame:
+    """≈ 1 % de la cohorte lauréate, 1 à 3 lignes (mesures) par lauréat."""
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(sirens, max(len(sirens) // 100, 2), replace=False).astype(np.int64)
+    siren = np.repeat(chosen, rng.integers(1, 4, len(chosen)))
+    return pd.DataFrame({"siren": siren, "mesure": "", "mesure_light": rng.choice(["Automobile", "Relocalisation"], len(siren)),
+                         "montant": np.round(rng.lognormal(11, 1.2, len(siren)), 2), "investissement": 0.0})
+
+
+def run_size(source: str, workdir: str) -> dict:
+    """Durée et pic mémoire de chaque étape sur le jeu `source`."""
+    steps = {}
+
+    def step(name, fn, *args, **kwargs):
+        out, elapsed, peak = measure(fn, *args, **kwargs)
+        steps[name] = {"s": round(elapsed, 4), "pic_mo": round(peak, 1)}
+        print(f"    {name:28s} {elapsed:8.3f} s {peak:9.1f} Mo")
+        return out
+
+    # Chargement
+    step("lecture_source", data_loader.read_table, source, columns=data_loader.SHARED_COLUMNS)
+    data_loader.SHARED_DIR = os.path.join(workdir, "shared")
+    table = step("table_partagee", data_loader.open_shared_table, source, source_fingerprint(source))
+    df = step("load_data_cohorte", data_loader.table_to_frame, table,
+              columns=COLS_TEST + (COL_SURVIE,), years=(ANNEE,), path=source)
+
+    # Parties 1 et 2
+    cube = step("cube_parties_1_2", compute_cube, source, backend="pandas")
+    step("partie1_fermetures", closures, cube)
+    step("partie2_survie_cohorte", cohort_survival, cube, ANNEE, 24)
+
+    # Partie 3
+    cohort_sirens = df.loc[df["annee"] == ANNEE, "siren"].unique()
+    index = step("partie3_index_laureats", build_aid_index, _laureats(cohort_sirens))
+    cohort = step("partie3_jointure", cohort_with_aid, df, ANNEE, COL_SURVIE, index)
+    step("partie3_agregats_siren", aid_summary_siren, cohort, index, COL_SURVIE)
+
+    # Partie 4 (intensité par catégorie, comme sans fichier des lauréats)
+    dfa = _aides_categorie()
+    base = cohort.dropna(subset=["categorieEntreprise"]).copy()
+    par_cat = dfa.set_index("categorieEntreprise")["montant_participation_etat"]
+    base["intensite_par_entreprise"] = (base["categorieEntreprise"].astype(object).map(par_cat)
+                                        / base.groupby("categorieEntreprise", observed=True)["siren"]
+                                              .transform("size")).astype(float)
+    grouped, _ = step("partie4_make_groups_auto", make_groups_auto, base)
+
+    def chi2(grouped):
+        tab = pd.crosstab(grouped["groupe_intensite"], grouped[COL_SURVIE])
+        if chi2_contingency is not None:
+            chi2_contingency(tab.values)
+        return tab
+
+    tab = step("partie4_chi2", chi2, grouped)
+    step("partie4_reechantillonnage", resampling_summary, tab)
+    step("partie4_tests_par_strate", stratified_tests, grouped, COL_SURVIE,
+         tuple(d for d in STRATA if d != "categorieEntreprise"))
+    step("partie4_prepare_test", prepare_test, df, ANNEE, COL_SURVIE, dfa)
+    return steps
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+
+def compare(current: dict, reference: dict, seuil: float = SEUIL) -> list:
+    """Étapes plus lentes que la référence au-delà de `seuil` : [(taille, étape, ratio)]."""
+    regressions = []
+    for size, steps in current["resultats"].items():
+        ref_steps = reference.get("resultats", {}).get(size, {})
+        for name, res in steps.items():
+            ref = ref_steps.get(name)
+            if not ref or not ref["s"]:
+                continue
+            ratio = res["s"] / ref["s"]
+            flag = " ← régression" if ratio > seuil and res["s"] - ref["s"] > 0.05 else ""
+            print(f"  {size:>5s} {name:28s} {ref['s']:8.3f} s → {res['s']:8.3f} s ({ratio:4.2f}x){flag}")
+            if flag:
+                regressions.append((size, name, ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Temps et mémoire des étapes du dashboard sur données synthétiques.")
+    p.add_argument("tailles", nargs="*", default=list(DEFAULT_SIZES), help="100k, 1M, 10M, 30M…")
+    p.add_argument("--donnees", default=os.path.join(tempfile.gettempdir(), "sirene-bench"),
+                   help="dossier des jeux synthétiques (réutilisés d'une exécution à l'autre)")
+    p.add_argument("--graine", type=int, default=0)
+    p.add_argument("--sortie", default=None, help="fichier JSON des résultats (défaut : benchmarks/results/…)")
+    p.add_argument("--comparer", default=None, help="résultats de référence (JSON) à comparer")
+    p.add_argument("--seuil", type=float, default=SEUIL, help="ratio de durée signalé comme régression")
+    args = p.parse_args(argv)
+
+    results = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "machine": {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+                    "pyarrow": pa.__version__, "processeur": platform.processor() or platform.machine(),
+                    "coeurs": os.cpu_count()},
+        "annee_cohorte": ANNEE,
+        "resultats": {},
+    }
+    for size in args.tailles:
+        n = parse_size(size)
+        source = os.path.join(args.donnees, f"{size}-{args.graine}")
+        print(f"{size} ({n:,} lignes) : {source}")
+        t0 = time.perf_counter()
+        if ensure(source, n, args.graine):
+            print(f"    {'generation':28s} {time.perf_counter() - t0:8.3f} s")
+        with tempfile.TemporaryDirectory(prefix="bench-suite-") as workdir:
+            results["resultats"][size] = run_size(source, workdir)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    dst = args.sortie or os.path.join(RESULTS_DIR, f"{results['date'].replace(':', '')}-{results['commit']}.json")
+    with open(dst, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"Résultats → {dst}")
+
+    if args.comparer:
+        with open(args.comparer) as f:
+            reference = json.load(f)
+        print(f"Comparaison avec {args.comparer} (commit {reference.get('commit')}, {reference.get('date')}) :")
+        if compare(results, reference, args.seuil):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# ======================================================
+# GÉNÉRATEUR DE DONNÉES SYNTHÉTIQUES « UNITÉS LÉGALES » (échelle Sirene)
+# ======================================================
+#
+#     python benchmarks/synthetic.py <taille> <sortie> [--csv] [--graine G]
+#     python benchmarks/synthetic.py 10M /tmp/data_parquet          (100k, 1M, 10M, 30M…)
+#
+# Une ligne par siren × année d'activité (comme en sortie de preprocessing.py),
+# au schéma compact du dashboard : siren, annee, etatAdministratifUniteLegale,
+# categorieEntreprise, trancheEffectifsUniteLegale, anciennete, Survie_12m …
+# Survie_48m et activitePrincipaleUniteLegale. Chaque entreprise a :
+#   - une année de création (beaucoup d'entreprises récentes) ;
+#   - une tranche d'effectif INSEE stable (majorité NN / 00, quelques grandes) ;
+#   - une catégorie cohérente avec sa taille (PME, ETI, GE ; non renseignée pour
+#     une partie des NN / 00) et un code NAF ;
+#   - une date de fermeture tirée d'un risque annuel plus fort pour les jeunes
+#     et petites entreprises (jamais fermée si elle tombe après la fin des données).
+# L'état vaut C l'année de la fermeture ; Survie_<h>m vaut 1 si l'entreprise est
+# encore active h mois après le 31/12 de l'année de la ligne. Les données sont
+# produites et écrites par blocs : mémoire bornée, même à 30M de lignes.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import PARTITIONING  # noqa: E402
+from schema import CATEGORIE_DTYPE, ETAT_DTYPE, TRANCHE_DTYPE, TRANCHES  # noqa: E402
+from survival import HORIZONS, reference_dates, survival_column  # noqa: E402
+
+FIRST_YEAR, LAST_YEAR = 2015, 2024
+CHUNK_ROWS = 2_000_000
+MARKER = "_synthetique.json"  # paramètres du jeu généré (réutilisation par la suite de benchmarks)
+
+# Répartition des tranches d'effectif (ordre de TRANCHES : NN, 00, 01 … 53)
+TRANCHE_WEIGHTS = np.array([0.55, 0.25, 0.09, 0.04, 0.025, 0.018, 0.012, 0.005, 0.003,
+                            0.0008, 0.0008, 0.0005, 0.0002, 0.0001, 0.00005, 0.00003])
+NAF_CODES = ["68.20B", "70.10Z", "47.91B", "62.01Z", "43.21A", "56.10A", "86.21Z", "69.20Z", "41.20A", "96.02A",
+             "49.32Z", "74.90B", "85.59A", "10.71C", "01.11Z", "47.11B", "45.20A", "55.10Z", "64.20Z", "90.01Z"]
+NAF_WEIGHTS = np.array([14, 12, 8, 7, 7, 6, 5, 5, 5, 4, 4, 4, 4, 3, 3, 3, 2, 2, 1, 1], dtype=float)
+
+
+def parse_size(text) -> int:
+    """« 100k », « 1M », « 30M » ou un entier."""
+    text = str(text).strip().upper().replace("_", "")
+    factor = {"K": 1_000, "M": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def _siren(ids: np.ndarray) -> np.ndarray:
+    """Numéros à 9 chiffres distincts et dispersés (bijection modulo 9·10⁸)."""
+    return ((ids.astype(np.int64) * 48_271 + 12_345) % 900_000_000 + 100_000_000).astype(np.uint32)
+
+
+def _firms(rng, first_id: int, n: int, first_year: int, last_year: int) -> pd.DataFrame:
+    """`n` entreprises : création, tranche, catégorie, NAF, date de fermeture (NaT si active)."""
+    creation = np.maximum(last_year - np.floor(rng.exponential(14, n)), 1900).astype(np.int64)
+    tranche = rng.choice(len(TRANCHES), n, p=TRANCHE_WEIGHTS / TRANCHE_WEIGHTS.sum())
+    # Catégorie cohérente avec la taille ; non renseignée pour une partie des NN / 00
+    categorie = np.where(tranche >= 11, rng.choice([1, 2], n, p=[0.5, 0.5]),
+                         np.where(tranche >= 9, rng.choice([0, 1], n, p=[0.3, 0.7]),
+                                  np.where(tranche >= 7, rng.choice([0, 1], n, p=[0.9, 0.1]), 0)))
+    categorie = np.where((tranche <= 1) & (rng.random(n) < 0.3), -1, categorie)
+
+    # Risque annuel de fermeture : plus fort pour les jeunes et les petites entreprises
+    hazard = 0.05 * np.where(tranche <= 1, 1.3, np.where(tranche >= 7, 0.5, 1.0))
+    hazard = hazard * np.where(last_year - creation < 5, 1.6, 1.0)
+    start = np.maximum(creation, first_year)
+    closure = (start - 1970) * 365.25 + rng.exponential(365.25 / hazard)  # jours depuis 1970
+    closure = np.where(closure < (last_year + 1 - 1970) * 365.25, closure, np.nan)
+    return pd.DataFrame({
+        "siren": _siren(np.arange(first_id, first_id + n)),
+        "creation": creation,
+        "tranche": tranche,
+        "categorie": categorie,
+        "naf": rng.choice(len(NAF_CODES), n, p=NAF_WEIGHTS / NAF_WEIGHTS.sum()),
+        "fermeture": closure,
+    })
+
+
+def _rows(firms: pd.DataFrame, first_year: int, last_year: int) -> pd.DataFrame:
+    """Une ligne par entreprise × année d'activité dans [first_year, last_year]."""
+    start = np.maximum(firms["creation"].to_numpy(), first_year)
+    closure = firms["fermeture"].to_numpy()
+    closure_year = np.where(np.isnan(closure), last_year,
+                            1970 + np.floor(np.nan_to_num(closure) / 365.25)).astype(np.int64)
+    span = np.maximum(np.minimum(closure_year, last_year) - start + 1, 0)
+    idx = np.repeat(np.arange(len(firms)), span)
+    annee = start[idx] + np.arange(len(idx)) - np.repeat(np.cumsum(span) - span, span)
+
+    closed = closure[idx]
+    df = pd.DataFrame({
+        "siren": firms["siren"].to_numpy()[idx],
+        "annee": annee.astype(np.int16),
+        "etatAdministratifUniteLegale": pd.Categorical.from_codes(
+            np.where(~np.isnan(closed) & (closure_year[idx] == annee), 1, 0), dtype=ETAT_DTYPE),
+        "categorieEntreprise": pd.Categorical.from_codes(firms["categorie"].to_numpy()[idx], dtype=CATEGORIE_DTYPE),
+        "trancheEffectifsUniteLegale": pd.Categorical.from_codes(firms["tranche"].to_numpy()[idx], dtype=TRANCHE_DTYPE),
+        "anciennete": (annee - firms["creation"].to_numpy()[idx]).astype(np.float32),
+    })
+    closed_day = np.where(np.isnan(closed), np.inf, closed)
+    for h in HORIZONS:
+        reference = reference_dates(annee, h).astype(np.int64)  # jours depuis 1970
+        df[survival_column(h)] = (closed_day > reference).astype(np.int8)
+    df["activitePrincipaleUniteLegale"] = np.asarray(NAF_CODES, dtype=object)[firms["naf"].to_numpy()[idx]]
+    return df
+
+
+def generate(n_rows: int, seed: int = 0, first_year: int = FIRST_YEAR, last_year: int = LAST_YEAR,
+             chunk_rows: int = CHUNK_ROWS):
+    """Blocs de lignes (DataFrames au schéma compact) jusqu'à `n_rows` lignes au total."""
+    rng = np.random.default_rng(seed)
+    produced, next_id = 0, 0
+    rows_per_firm = None
+    while produced < n_rows:
+        wanted = min(chunk_rows, n_rows - produced)
+        n_firms = max(int(wanted / rows_per_firm) if rows_per_firm else wanted // 4, 1)
+        df = _rows(_firms(rng, next_id, n_firms, first_year, last_year), first_year, last_year)
+        next_id += n_firms
+        rows_per_firm = max(len(df) / n_firms, 0.1)
+        if not len(df):
+            continue
+        # Bloc tronqué à une entreprise près (toutes ses années ou aucune)
+        if len(df) > wanted:
+            last = df["siren"].iloc[wanted - 1]
+            df = df.iloc[:wanted + int((df["siren"].iloc[wanted:] == last).cumprod().sum())]
+        produced += len(df)
+        yield df
+
+
+def write(dst: str, n_rows: int, seed: int = 0, csv: bool = False, **kwargs) -> dict:
+    """Écrit le jeu synthétique (Parquet partitionné par année, ou CSV) ; retourne ses paramètres."""
+    params = {"lignes": n_rows, "graine": seed, "format": "csv" if csv else "parquet", **kwargs}
+    if os.path.exists(dst):
+        if not os.path.exists(os.path.join(dst, MARKER)) and not (csv and os.path.isfile(dst)):
+            raise FileExistsError(f"{dst} existe et n'est pas un jeu synthétique : choisir une autre sortie.")
+        shutil.rmtree(dst) if os.path.isdir(dst) else os.remove(dst)
+    written = 0
+    for i, df in enumerate(generate(n_rows, seed, **kwargs)):
+        if csv:
+            df.to_csv(dst, mode="a" if i else "w", header=not i, index=False)
+        else:
+            ds.write_dataset(pa.Table.from_pandas(df, preserve_index=False), dst, format="parquet",
+                             partitioning=PARTITIONING, basename_template=f"part-{i}-{{i}}.parquet",
+                             existing_data_behavior="overwrite_or_ignore")
+        written += len(df)
+    params["lignes_ecrites"] = written
+    if not csv:
+        with open(os.path.join(dst, MARKER), "w") as f:
+            json.dump(params, f)
+    return params
+
+
+def ensure(dst: str, n_rows: int, seed: int = 0) -> bool:
+    """Génère le jeu Parquet `dst` s'il n'existe pas avec ces paramètres ; True si (re)généré."""
+    marker = os.path.join(dst, MARKER)
+    if os.path.exists(marker):
+        with open(marker) as f:
+            params = json.load(f)
+        if params.get("lignes") == n_rows and params.get("graine") == seed:
+            return False
+    write(dst, n_rows, seed)
+    return True
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Jeu synthétique « unités légales » au schéma du dashboard.")
+    p.add_argument("taille", help="nombre de lignes (100k, 1M, 10M, 30M…)")
+    p.add_argument("sortie", help="dataset Parquet partitionné par année (ou fichier CSV avec --csv)")
+    p.add_argument("--csv", action="store_true", help="écrire un CSV (comme data.csv)")
+    p.add_argument("--graine", type=int, default=0)
+    args = p.parse_args()
+    stats = write(args.sortie, parse_size(args.taille), args.graine, csv=args.csv)
+    print(f"{stats['lignes_ecrites']:,} lignes → {args.sortie}")
@@ -0,0 +1,241 @@
+# ======================================================
+# EFFET DES AIDES SUR LA SURVIE : SCORE DE PROPENSION (PSM) ET AIPW
+# ======================================================
+#
+# Traitement : entreprise lauréate (aide > 0, fichier des lauréats) ; résultat :
+# survie à l'horizon choisi ; covariables : catégorie d'entreprise, tranche
+# d'effectif, tranche d'ancienneté et section NAF (activité principale).
+#
+# Toutes les covariables sont discrètes : les millions de siren se résument à
+# quelques milliers de PROFILS (combinaisons de covariables), avec pour chacun
+# les effectifs et survivants aidés / non aidés. Tout le calcul porte sur ces
+# profils, pour un coût indépendant du nombre de siren :
+#   - score de propension : régression logistique des profils pondérés (IRLS
+#     NumPy, légère pénalité ridge contre la séparation complète) ;
+#   - appariement (ATT) : chaque profil aidé est apparié au profil témoin le
+#     plus proche sur le logit du score (arbre k-d scipy.spatial.cKDTree, caliper
+#     de 0,2 écart type), ses témoins étant interchangeables ; les aidés sans
+#     témoin dans le caliper sont hors support ;
+#   - AIPW (ATE) : modèles de survie logistiques par bras + score tronqué,
+#     estimateur doublement robuste ;
+#   - erreurs types : bootstrap de Poisson des effectifs des profils (blocs de
+#     réplications à graines SeedSequence, comme inference.py), modèles
+#     réajustés à partir de l'estimation ponctuelle.
+
+import numpy as np
+import pandas as pd
+
+from inference import DEFAULT_SEED, chunks, parallel_map
+from naf import NAF_COLUMN, NOMENCLATURE_COLUMN, naf_section
+from schema import age_bins, tranche_labels
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # repli : plus proche voisin par recherche dichotomique (score à une dimension)
+    cKDTree = None
+
+COVARIATES = ("categorieEntreprise", "trancheEffectifsUniteLegale", "anciennete", NAF_COLUMN)
+# Colonnes à lire pour les covariables : la nomenclature situe le code APE (rév. 1 ou rév. 2)
+COVARIATE_COLUMNS = (*COVARIATES, NOMENCLATURE_COLUMN)
+DEFAULT_BOOTSTRAP = 200
+BOOTSTRAP_CHUNK = 25  # réplications par bloc (et par tâche du pool)
+CALIPER = 0.2         # × écart type du logit du score de propension
+CLIP = 0.01           # troncature du score de propension (AIPW)
+RIDGE = 1.0           # pénalité L2 des coefficients (hors constante)
+
+
+def _expit(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * x))  # stable pour |x| grand
+
+
+# --------------------------------------------
+# Profils de covariables
+# --------------------------------------------
+def _factors(cohort: pd.DataFrame) -> dict:
+    """Covariable → (codes entiers, libellés) ; valeur manquante = modalité « NA »."""
+    raw = {}
+    if "categorieEntreprise" in cohort.columns:
+        raw["categorie"] = cohort["categorieEntreprise"]
+    if "trancheEffectifsUniteLegale" in cohort.columns:
+        raw["tranche"] = tranche_labels(cohort["trancheEffectifsUniteLegale"])
+    if "anciennete" in cohort.columns:
+        raw["anciennete"] = age_bins(cohort["anciennete"])
+    if NAF_COLUMN in cohort.columns:
+        raw["naf"] = naf_section(cohort[NAF_COLUMN], cohort.get(NOMENCLATURE_COLUMN))
+    factors = {}
+    for name, values in raw.items():
+        codes, uniques = pd.factorize(values, sort=True)
+        labels = [str(u) for u in uniques]
+        if (codes < 0).any():
+            codes = np.where(codes < 0, len(labels), codes)
+            labels.append("NA")
+        factors[name] = (codes.astype(np.int64), labels)
+    return factors
+
+
+def design(cohort: pd.DataFrame):
+    """
+    Profils distincts de la cohorte : matrice X (constante + indicatrices, première
+    modalité de référence), noms des colonnes, et profil de chaque ligne.
+    """
+    factors = _factors(cohort)
+    key = np.zeros(len(cohort), dtype=np.int64)
+    for codes, labels in factors.values():
+        key = key * len(labels) + codes
+    keys, inverse = np.unique(key, return_inverse=True)
+
+    columns, names = [np.ones(len(keys))], ["constante"]
+    for name, (codes, labels) in reversed(factors.items()):
+        level = keys % len(labels)
+        keys = keys // len(labels)
+        for j, label in enumerate(labels[1:], start=1):
+            columns.append((level == j).astype(np.float64))
+            names.append(f"{name}={label}")
+    return np.column_stack(columns), names, inverse
+
+
+def profile_counts(inverse, treated, outcome, n_profiles: int) -> np.ndarray:
+    """(profils, 4) : survivants aidés, fermés aidés, survivants témoins, fermés témoins."""
+    treated = np.asarray(treated, dtype=bool)
+    outcome = np.asarray(outcome, dtype=bool)
+    cell = np.asarray(inverse, dtype=np.int64) * 4 + np.where(treated, 0, 2) + np.where(outcome, 0, 1)
+    return np.bincount(cell, minlength=n_profiles * 4).reshape(n_profiles, 4).astype(np.float64)
+
+
+# --------------------------------------------
+# Modèles et estimateurs
+# --------------------------------------------
+def fit_logit(X, successes, trials, beta=None, ridge: float = RIDGE, max_iter: int = 50, tol: float = 1e-8):
+    """Régression logistique binomiale groupée (IRLS / Newton), pénalité ridge hors constante."""
+    keep = trials > 0
+    X, successes, trials = X[keep], successes[keep], trials[keep]
+    beta = np.zeros(X.shape[1]) if beta is None else beta.copy()
+    penalty = np.full(X.shape[1], float(ridge))
+    penalty[0] = 1e-9
+    for _ in range(max_iter):
+        mu = _expit(X @ beta)
+        grad = X.T @ (successes - trials * mu) - penalty * beta
+        hess = (X * (trials * mu * (1 - mu))[:, None]).T @ X + np.diag(penalty)
+        step = np.linalg.solve(hess, grad)
+        beta += step
+        if np.abs(step).max() < tol:
+            break
+    return beta
+
+
+def match_profiles(logit, n_treated, n_control, caliper: float) -> np.ndarray:
+    """Profil témoin apparié à chaque profil (-1 : pas d'aidé ou aucun témoin dans le caliper)."""
+    treated, controls = np.flatnonzero(n_treated > 0), np.flatnonzero(n_control > 0)
+    match = np.full(len(logit), -1, dtype=np.int64)
+    if not len(treated) or not len(controls):
+        return match
+    x = logit[treated]
+    if cKDTree is not None:
+        dist, j = cKDTree(logit[controls, None]).query(x[:, None], k=1)
+    else:
+        order = np.argsort(logit[controls], kind="stable")
+        sorted_logit = logit[controls][order]
+        pos = np.searchsorted(sorted_logit, x)
+        left, right = np.clip(pos - 1, 0, len(order) - 1), np.clip(pos, 0, len(order) - 1)
+        nearest = np.where(np.abs(sorted_logit[left] - x) <= np.abs(sorted_logit[right] - x), left, right)
+        dist, j = np.abs(sorted_logit[nearest] - x), order[nearest]
+    ok = dist <= caliper
+    match[treated[ok]] = controls[j[ok]]
+    return match
+
+
+def _estimate(X, counts, start=None) -> dict:
+    """Différence brute, ATT apparié, ATE AIPW et coefficients des trois modèles."""
+    y_t, n_t = counts[:, 0], counts[:, 0] + counts[:, 1]
+    y_c, n_c = counts[:, 2], counts[:, 2] + counts[:, 3]
+    start = start or (None, None, None)
+    coefs = (fit_logit(X, n_t, n_t + n_c, start[0]),
+             fit_logit(X, y_t, n_t, start[1]),
+             fit_logit(X, y_c, n_c, start[2]))
+    logit = X @ coefs[0]
+    e = np.clip(_expit(logit), CLIP, 1 - CLIP)
+    mu1, mu0 = _expit(X @ coefs[1]), _expit(X @ coefs[2])
+    n = n_t + n_c
+
+    aipw = (n * (mu1 - mu0) + (y_t - n_t * mu1) / e - (y_c - n_c * mu0) / (1 - e)).sum() / n.sum()
+
+    mean = (n * logit).sum() / n.sum()
+    caliper = CALIPER * np.sqrt((n * (logit - mean) ** 2).sum() / n.sum())
+    match = match_profiles(logit, n_t, n_c, caliper)
+    ok = match >= 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate_c = y_c / n_c
+        att = (y_t[ok] - n_t[ok] * rate_c[match[ok]]).sum() / n_t[ok].sum()
+        naive = y_t.sum() / n_t.sum() - y_c.sum() / n_c.sum()
+    return {"brut": naive, "att": att, "ate": aipw, "coefs": coefs, "match": match, "caliper": caliper}
+
+
+def balance(X, names, counts, match) -> pd.DataFrame:
+    """Différences moyennes standardisées des indicatrices, avant / après appariement."""
+    n_t = counts[:, 0] + counts[:, 1]
+    n_c = counts[:, 2] + counts[:, 3]
+    ok = match >= 0
+    n_matched = np.bincount(match[ok], weights=n_t[ok], minlength=len(X))
+
+    def moments(w):
+        m = w @ X / w.sum()
+        return m, w @ (X - m) ** 2 / w.sum()
+
+    (m_t, v_t), (m_c, v_c) = moments(n_t), moments(n_c)
+    (m_ta, _), (m_ca, _) = moments(n_t * ok), moments(n_matched)
+    scale = np.sqrt((v_t + v_c) / 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = pd.DataFrame({"smd_avant": (m_t - m_c) / scale, "smd_apres": (m_ta - m_ca) / scale}, index=names)
+    return out.iloc[1:].fillna(0.0)
+
+
+def _bootstrap_chunk(task):
+    (size, seed), X, counts, start = task
+    rng = np.random.default_rng(seed)
+    out = np.empty((size, 3))
+    for b in range(size):
+        est = _estimate(X, rng.poisson(counts).astype(np.float64), start)
+        out[b] = est["brut"], est["att"], est["ate"]
+    return out
+
+
+def estimate_effect(cohort: pd.DataFrame, treated, outcome, n_boot: int = DEFAULT_BOOTSTRAP,
+                    confidence: float = 0.95, seed: int = DEFAULT_SEED, workers: int = 1) -> dict:
+    """
+    Effet de l'aide sur la survie (différence de taux, en points) :
+    différence brute, ATT par appariement sur le score, ATE AIPW, avec erreurs
+    types et IC bootstrap ; équilibre des covariables avant / après appariement.
+    """
+    X, names, inverse = design(cohort)
+    counts = profile_counts(inverse, treated, outcome, len(X))
+    n_t, n_c = counts[:, :2].sum(axis=1), counts[:, 2:].sum(axis=1)
+    if not n_t.sum() or not n_c.sum():
+        raise ValueError("Il faut des entreprises aidées et non aidées dans la cohorte.")
+
+    point = _estimate(X, counts)
+    tasks = [(chunk, X, counts, point["coefs"]) for chunk in chunks(n_boot, seed, BOOTSTRAP_CHUNK)]
+    reps = np.concatenate(parallel_map(_bootstrap_chunk, tasks, workers)) if tasks else np.empty((0, 3))
+    alpha = (1 - confidence) / 2
+
+    rows = []
+    for j, (key, label) in enumerate((("brut", "Différence brute"), ("att", "Appariement sur le score (ATT)"),
+                                      ("ate", "AIPW doublement robuste (ATE)"))):
+        r = reps[:, j][np.isfinite(reps[:, j])]
+        rows.append({
+            "estimateur": label,
+            "effet": point[key],
+            "erreur_type": r.std(ddof=1) if len(r) > 1 else np.nan,
+            "ic_bas": np.quantile(r, alpha) if len(r) else np.nan,
+            "ic_haut": np.quantile(r, 1 - alpha) if len(r) else np.nan,
+        })
+    ok = point["match"] >= 0
+    return {
+        "resultats": pd.DataFrame(rows),
+        "equilibre": balance(X, names, counts, point["match"]),
+        "n_aides": int(n_t.sum()),
+        "n_temoins": int(n_c.sum()),
+        "n_apparies": int(n_t[ok].sum()),
+        "n_profils": len(X),
+        "caliper": float(point["caliper"]),
+        "n_boot": n_boot,
+    }
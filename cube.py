@@ -0,0 +1,401 @@
+# ======================================================
+# CUBE D'AGRÉGATS PRÉCALCULÉS POUR LE DASHBOARD
+# ======================================================
+#
+# Les groupby des Parties 1 et 2 sont matérialisés une fois pour toutes dans
+# un petit fichier Parquet (format long : une ligne par vue × cellule). Le
+# dashboard ne lit plus que ce cube : le temps de rendu ne dépend plus de la
+# taille du dataset brut.
+#
+# Toutes les mesures sont des COMPTAGES additifs sur des ensembles de siren
+# disjoints (les taux sont calculés au rendu). Le cube n'est reconstruit que
+# si l'empreinte de la source (chemins, tailles, dates de modification) change.
+# Les vues de survie sont déclinées par horizon (colonnes Survie_<h>m présentes).
+# Vues « naf » / « cohorte_naf » : niveau le plus fin de la NAF (nomenclature ×
+# classe, naf.py), par année ; section, division et groupe s'en déduisent par
+# sommation au rendu (naf.rollup), sans relire la source.
+# Vues « departement » / « cohorte_departement » (dataset avec géographie) :
+# carte des départements du siège. Un cube restreint à quelques départements
+# (compute_cube(departements=…)) ne lit que les row groups de ces départements.
+#
+# Mode approché (exact=False) : la source est lue par blocs d'années entières
+# (≈ STREAM_ROWS lignes, mémoire bornée par le bloc ou la plus grosse année). Les comptages par année s'additionnent ;
+# les siren distincts toutes années confondues (vues global, categorie, age,
+# tranche) sont estimés par fusion de croquis HyperLogLog (sketch.py),
+# conservés dans le cube (colonnes hll_*) pour d'autres fusions.
+#
+# Construction hors ligne :
+#     python cube.py [source] [cube.parquet] [--approx]
+# CUBE_BACKEND=duckdb calcule les vues en SQL sur les fichiers (sql_backend.py).
+
+import hashlib
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from aggregations import aggregate
+from data_loader import read_table, resolve_source, year_counts
+from geo import DEPARTEMENT
+from naf import NAF_COLUMN, NOMENCLATURE_COLUMN, classify
+from schema import CATEGORIES, ETATS, LABELS_AGE, ORDRE_TRANCHES, TRANCHE_AUTRE, age_bins, tranche_labels
+from sketch import SKETCH_ERROR, estimate, from_bytes, merge, precision_for, sketch, to_bytes
+from survival import HORIZONS, SURVIVAL_COLUMNS, survival_column
+
+logger = logging.getLogger(__name__)
+
+CUBE_PATH = "cube.parquet"
+CUBE_APPROX_PATH = "cube_approx.parquet"
+STREAM_ROWS = 2_000_000  # lignes lues par bloc en mode approché
+CUBE_BACKEND = os.environ.get("CUBE_BACKEND", "pandas")
+
+# Version du format : un cube écrit par une version antérieure est reconstruit
+CUBE_VERSION = "4"
+
+CUBE_COLUMNS = ("siren", "annee", "etatAdministratifUniteLegale", "categorieEntreprise",
+                "anciennete", "trancheEffectifsUniteLegale", *SURVIVAL_COLUMNS, NAF_COLUMN, NOMENCLATURE_COLUMN,
+                DEPARTEMENT)
+
+# Vue → dimensions (les vues « cohorte_* » sont indexées par l'année de cohorte
+# et l'horizon de survie en mois)
+VIEWS = {
+    "global": [],
+    "categorie": ["categorieEntreprise"],
+    "annee_etat": ["annee", "etatAdministratifUniteLegale"],
+    "age": ["age_bin"],
+    "tranche": ["trancheEffectifs_label"],
+    "cohorte": ["annee", "horizon"],
+    "cohorte_categorie": ["annee", "horizon", "categorieEntreprise"],
+    "cohorte_age": ["annee", "horizon", "age_bin"],
+    "cohorte_tranche": ["annee", "horizon", "trancheEffectifs_label"],
+    "naf": ["annee", "nomenclature", "naf"],
+    "cohorte_naf": ["annee", "horizon", "nomenclature", "naf"],
+    "departement": ["annee", "departement"],
+    "cohorte_departement": ["annee", "horizon", "departement"],
+}
+DIMENSIONS = ["annee", "horizon", "etatAdministratifUniteLegale", "categorieEntreprise",
+              "age_bin", "trancheEffectifs_label", "nomenclature", "naf", "departement"]
+_INT_DIMS = ("annee", "horizon")
+MEASURES = ["nb_siren", "nb_siren_fermees", "nb_lignes", "nb_fermees", "nb_survivantes"]
+# Croquis HyperLogLog (mode approché) → mesure de siren distincts estimée
+SKETCHES = {"hll_siren": "nb_siren", "hll_siren_fermees": "nb_siren_fermees"}
+
+_ORDERED_DIMS = {
+    "age_bin": LABELS_AGE,
+    "trancheEffectifs_label": ORDRE_TRANCHES + [TRANCHE_AUTRE],
+}
+# Ordre des cellules des autres dimensions (celui des codes INSEE)
+_SORT_ORDERS = {
+    "categorieEntreprise": CATEGORIES,
+    "etatAdministratifUniteLegale": ETATS,
+}
+
+
+# --------------------------------------------
+# Empreinte de la source
+# --------------------------------------------
+def source_fingerprint(path: str) -> str:
+    """Hash (chemin relatif, taille, mtime) de tous les fichiers de la source."""
+    entries = []
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for name in files:
+                full = os.path.join(root, name)
+                st_ = os.stat(full)
+                entries.append((os.path.relpath(full, path), st_.st_size, st_.st_mtime_ns))
+    else:
+        st_ = os.stat(path)
+        entries.append((os.path.basename(path), st_.st_size, st_.st_mtime_ns))
+    h = hashlib.sha1(CUBE_VERSION.encode())
+    for entry in sorted(entries):
+        h.update(repr(entry).encode())
+    return h.hexdigest()
+
+
+# --------------------------------------------
+# Construction
+# --------------------------------------------
+def _closures(df: pd.DataFrame, precision: int = None) -> dict:
+    """Vues « fermetures » (Partie 1), toutes années confondues (+ croquis si `precision`)."""
+    ferme = (df["etatAdministratifUniteLegale"] == "C").to_numpy()
+    views = {
+        "global": pd.DataFrame({
+            "nb_siren": [df["siren"].nunique()],
+            "nb_siren_fermees": [df.loc[ferme, "siren"].nunique()],
+            "nb_lignes": [len(df)],
+            "nb_fermees": [int(ferme.sum())],
+        }),
+        "annee_etat": aggregate([df["annee"], df["etatAdministratifUniteLegale"]], df["siren"])
+                        .dropna(subset=["etatAdministratifUniteLegale"])[["annee", "etatAdministratifUniteLegale", "nb_lignes"]],
+    }
+    hll = ["hll_siren"] if precision is not None else []
+    if precision is not None:
+        views["global"]["hll_siren"] = [to_bytes(sketch(df["siren"].to_numpy(), precision))]
+        views["global"]["hll_siren_fermees"] = [to_bytes(sketch(df.loc[ferme, "siren"].to_numpy(), precision))]
+    if "categorieEntreprise" in df.columns:
+        views["categorie"] = (
+            aggregate(df.loc[ferme, "categorieEntreprise"], df.loc[ferme, "siren"], precision=precision)
+              .rename(columns={"nb_siren": "nb_siren_fermees", "hll_siren": "hll_siren_fermees"})
+              [["categorieEntreprise", "nb_siren_fermees"] + [f"{c}_fermees" for c in hll]]
+        )
+
+    if "anciennete" in df.columns and df["anciennete"].notna().any():
+        views["age"] = (
+            aggregate(age_bins(df["anciennete"]).rename("age_bin"), df["siren"], ferme, precision)
+              .rename(columns={"nb_flag": "nb_fermees"})[["age_bin", "nb_siren", "nb_fermees"] + hll]
+        )
+
+    if "trancheEffectifsUniteLegale" in df.columns:
+        keep = ~df["trancheEffectifsUniteLegale"].isin(["NN", "00"]).to_numpy()
+        label = tranche_labels(df.loc[keep, "trancheEffectifsUniteLegale"]).rename("trancheEffectifs_label")
+        views["tranche"] = (
+            aggregate(label, df.loc[keep, "siren"], ferme[keep], precision)
+              .rename(columns={"nb_flag": "nb_fermees"})[["trancheEffectifs_label", "nb_siren", "nb_fermees"] + hll]
+        )
+
+    if NAF_COLUMN in df.columns:
+        # Lignes (siren × année) et lignes fermées : additives d'une année et d'un niveau NAF à l'autre
+        naf = _naf_cells(df)
+        views["naf"] = (
+            aggregate([df["annee"], naf["nomenclature"], naf["naf"]], df["siren"], ferme)
+              .dropna(subset=["naf"])
+              .rename(columns={"nb_flag": "nb_fermees"})[["annee", "nomenclature", "naf", "nb_lignes", "nb_fermees"]]
+        )
+
+    if DEPARTEMENT in df.columns:
+        views["departement"] = (
+            aggregate([df["annee"], df[DEPARTEMENT]], df["siren"], ferme)
+              .dropna(subset=[DEPARTEMENT])
+              .rename(columns={"nb_flag": "nb_fermees"})[["annee", DEPARTEMENT, "nb_lignes", "nb_fermees"]]
+        )
+    return views
+
+
+def _naf_cells(df: pd.DataFrame) -> pd.DataFrame:
+    """Nomenclature et classe NAF de chaque ligne (naf.classify)."""
+    return classify(df[NAF_COLUMN], df[NOMENCLATURE_COLUMN] if NOMENCLATURE_COLUMN in df.columns else None)
+
+
+def _cohorts(df: pd.DataFrame) -> dict:
+    """Vues « survie » (Partie 2) pour chaque année de cohorte et chaque horizon disponible."""
+    # Tri stable : en cas de doublon siren × année, la première ligne de la source est retenue
+    cohort = df.sort_values(["annee", "siren"], kind="stable").drop_duplicates(subset=["annee", "siren"])
+    horizons = [h for h in HORIZONS if survival_column(h) in cohort.columns]
+
+    def agg(frame, dims):
+        parts = [
+            aggregate([frame[d] for d in dims], frame["siren"], frame[survival_column(h)])
+              .rename(columns={"nb_flag": "nb_survivantes"})
+              .assign(horizon=h)
+            for h in horizons
+        ]
+        return pd.concat(parts, ignore_index=True)
+
+    views = {"cohorte": agg(cohort, ["annee"])}
+    if "categorieEntreprise" in cohort.columns:
+        views["cohorte_categorie"] = agg(cohort, ["annee", "categorieEntreprise"])
+    if "anciennete" in cohort.columns and cohort["anciennete"].notna().any():
+        views["cohorte_age"] = agg(cohort.assign(age_bin=age_bins(cohort["anciennete"])), ["annee", "age_bin"])
+    if "trancheEffectifsUniteLegale" in cohort.columns:
+        cohort_eff = cohort.loc[~cohort["trancheEffectifsUniteLegale"].isin(["NN", "00"])]
+        cohort_eff = cohort_eff.assign(trancheEffectifs_label=tranche_labels(cohort_eff["trancheEffectifsUniteLegale"]))
+        views["cohorte_tranche"] = agg(cohort_eff, ["annee", "trancheEffectifs_label"])
+    if NAF_COLUMN in cohort.columns:
+        views["cohorte_naf"] = agg(pd.concat([cohort, _naf_cells(cohort)], axis=1).dropna(subset=["naf"]),
+                                   ["annee", "nomenclature", "naf"])
+    if DEPARTEMENT in cohort.columns:
+        views["cohorte_departement"] = agg(cohort.dropna(subset=[DEPARTEMENT]), ["annee", DEPARTEMENT])
+    return views
+
+
+def _to_long(views: dict) -> pd.DataFrame:
+    parts = []
+    for name, frame in views.items():
+        frame = frame.copy()
+        for dim in frame.columns.intersection(DIMENSIONS):
+            if dim not in _INT_DIMS:
+                frame[dim] = frame[dim].astype(object)
+        frame.insert(0, "vue", name)
+        parts.append(frame)
+    cube = pd.concat(parts, ignore_index=True)
+    for col in DIMENSIONS:
+        if col not in cube.columns:
+            cube[col] = None
+    for col in MEASURES:
+        cube[col] = cube[col].fillna(0).astype("int64") if col in cube.columns else 0
+    for col in DIMENSIONS:
+        cube[col] = cube[col].astype("Int16" if col in _INT_DIMS else "string")
+    sketches = [c for c in SKETCHES if c in cube.columns]
+    for col in sketches:
+        cube[col] = cube[col].astype(object).where(cube[col].notna(), None)
+    return cube[["vue"] + DIMENSIONS + MEASURES + sketches]
+
+
+def build_cube(df: pd.DataFrame, precision: int = None) -> pd.DataFrame:
+    """Matérialise toutes les vues du dashboard (comptages ; croquis HLL si `precision`)."""
+    views = _closures(df, precision)
+    if len(df.columns.intersection(SURVIVAL_COLUMNS)):
+        views.update(_cohorts(df))
+    return _to_long(views)
+
+
+def merge_cubes(cubes) -> pd.DataFrame:
+    """
+    Fusionne des cubes construits sur des blocs de données (ex. des années
+    différentes) : les comptages s'additionnent, les croquis sont fusionnés et
+    les siren distincts réestimés là où plusieurs blocs contribuent.
+    """
+    both = pd.concat(cubes, ignore_index=True)
+    sketches = [c for c in SKETCHES if c in both.columns]
+    groups = both.groupby(["vue"] + DIMENSIONS, dropna=False, sort=False)
+    out = groups[MEASURES].sum().reset_index()
+    cell = groups.ngroup().to_numpy()
+    for col in sketches:
+        merged = {}
+        for i, blob in zip(cell, both[col]):
+            if isinstance(blob, bytes):
+                merged.setdefault(i, []).append(from_bytes(blob))
+        values = [None] * len(out)
+        for i, parts in merged.items():
+            registers = merge(*parts) if len(parts) > 1 else parts[0]
+            values[i] = to_bytes(registers)
+            if len(parts) > 1:
+                out.loc[i, SKETCHES[col]] = round(estimate(registers))
+        out[col] = values
+    return _to_long({name: frame.drop(columns="vue") for name, frame in out.groupby("vue", sort=False)})
+
+
+def _year_blocks(counts: pd.Series, max_rows: int) -> list:
+    """Années consécutives regroupées tant que le bloc reste sous `max_rows` lignes."""
+    blocks, current, rows = [], [], 0
+    for annee, n in counts.items():
+        if current and rows + n > max_rows:
+            blocks.append(current)
+            current, rows = [], 0
+        current.append(annee)
+        rows += n
+    return blocks + [current] if current else blocks
+
+
+def build_cube_streaming(source: str, precision: int, max_rows: int = STREAM_ROWS) -> pd.DataFrame:
+    """Cube approché, par blocs d'années : un seul bloc de la source en mémoire à la fois."""
+    cube = None
+    for years in _year_blocks(year_counts(source), max_rows):
+        part = build_cube(read_table(source, columns=CUBE_COLUMNS, years=years), precision)
+        cube = part if cube is None else merge_cubes([cube, part])
+    if cube is None:
+        return build_cube(read_table(source, columns=CUBE_COLUMNS), precision)
+    return cube
+
+
+def is_approximate(cube: pd.DataFrame) -> bool:
+    """Vrai si les siren distincts du cube sont estimés (croquis présents)."""
+    return bool(len(cube.columns.intersection(list(SKETCHES))))
+
+
+def patch_cube(cube: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+    """
+    Met à jour le cube par différence : retire les contributions des lignes
+    `removed` et ajoute celles de `added`. Valable parce que toutes les mesures
+    sont additives et que `removed` / `added` portent sur les mêmes siren.
+    """
+    parts = [cube]
+    for frame, sign in ((removed, -1), (added, 1)):
+        if len(frame):
+            delta = build_cube(frame)
+            delta[MEASURES] *= sign
+            parts.append(delta)
+    out = (
+        pd.concat(parts, ignore_index=True)
+          .groupby(["vue"] + DIMENSIONS, dropna=False, sort=False)[MEASURES]
+          .sum()
+          .reset_index()
+    )
+    out = out.loc[(out[MEASURES] != 0).any(axis=1) | (out["vue"] == "global")]
+    return _to_long({name: frame.drop(columns="vue") for name, frame in out.groupby("vue", sort=False)})
+
+
+def write_cube(cube: pd.DataFrame, path: str, fingerprint: str) -> None:
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[b"source_fingerprint"] = fingerprint.encode()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table.replace_schema_metadata(meta), tmp)
+    os.replace(tmp, path)  # les lecteurs concurrents voient l'ancien cube ou le nouveau, jamais un fichier tronqué
+
+
+def read_cube_fingerprint(path: str):
+    if not os.path.exists(path):
+        return None
+    meta = pq.read_schema(path).metadata or {}
+    value = meta.get(b"source_fingerprint")
+    return value.decode() if value else None
+
+
+def compute_cube(source: str, backend: str = CUBE_BACKEND, exact: bool = True,
+                 error: float = SKETCH_ERROR, departements=None) -> pd.DataFrame:
+    """
+    Cube de la source : pandas (défaut) ou SQL DuckDB sur les fichiers (`backend="duckdb"`) ;
+    `exact=False` : construction approchée en flux (erreur type relative `error`).
+    `departements` : cube exact des seuls départements du siège listés (leurs partitions).
+    """
+    if departements is not None:
+        return build_cube(read_table(source, columns=CUBE_COLUMNS, departements=departements))
+    if not exact:
+        return build_cube_streaming(source, precision_for(error))
+    if backend == "duckdb":
+        import sql_backend
+        if sql_backend.available():
+            return sql_backend.build_cube_sql(source)
+        logger.warning("Backend duckdb indisponible (paquet `duckdb` absent) : construction en pandas.")
+    return build_cube(read_table(source, columns=CUBE_COLUMNS))
+
+
+def load_or_build_cube(source: str, path: str = None, backend: str = CUBE_BACKEND, exact: bool = True,
+                       error: float = SKETCH_ERROR) -> pd.DataFrame:
+    """Relit le cube s'il correspond à la source (et à la précision des croquis), sinon le reconstruit."""
+    path = path or (CUBE_PATH if exact else CUBE_APPROX_PATH)
+    fingerprint = source_fingerprint(source)
+    if not exact:
+        fingerprint += f"+hll{precision_for(error)}"
+    if read_cube_fingerprint(path) != fingerprint:
+        write_cube(compute_cube(source, backend, exact, error), path, fingerprint)
+    return pq.read_table(path).to_pandas()
+
+
+# --------------------------------------------
+# Lecture d'une vue
+# --------------------------------------------
+def view(cube: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Cellules d'une vue, avec ses seules dimensions, triées dans l'ordre des codes."""
+    dims = VIEWS[name]
+    out = cube.loc[cube["vue"] == name, dims + MEASURES].reset_index(drop=True)
+    for dim in dims:
+        if dim in _ORDERED_DIMS:
+            out[dim] = pd.Categorical(out[dim], categories=_ORDERED_DIMS[dim], ordered=True)
+        elif dim not in _INT_DIMS:
+            out[dim] = out[dim].astype(object).where(out[dim].notna(), np.nan)
+    if dims:
+        out = out.sort_values(dims, key=_sort_key, na_position="last", ignore_index=True)
+    return out
+
+
+def _sort_key(col: pd.Series) -> pd.Series:
+    order = _SORT_ORDERS.get(col.name)
+    if order is None:
+        return col
+    codes = pd.Categorical(col, categories=order).codes
+    return pd.Series(np.where(codes < 0, len(order), codes), index=col.index)
+
+
+if __name__ == "__main__":
+    approx = "--approx" in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != "--approx"]
+    src = args[0] if args else resolve_source()
+    dst = args[1] if len(args) > 1 else (CUBE_APPROX_PATH if approx else CUBE_PATH)
+    load_or_build_cube(src, dst, exact=not approx)
+    print(f"Cube à jour : {dst}")
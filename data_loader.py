@@ -0,0 +1,320 @@
+# ======================================================
+# CHARGEMENT DES DONNÉES : PARQUET PARTITIONNÉ (annee) / CSV
+# ======================================================
+#
+# Le dashboard lit de préférence un dataset Parquet typé, partitionné par
+# `annee` (layout Hive : data_parquet/annee=2020/part-0.parquet). Chaque
+# section ne demande que ses colonnes et ses années : la projection et le
+# filtre sur `annee` sont poussés au lecteur Arrow, qui n'ouvre que les
+# partitions utiles. Le CSV historique (`data.csv`) reste accepté en repli.
+#
+# Tables partagées : `open_shared_table` matérialise une fois les colonnes du
+# dashboard dans un fichier Arrow IPC non compressé (trié par année, bornes de
+# chaque année dans les métadonnées) puis le projette en mémoire (mmap). Toutes
+# les sessions, et tous les processus, lisent les mêmes pages sans copie ; un
+# filtre d'années n'est qu'une tranche (slice) de la table.
+#
+# Une colonne `Survie_<h>m` demandée mais absente (autre horizon, ancien
+# dataset) est dérivée de l'historique `_historique/` s'il existe (survival.py).
+#
+# Dataset avec géographie (preprocessing.py --etablissements) : colonne
+# `departement`, triée dans chaque fichier d'année et découpée en row groups
+# de taille bornée ; un filtre de départements est poussé au lecteur Arrow, qui
+# écarte les row groups hors filtre d'après leurs statistiques min / max. (Pas
+# de second niveau de partition : années × départements × partitions siren
+# donnerait des centaines de milliers de fichiers à l'échelle de Sirene.)
+#
+# Conversion CSV → Parquet partitionné :
+#     python data_loader.py data.csv data_parquet
+
+import glob
+import json
+import os
+import sys
+import tempfile
+import zlib
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from geo import DEPARTEMENT
+
+from schema import SCHEMA, apply_schema, memory_footprint
+from survival import SURVIVAL_COLUMNS, column_horizon, has_history, load_history, survival_table
+
+# Sources essayées dans l'ordre (Parquet d'abord, CSV en repli)
+DEFAULT_SOURCES = ("data_parquet", "data.csv")
+
+PARTITIONING = ds.partitioning(pa.schema([("annee", pa.int16())]), flavor="hive")
+# Lignes par row group d'un dataset avec géographie (granularité du filtre de départements)
+GEO_ROW_GROUP = 65_536
+
+# Taille des blocs lus dans le CSV lorsqu'un filtre d'années est demandé
+CSV_CHUNKSIZE = 1_000_000
+
+# Colonnes de la table partagée (celles lues par le dashboard)
+SHARED_COLUMNS = ("siren", "annee", "etatAdministratifUniteLegale", "categorieEntreprise",
+                  "trancheEffectifsUniteLegale", "anciennete", "activitePrincipaleUniteLegale",
+                  "nomenclatureActivitePrincipaleUniteLegale", *SURVIVAL_COLUMNS,
+                  DEPARTEMENT)
+SHARED_DIR = os.path.join(tempfile.gettempdir(), "sirene-shared")
+
+
+def resolve_source(candidates=DEFAULT_SOURCES) -> str:
+    """Retourne la première source existante (sinon la dernière, pour le message d'erreur)."""
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return candidates[-1]
+
+
+def is_parquet_source(path: str) -> bool:
+    return os.path.isdir(path) or str(path).endswith(".parquet")
+
+
+def open_dataset(path: str) -> ds.Dataset:
+    if os.path.isdir(path):
+        return ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+    return ds.dataset(path, format="parquet")
+
+
+def geo_write_options(df: pd.DataFrame):
+    """(lignes triées, options de write_dataset) : tri par département et row groups bornés si géographie."""
+    if DEPARTEMENT not in df.columns:
+        return df, {}
+    df = df.sort_values(["annee", DEPARTEMENT], kind="stable", ignore_index=True)
+    return df, {"min_rows_per_group": 0, "max_rows_per_group": GEO_ROW_GROUP}
+
+
+def source_columns(path: str) -> list:
+    """Colonnes disponibles dans la source, sans lire les données."""
+    if is_parquet_source(path):
+        return list(open_dataset(path).schema.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def has_geography(path: str) -> bool:
+    """Vrai si la source porte le département du siège (preprocessing.py --etablissements)."""
+    return os.path.exists(path) and DEPARTEMENT in source_columns(path)
+
+
+def year_counts(path: str) -> pd.Series:
+    """Nombre de lignes par année de la source (colonne `annee` seule, lue par blocs pour un CSV)."""
+    if is_parquet_source(path):
+        dataset = open_dataset(path)
+        if "annee" not in dataset.schema.names:
+            return pd.Series(dtype="int64")
+        counts = dataset.to_table(columns=["annee"]).column("annee").value_counts().to_pandas()
+        counts = pd.Series(counts.str["counts"].to_numpy(), index=counts.str["values"].to_numpy())
+    else:
+        if "annee" not in pd.read_csv(path, nrows=0).columns:
+            return pd.Series(dtype="int64")
+        counts = pd.concat([pd.to_numeric(chunk["annee"], errors="coerce").value_counts()
+                            for chunk in pd.read_csv(path, usecols=["annee"], chunksize=CSV_CHUNKSIZE)])
+    counts = counts[counts.index.notna()]
+    counts = counts.groupby(counts.index.astype("int64")).sum().sort_index()
+    return counts.rename_axis("annee").rename("nb_lignes")
+
+
+def _read_parquet(path, columns, years, departements=None) -> pd.DataFrame:
+    dataset = open_dataset(path)
+    names = dataset.schema.names
+    cols = [c for c in columns if c in names] if columns is not None else None
+    filt = None
+    if years is not None and "annee" in names:
+        filt = ds.field("annee").isin([int(y) for y in years])
+    if departements is not None and DEPARTEMENT in names:
+        by_dep = ds.field(DEPARTEMENT).isin([str(d) for d in departements])
+        filt = by_dep if filt is None else filt & by_dep
+    table = dataset.to_table(columns=cols, filter=filt)
+    return table.to_pandas()
+
+
+def _read_csv(path, columns, years) -> pd.DataFrame:
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [c for c in columns if c in header] if columns is not None else None
+    if years is None or "annee" not in header:
+        return pd.read_csv(path, usecols=usecols)
+
+    # Filtre sur l'année bloc par bloc pour ne jamais tout garder en mémoire
+    if usecols is not None and "annee" not in usecols:
+        read_cols = usecols + ["annee"]
+    else:
+        read_cols = usecols
+    wanted = {int(y) for y in years}
+    chunks = []
+    for chunk in pd.read_csv(path, usecols=read_cols, chunksize=CSV_CHUNKSIZE):
+        annee = pd.to_numeric(chunk["annee"], errors="coerce")
+        chunks.append(chunk.loc[annee.isin(wanted)])
+    out = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=read_cols)
+    if usecols is not None:
+        out = out[usecols]
+    return out
+
+
+def read_table(path: str, columns=None, years=None, departements=None) -> pd.DataFrame:
+    """
+    Lit `columns` pour les `years` (et `departements`) demandées depuis un dataset
+    Parquet (projection + filtres poussés) ou, en repli, depuis un CSV, puis
+    applique le schéma compact (cf. schema.py).
+    `columns=None` / `years=None` / `departements=None` = tout lire.
+    """
+    if is_parquet_source(path):
+        df = _read_parquet(path, columns, years, departements)
+    else:
+        df = _read_csv(path, columns, years)
+        if departements is not None and DEPARTEMENT in df.columns:
+            df = df.loc[df[DEPARTEMENT].astype("string").isin([str(d) for d in departements])]
+    if columns is not None:
+        df = _derive_survival(df, path, columns)
+    return apply_schema(df)
+
+
+def _derive_survival(df: pd.DataFrame, path: str, columns) -> pd.DataFrame:
+    """Complète les colonnes Survie_<h>m demandées mais absentes, depuis l'historique trié."""
+    missing = {c: column_horizon(c) for c in columns if column_horizon(c) and c not in df.columns}
+    if not missing or not {"siren", "annee"}.issubset(df.columns) or not has_history(path):
+        return df
+    valid = df["siren"].notna() & df["annee"].notna()
+    flags = survival_table(load_history(path), df.loc[valid, "siren"].to_numpy(dtype="int64"),
+                           df.loc[valid, "annee"].to_numpy(dtype="int64"), horizons=list(missing.values()))
+    for col in missing:
+        df[col] = pd.Series(0, index=df.index, dtype="int8")
+        df.loc[valid, col] = flags[col].to_numpy()
+    return df
+
+
+# --------------------------------------------
+# Table Arrow partagée (mmap, lecture seule)
+# --------------------------------------------
+def _source_key(path: str) -> str:
+    """Préfixe des tables partagées d'une source (hash de son chemin absolu)."""
+    return f"{zlib.crc32(os.path.abspath(path).encode()):08x}"
+
+
+def shared_table_path(path: str, fingerprint: str, columns=SHARED_COLUMNS) -> str:
+    # Source, empreinte et colonnes font partie du nom : une table d'une autre source ou
+    # d'une version antérieure n'est pas réutilisée
+    layout = zlib.crc32(",".join(columns).encode())
+    return os.path.join(SHARED_DIR, f"{_source_key(path)}-{fingerprint}-{layout:08x}.arrow")
+
+
+def build_shared_table(path: str, dst: str, columns=SHARED_COLUMNS) -> None:
+    """Écrit les `columns` de la source, au schéma compact et triées par année, en Arrow IPC."""
+    available = [c for c in columns if c in source_columns(path)]
+    if is_parquet_source(path) and "annee" in available:
+        # Année par année : mémoire bornée par la plus grosse année
+        dataset = open_dataset(path)
+        frames = (apply_schema(dataset.to_table(columns=available, filter=ds.field("annee") == y).to_pandas())
+                  for y in year_counts(path).index)
+    else:
+        df = read_table(path, columns=available)
+        frames = [df.sort_values("annee", kind="stable", ignore_index=True) if "annee" in df.columns else df]
+
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    bounds, offset, writer = {}, 0, None
+    try:
+        for df in frames:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                schema = table.schema.remove_metadata()
+                writer = pa.ipc.new_file(tmp, schema)
+            if "annee" in df.columns:
+                for annee, n in df["annee"].value_counts(sort=False).sort_index().items():
+                    bounds[int(annee)] = [offset, int(n)]
+                    offset += int(n)
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    # Bornes par année (connues après écriture) dans un fichier voisin, en place avant la table
+    tmp_bounds = f"{dst}.json.{os.getpid()}.tmp"
+    with open(tmp_bounds, "w") as f:
+        json.dump(bounds, f)
+    os.replace(tmp_bounds, f"{dst}.json")
+    os.replace(tmp, dst)  # atomique : les autres processus voient le fichier complet ou rien
+    remove_stale_tables(path, dst)
+
+
+def remove_stale_tables(path: str, keep: str) -> None:
+    """
+    Supprime les tables partagées (et leurs bornes) de la source `path` construites
+    pour d'autres empreintes : une par rafraîchissement des données sinon. Les tables
+    des autres sources ne sont pas touchées. Les processus qui les projettent encore
+    en mémoire gardent leur copie jusqu'à la fin (fichier supprimé, pas tronqué).
+    """
+    for old in glob.glob(os.path.join(os.path.dirname(keep), f"{_source_key(path)}-*.arrow")):
+        if old != keep:
+            for f in (old, f"{old}.json"):
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+
+
+def open_shared_table(path: str, fingerprint: str) -> pa.Table:
+    """Table de la source projetée en mémoire (construite au premier appel pour cette empreinte)."""
+    dst = shared_table_path(path, fingerprint)
+    try:
+        return _map_shared_table(dst)
+    except FileNotFoundError:
+        # Absente, ou supprimée par un autre processus entre-temps : reconstruite
+        build_shared_table(path, dst)
+        return _map_shared_table(dst)
+
+
+def _map_shared_table(dst: str) -> pa.Table:
+    with open(f"{dst}.json") as f:
+        bounds = json.load(f)
+    table = pa.ipc.open_file(pa.memory_map(dst, "r")).read_all()
+    return table.replace_schema_metadata({b"annees": json.dumps(bounds).encode()})
+
+
+def table_to_frame(table: pa.Table, columns=None, years=None, path: str = None, departements=None) -> pd.DataFrame:
+    """
+    DataFrame des `columns` × `years` d'une table partagée : les années sont des
+    tranches contiguës (aucune copie côté Arrow), seules les colonnes demandées
+    sont converties. Les Survie_<h>m absentes sont dérivées de l'historique de `path`.
+    `departements` : filtre sur la colonne du département du siège, si présente.
+    """
+    if years is not None and "annee" in table.column_names:
+        bounds = json.loads(table.schema.metadata[b"annees"])
+        parts = [table.slice(*bounds[str(int(y))]) for y in years if str(int(y)) in bounds]
+        table = pa.concat_tables(parts) if parts else table.slice(0, 0)
+    if departements is not None and DEPARTEMENT in table.column_names:
+        wanted = pa.array([str(d) for d in departements]).cast(table.schema.field(DEPARTEMENT).type)
+        table = table.filter(pc.is_in(table[DEPARTEMENT], value_set=wanted))
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    df = table.to_pandas(split_blocks=True)
+    for col, dtype in SCHEMA.items():
+        # Les catégories du dictionnaire Arrow sont celles du schéma compact
+        if col in df.columns and isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(dtype)
+    if columns is not None and path is not None:
+        df = _derive_survival(df, path, columns)
+    df.attrs["memoire"] = {"avant": table.nbytes, "apres": memory_footprint(df), "lignes_ecartees": 0}
+    return df
+
+
+def write_partitioned(df: pd.DataFrame, path: str) -> None:
+    """Écrit un DataFrame au schéma compact en dataset Parquet partitionné par `annee`."""
+    df, options = geo_write_options(df)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table, path, format="parquet", partitioning=PARTITIONING, existing_data_behavior="delete_matching", **options,
+    )
+
+
+def convert_csv(src: str, dst: str) -> None:
+    """Conversion unique CSV → Parquet partitionné (colonnes déjà typées)."""
+    write_partitioned(apply_schema(pd.read_csv(src)), dst)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage : python data_loader.py <data.csv> <dossier_parquet>")
+    convert_csv(sys.argv[1], sys.argv[2])
@@ -0,0 +1,241 @@
+# ======================================================
+# INSTRUMENTATION DU DASHBOARD : TEMPS, MÉMOIRE, LIGNES, CACHES
+# ======================================================
+#
+# Activée par la variable d'environnement DIAGNOSTICS (DIAGNOSTICS=1 streamlit
+# run app.py) ; sans elle, les décorateurs rendent la fonction d'origine et
+# span() ne fait rien : aucun coût sur le chemin critique.
+#
+# Chaque exécution du script (ou d'un fragment) ouvre une trace ; chaque étape
+# instrumentée (chargement, cohorte, agrégation, graphique) y ajoute un
+# intervalle :
+#   - durée (horloge murale) ;
+#   - pic de mémoire Python pendant l'étape (tracemalloc, réinitialisé à
+#     l'entrée de chaque intervalle, propagé aux intervalles englobants) et
+#     variation de la mémoire Arrow (pool pyarrow, hors tracemalloc). Ces
+#     compteurs sont ceux du processus : les sessions Streamlit étant des
+#     threads, un intervalle chevauchant celui d'une autre session est marqué
+#     « pic_partage » (pic approché, allocations et réinitialisations mêlées) ;
+#   - nombre de lignes produites, si le résultat est un tableau.
+# Les fonctions mises en cache (st.cache_data / st.cache_resource) comptent
+# appels et exécutions réelles : le corps ne s'exécute qu'en cas d'échec du
+# cache, d'où succès = appels − échecs.
+# Export au format Chrome Trace Event (chrome://tracing, ui.perfetto.dev),
+# écrit dans DIAGNOSTICS_TRACE si défini.
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+
+ENABLED = os.environ.get("DIAGNOSTICS", "").lower() not in ("", "0", "false", "non")
+TRACE_PATH = os.environ.get("DIAGNOSTICS_TRACE") or None
+
+_local = threading.local()  # trace courante du thread d'exécution du script
+# Intervalles ouverts par thread et nombre d'ouvertures, tous threads confondus :
+# détection des intervalles concurrents (pic tracemalloc partagé)
+_lock = threading.Lock()
+_open = Counter()
+_entries = 0
+
+
+class Trace:
+    """Intervalles et compteurs de cache d'une exécution du script (ou d'un fragment)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.time()
+        self.spans = []
+        self.cache = Counter()  # (fonction, "appels" | "echecs")
+        self._stack = []
+
+    def frame(self) -> pd.DataFrame:
+        """Un intervalle par ligne (ordre d'ouverture), profondeur d'imbrication incluse."""
+        cols = ["etape", "type", "profondeur", "debut_s", "duree_s", "pic_mo", "pic_partage", "arrow_mo", "lignes"]
+        return pd.DataFrame(sorted(self.spans, key=lambda s: s["debut_s"]), columns=cols)
+
+
+def current():
+    return getattr(_local, "trace", None)
+
+
+def start_trace(name: str):
+    """Ouvre la trace de l'exécution en cours (None si l'instrumentation est désactivée)."""
+    if not ENABLED:
+        return None
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _local.trace = Trace(name)
+    return _local.trace
+
+
+def resume(trace) -> None:
+    """Rattache le thread courant à `trace` (réexécution d'un fragment seul)."""
+    if ENABLED and trace is not None:
+        _local.trace = trace
+
+
+def _rows(out):
+    if isinstance(out, (pd.DataFrame, pd.Series)):
+        return len(out)
+    if isinstance(out, pa.Table):
+        return out.num_rows
+    return None
+
+
+def _enter() -> tuple:
+    """(autre thread dans un intervalle, ouvertures des autres threads) à l'entrée d'un intervalle."""
+    global _entries
+    me = threading.get_ident()
+    with _lock:
+        others = sum(n for t, n in _open.items() if t != me) > 0
+        _open[me] += 1
+        _entries += 1
+        _local.entries = getattr(_local, "entries", 0) + 1
+        return others, _entries - _local.entries
+
+
+def _leave(foreign: int) -> bool:
+    """Vrai si un autre thread a ouvert un intervalle depuis `foreign` ou en a encore un ouvert."""
+    me = threading.get_ident()
+    with _lock:
+        _open[me] -= 1
+        if not _open[me]:
+            del _open[me]
+        return _entries - _local.entries > foreign or sum(n for t, n in _open.items() if t != me) > 0
+
+
+@contextmanager
+def span(name: str, kind: str = "calcul", rows=None):
+    """
+    Intervalle instrumenté ; le dict produit accepte ["lignes"] = … dans le bloc.
+    Sans trace ouverte (instrumentation désactivée), ne mesure rien.
+    """
+    trace = current()
+    info = {"lignes": rows}
+    if trace is None:
+        yield info
+        return
+    shared, foreign = _enter()
+    mem, peak = tracemalloc.get_traced_memory()
+    if trace._stack:
+        trace._stack[-1]["pic"] = max(trace._stack[-1]["pic"], peak)
+    tracemalloc.reset_peak()
+    frame = {"debut": mem, "pic": mem}
+    trace._stack.append(frame)
+    arrow, wall, t0 = pa.total_allocated_bytes(), time.time(), time.perf_counter()
+    try:
+        yield info
+    finally:
+        elapsed = time.perf_counter() - t0
+        frame["pic"] = max(frame["pic"], tracemalloc.get_traced_memory()[1])
+        shared = _leave(foreign) or shared
+        trace._stack.pop()
+        if trace._stack:
+            trace._stack[-1]["pic"] = max(trace._stack[-1]["pic"], frame["pic"])
+        trace.spans.append({
+            "etape": name, "type": kind, "profondeur": len(trace._stack),
+            "debut_s": wall - trace.start,
+            "duree_s": elapsed,
+            "pic_mo": (frame["pic"] - frame["debut"]) / 1e6,
+            "pic_partage": shared,
+            "arrow_mo": (pa.total_allocated_bytes() - arrow) / 1e6,
+            "lignes": info["lignes"],
+        })
+
+
+def traced(kind: str = "calcul", name: str = None):
+    """Décorateur : un intervalle par appel, lignes du résultat si c'est un tableau."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label, kind) as info:
+                out = fn(*args, **kwargs)
+                info["lignes"] = _rows(out)
+            return out
+        return wrapper
+    return decorate
+
+
+def counted(cache, kind: str = "cache"):
+    """
+    Remplace @st.cache_data / @st.cache_resource : @counted(st.cache_data).
+    Compte appels et échecs du cache ; le corps (échec) a son propre intervalle.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return cache(fn)
+        label = fn.__name__
+
+        @functools.wraps(fn)
+        def body(*args, **kwargs):
+            trace = current()
+            if trace is not None:
+                trace.cache[(label, "echecs")] += 1
+            with span(f"{label} (calcul)", kind) as info:
+                out = fn(*args, **kwargs)
+                info["lignes"] = _rows(out)
+            return out
+
+        cached = cache(body)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = current()
+            if trace is not None:
+                trace.cache[(label, "appels")] += 1
+            with span(label, kind) as info:
+                out = cached(*args, **kwargs)
+                info["lignes"] = _rows(out)
+            return out
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorate
+
+
+def cache_table(traces) -> pd.DataFrame:
+    """Appels, succès et échecs de chaque fonction mise en cache, cumulés sur `traces`."""
+    total = Counter()
+    for trace in traces:
+        total.update(trace.cache)
+    names = sorted({name for name, _ in total})
+    out = pd.DataFrame({"fonction": names,
+                        "appels": [total[(n, "appels")] for n in names],
+                        "echecs": [total[(n, "echecs")] for n in names]})
+    out["succes"] = out["appels"] - out["echecs"]
+    out["taux_succes_%"] = 100 * out["succes"] / out["appels"].where(out["appels"] > 0)
+    return out[["fonction", "appels", "succes", "echecs", "taux_succes_%"]]
+
+
+def chrome_trace(traces) -> dict:
+    """Traces au format Chrome Trace Event : une piste (tid) par exécution."""
+    events = []
+    for tid, trace in enumerate(traces):
+        events.append({"ph": "M", "name": "thread_name", "pid": 0, "tid": tid, "args": {"name": trace.name}})
+        for s in trace.spans:
+            events.append({
+                "ph": "X", "name": s["etape"], "cat": s["type"], "pid": 0, "tid": tid,
+                "ts": round((trace.start + s["debut_s"]) * 1e6), "dur": round(s["duree_s"] * 1e6),
+                "args": {k: s[k] for k in ("pic_mo", "pic_partage", "arrow_mo", "lignes") if s[k] is not None},
+            })
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "metadata": {"pic_mo": "pic tracemalloc du processus (toutes sessions) ; approché si pic_partage"}}
+
+
+def export(traces, path: str = TRACE_PATH) -> None:
+    """Écrit les traces (format Chrome) dans `path`, par remplacement atomique."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(chrome_trace(traces), f)
+    os.replace(tmp, path)
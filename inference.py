@@ -0,0 +1,113 @@
+# ======================================================
+# INFÉRENCE PAR RÉÉCHANTILLONNAGE (Partie 4)
+# ======================================================
+#
+# Complète le Chi² / Fisher asymptotique par :
+#   - une p-value de PERMUTATION : sous H0, permuter les groupes d'intensité
+#     entre siren revient à répartir le total de survivantes entre les groupes
+#     selon une loi hypergéométrique multivariée (marges fixées) ;
+#   - des IC BOOTSTRAP des taux de survie par groupe : rééchantillonner les
+#     siren d'un groupe revient à tirer ses survivantes selon une loi binomiale.
+# Les deux ne dépendent que de la table de contingence : des milliers de
+# réplications sont tirées d'un bloc (matrice réplications × groupes), quelle
+# que soit la taille de la cohorte.
+#
+# Reproductibilité : les réplications sont découpées en blocs de taille fixe,
+# chacun avec sa graine issue de SeedSequence(seed).spawn ; le résultat est
+# identique en série et avec un pool de processus (workers > 1).
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESAMPLES = 10_000
+DEFAULT_SEED = 2025
+CHUNK_SIZE = 2_500  # réplications par bloc (et par tâche du pool)
+
+
+def counts(tab: pd.DataFrame):
+    """(effectifs, survivantes) par groupe depuis un crosstab groupe × {0, 1}."""
+    tab = tab.reindex(columns=[0, 1], fill_value=0)
+    survivors = tab[1].to_numpy(dtype=np.int64)
+    return survivors + tab[0].to_numpy(dtype=np.int64), survivors
+
+
+def chi2_statistic(n, survivors) -> np.ndarray:
+    """Chi² de Pearson (sans correction) de tables k × 2 ; `survivors` (et `n`) peuvent être (tables, k)."""
+    n = np.asarray(n, dtype=np.float64)
+    survivors = np.asarray(survivors, dtype=np.float64)
+    total = n.sum(axis=-1, keepdims=True)
+    expected = n * survivors.sum(axis=-1, keepdims=True) / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = (survivors - expected) ** 2 * (1 / expected + 1 / (n - expected))
+    return np.nansum(np.where(np.isfinite(terms), terms, 0.0), axis=-1)
+
+
+def chunks(n_resamples: int, seed: int, size: int = CHUNK_SIZE):
+    """Blocs de réplications (taille, graine) : même résultat en série et en parallèle."""
+    sizes = [size] * (n_resamples // size)
+    if n_resamples % size:
+        sizes.append(n_resamples % size)
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def parallel_map(fn, tasks, workers: int):
+    """`fn` sur chaque tâche, dans l'ordre ; pool de processus si workers > 1."""
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fn, tasks))
+    return [fn(t) for t in tasks]
+
+
+def _permutation_chunk(task):
+    (size, seed), n, total_survivors = task
+    rng = np.random.default_rng(seed)
+    return chi2_statistic(n, rng.multivariate_hypergeometric(n, total_survivors, size=size))
+
+
+def _bootstrap_chunk(task):
+    (size, seed), n, rates = task
+    rng = np.random.default_rng(seed)
+    return rng.binomial(n, rates, size=(size, len(n)))
+
+
+def permutation_test(n, survivors, n_resamples: int = DEFAULT_RESAMPLES,
+                     seed: int = DEFAULT_SEED, workers: int = 1) -> dict:
+    """
+    Test de permutation de l'indépendance survie × groupe (statistique : Chi²).
+    p-value = (1 + #{Chi² permuté ≥ Chi² observé}) / (1 + réplications).
+    """
+    n = np.asarray(n, dtype=np.int64)
+    survivors = np.asarray(survivors, dtype=np.int64)
+    observed = float(chi2_statistic(n, survivors))
+    tasks = [(chunk, n, int(survivors.sum())) for chunk in chunks(n_resamples, seed)]
+    stats = np.concatenate(parallel_map(_permutation_chunk, tasks, workers))
+    # Tolérance relative : égalités numériques comptées comme « au moins aussi extrêmes »
+    extreme = int((stats >= observed * (1 - 1e-12)).sum())
+    return {"chi2": observed, "p_value": (1 + extreme) / (1 + len(stats)), "replications": len(stats)}
+
+
+def bootstrap_rates(n, survivors, n_resamples: int = DEFAULT_RESAMPLES, confidence: float = 0.95,
+                    seed: int = DEFAULT_SEED, workers: int = 1) -> pd.DataFrame:
+    """IC bootstrap (percentiles) des taux de survie (%) par groupe."""
+    n = np.asarray(n, dtype=np.int64)
+    survivors = np.asarray(survivors, dtype=np.int64)
+    rates = np.divide(survivors, n, out=np.zeros(len(n)), where=n > 0)
+    tasks = [(chunk, n, rates) for chunk in chunks(n_resamples, seed)]
+    draws = np.concatenate(parallel_map(_bootstrap_chunk, tasks, workers))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = 100 * draws / n
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(pct, [alpha, 1 - alpha], axis=0)
+    return pd.DataFrame({"n": n, "taux_survie_%": 100 * rates, "ic_bas_%": low, "ic_haut_%": high})
+
+
+def resampling_summary(tab: pd.DataFrame, n_resamples: int = DEFAULT_RESAMPLES, confidence: float = 0.95,
+                       seed: int = DEFAULT_SEED, workers: int = 1):
+    """Permutation + bootstrap depuis un crosstab groupe × {0, 1} : (test, IC par groupe)."""
+    n, survivors = counts(tab)
+    test = permutation_test(n, survivors, n_resamples, seed, workers)
+    rates = bootstrap_rates(n, survivors, n_resamples, confidence, seed, workers)
+    rates.index = tab.index
+    return test, rates
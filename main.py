@@ -1,16 +1,338 @@
-# This is a sample Python script.
+# ======================================================
+# MODE RAPPORT (SANS STREAMLIT)
+# ======================================================
+#
+# Calcule les Parties 1 à 4 du dashboard (analytics.py) pour plusieurs années
+# de cohorte, horizons et seuils α, et écrit les résultats en JSON, Parquet et
+# HTML — pour des rapports planifiés ou des calculs en masse :
+#
+#     python main.py --annees 2019 2020 2021 --horizons 12 24 --alpha 0.01 0.05 --sortie rapports --workers 4
+#
+# - le dataset est matérialisé UNE fois en table Arrow partagée (data_loader) :
+#   chaque processus du pool la projette en mémoire, sans copie ni relecture de
+#   la source ; cube, aides et index des lauréats sont chargés une fois par
+#   processus (l'index est transmis par le processus principal) ;
+# - une tâche par (année de cohorte, horizon) ; α ne change que la décision,
+#   appliquée dans la tâche pour tous les seuils demandés ;
+# - écriture au fil de l'eau, dès qu'une tâche se termine : rapport JSON, tables
+#   Parquet (partitionnées annee=/horizon=, comme le dataset), page HTML, et
+#   index.html mis à jour. Relancé, le rapport saute les tâches déjà écrites
+#   pour la même source (--force pour tout recalculer).
+#
+# Sortie :
+#     rapports/index.html, partie1.json, partie1.html
+#     rapports/json/cohorte_2020_24m.json       rapports/html/cohorte_2020_24m.html
+#     rapports/parquet/<table>/annee=2020/horizon=24/part-0.parquet
 
-# Press Maj+F10 to execute it or replace it with your code.
-# Press Double Shift to search everywhere for classes, files, tool windows, actions, and settings.
+import argparse
+import html
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numpy as np
+import pandas as pd
 
-def print_hi(name):
-    # Use a breakpoint in the code line below to debug your script.
-    print(f'Hi, {name}')  # Press Ctrl+F8 to toggle the breakpoint.
+from aides import load_aid_index, resolve_laureates
+from asof import load_asof
+from analytics import (
+    ALPHAS, aid_by_category, aid_effect, aid_measures, aid_summary_siren, closures, cohort_km, cohort_survival,
+    cohort_with_aid, decisions, km_table, prepare_test, read_aides_etat, sector_rates,
+)
+from causal import COVARIATE_COLUMNS, DEFAULT_BOOTSTRAP
+from cube import is_approximate, load_or_build_cube, source_fingerprint, view
+from data_loader import open_shared_table, resolve_source, table_to_frame
+from inference import DEFAULT_RESAMPLES
+from survival import HORIZONS, has_history, survival_column
 
+AIDES_PATH = "df_participationEtat.csv"
+# Strates des courbes de Kaplan–Meier (colonne de strate → libellé)
+KM_DIMENSIONS = {"categorieEntreprise": "categorie", "age_bin": "anciennete", "trancheEffectifs_label": "tranche"}
 
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    print_hi('PyCharm')
+# Contexte d'un processus : table partagée, cube, aides (chargés une fois par _init_worker)
+_CONTEXT = {}
 
-# See PyCharm help at https://www.jetbrains.com/help/pycharm/
+
+# --------------------------------------------
+# Calcul (processus du pool)
+# --------------------------------------------
+def _init_worker(options: dict) -> None:
+    source = options["source"]
+    _CONTEXT.clear()
+    _CONTEXT.update(options)
+    _CONTEXT["table"] = open_shared_table(source, options["empreinte"])
+    _CONTEXT["cube"] = load_or_build_cube(source, exact=options["exact"])
+    _CONTEXT["dfa"] = read_aides_etat(options["aides"]) if options["aides"] else pd.DataFrame()
+    _CONTEXT["events"] = load_asof(source) if has_history(source) else None
+
+
+def run_cohort(task) -> dict:
+    """Parties 2 à 4 pour une année de cohorte et un horizon : KPI, décisions par α et tables."""
+    annee, horizon = task
+    ctx = _CONTEXT
+    col_survie = survival_column(horizon)
+    t0 = time.perf_counter()
+    df = table_to_frame(ctx["table"], columns=("siren", "annee", *COVARIATE_COLUMNS, col_survie),
+                        years=(annee,), path=ctx["source"])
+    report = {"annee": annee, "horizon": horizon, "colonne_survie": col_survie, "empreinte": ctx["empreinte"],
+              "parametres": ctx["parametres"], "kpi": {}, "tables": {}}
+    kpi, tables = report["kpi"], report["tables"]
+
+    # Partie 2 — survie de la cohorte (cube)
+    survie = cohort_survival(ctx["cube"], annee, horizon)
+    kpi.update({**survie["kpi"], "censure": survie["censure"]})
+    for key in ("par_categorie", "par_anciennete", "par_tranche"):
+        tables[f"survie_{key}"] = survie[key]
+
+    # Partie 2 ter — secteurs NAF (classes du cube sommées par section et division)
+    for level in ("section", "division"):
+        secteurs = sector_rates(ctx["cube"], annee, horizon, level)
+        if not secteurs.empty:
+            tables[f"secteurs_par_{level}"] = secteurs
+
+    # Partie 2 bis — Kaplan–Meier
+    if ctx["events"] is not None:
+        curves = []
+        for dimension, label in KM_DIMENSIONS.items():
+            km = cohort_km(ctx["events"], df, annee, dimension)
+            if not km.empty:
+                curves.append(km.assign(dimension=label))
+                tables[f"km_{label}"] = km_table(km, HORIZONS)
+        if curves:
+            tables["km_courbes"] = pd.concat(curves, ignore_index=True)
+
+    # Partie 3 — aides reçues par chaque entreprise
+    if ctx["aid_index"] is not None:
+        aid = aid_summary_siren(cohort_with_aid(df, annee, col_survie, ctx["aid_index"], ctx["events"]), ctx["aid_index"], col_survie)
+        kpi.update({"aides_total": aid["total"], "nb_aidees": aid["nb_aidees"], "gini_aidees": aid["gini"]})
+        for key in ("par_mesure", "par_categorie", "survie"):
+            if key in aid:
+                tables[f"aides_{key}"] = aid[key]
+
+    # Partie 4 — Chi² / Fisher, permutation, bootstrap, tests par strate ; décision pour chaque α
+    res = prepare_test(df, annee, col_survie, ctx["dfa"], ctx["aid_index"], n_resamples=ctx["n_resamples"],
+                       events=ctx["events"])
+    report["test"] = {"etape": res["etape"], "niveau": res["niveau"], "methode": res.get("methode")}
+    if res["etape"] == "ok":
+        if res.get("scipy"):
+            report["test"].update({k: v for k, v in res["test"].items() if k != "attendus"})
+        report["test"]["permutation"] = res["permutation"]
+        tables["test_contingence"] = res["tab"]
+        tables["test_taux_par_groupe"] = res["ic_taux"]
+        report["test"]["cmh"] = res["stratifie"]["cmh"]
+        tables["test_strates"] = res["stratifie"]["strates"]
+    tables["test_decisions"] = decisions(res, ctx["alphas"])
+
+    # Partie 4 bis — effet des aides (PSM / AIPW)
+    if ctx["aid_index"] is not None and ctx["n_boot"]:
+        effet = aid_effect(df, annee, col_survie, ctx["aid_index"], ctx["events"], n_boot=ctx["n_boot"])
+        if effet:
+            kpi.update({"nb_apparies": effet["n_apparies"], "caliper": effet["caliper"]})
+            tables["effet_estimations"] = effet["resultats"]
+            tables["effet_equilibre"] = effet["equilibre"]
+
+    report["duree_s"] = round(time.perf_counter() - t0, 3)
+    return report
+
+
+# --------------------------------------------
+# Écriture (processus principal, au fil de l'eau)
+# --------------------------------------------
+def _frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Table exportable : index nommé remis en colonne, noms de colonnes et catégories en texte."""
+    if not isinstance(df.index, pd.RangeIndex) or df.index.name is not None:
+        df = df.reset_index()
+    df = df.rename(columns=str)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) or df[col].dtype == object:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def _jsonable(obj):
+    if isinstance(obj, pd.DataFrame):
+        return _jsonable(_frame(obj).astype(object).where(lambda t: t.notna(), None).to_dict(orient="records"))
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not math.isfinite(obj):
+        return None
+    return obj
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)  # un lecteur voit l'ancien fichier ou le nouveau, jamais un fichier partiel
+
+
+def _html_page(title: str, kpi: dict, sections: dict) -> str:
+    parts = [f"<!DOCTYPE html><html lang='fr'><head><meta charset='utf-8'><title>{html.escape(title)}</title>",
+             "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:1.5em}"
+             "td,th{border:1px solid #ccc;padding:.2em .6em;text-align:right}</style></head><body>",
+             f"<h1>{html.escape(title)}</h1>"]
+    if kpi:
+        parts.append(pd.DataFrame({"indicateur": list(kpi), "valeur": list(kpi.values())})
+                     .to_html(index=False, na_rep="", float_format=lambda x: f"{x:,.4g}"))
+    for name, table in sections.items():
+        parts.append(f"<h2>{html.escape(name)}</h2>")
+        parts.append(table if isinstance(table, str) else
+                     _frame(table).to_html(index=False, na_rep="", float_format=lambda x: f"{x:,.4g}"))
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def _task_name(annee: int, horizon: int) -> str:
+    return f"cohorte_{annee}_{horizon}m"
+
+
+def write_report(report: dict, out: str) -> None:
+    """Rapport d'une tâche : JSON, tables Parquet (annee=/horizon=) et page HTML."""
+    name = _task_name(report["annee"], report["horizon"])
+    for table_name, table in report["tables"].items():
+        part = os.path.join(out, "parquet", table_name, f"annee={report['annee']}", f"horizon={report['horizon']}")
+        os.makedirs(part, exist_ok=True)
+        _frame(table).to_parquet(os.path.join(part, "part-0.parquet"), index=False)
+    title = f"Cohorte {report['annee']} — survie à {report['horizon']} mois"
+    test = {k: v for k, v in report["test"].items() if not isinstance(v, dict)}
+    _write_atomic(os.path.join(out, "html", f"{name}.html"),
+                  _html_page(title, {**report["kpi"], **{f"test_{k}": v for k, v in test.items()}}, report["tables"]))
+    # JSON en dernier : sa présence marque la tâche comme terminée (reprise)
+    _write_atomic(os.path.join(out, "json", f"{name}.json"), json.dumps(_jsonable(report), ensure_ascii=False, indent=1))
+
+
+def write_index(out: str) -> None:
+    """index.html : une ligne par rapport de cohorte déjà écrit."""
+    rows = []
+    folder = os.path.join(out, "json")
+    for fname in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, fname), encoding="utf-8") as f:
+            report = json.load(f)
+        decision = {f"rejet_h0_alpha_{d['alpha']}": d["rejet_h0"] for d in report["tables"].get("test_decisions", [])}
+        page = f"html/{fname[:-len('.json')]}.html"
+        rows.append({"rapport": f"<a href='{page}'>{html.escape(fname[:-len('.json')])}</a>",
+                     "annee": report["annee"], "horizon": report["horizon"],
+                     "taux_survie_%": report["kpi"].get("taux_survie"),
+                     "p_value": report["test"].get("p_value"), **decision})
+    table = pd.DataFrame(rows).to_html(index=False, escape=False, na_rep="", float_format=lambda x: f"{x:,.4g}")
+    _write_atomic(os.path.join(out, "index.html"),
+                  _html_page("Rapport survie & aides France Relance",
+                             {}, {"Partie 1 — fermetures": "<a href='partie1.html'>partie1.html</a>",
+                                  "Cohortes": table}))
+
+
+def _parameters(alphas, n_resamples: int, n_boot: int, exact: bool, laureats: str, aides: str) -> dict:
+    """Paramètres dont dépend un rapport de cohorte (avec l'empreinte de la source)."""
+    return _jsonable({"alphas": sorted(float(a) for a in alphas), "replications": n_resamples,
+                      "bootstrap_effet": n_boot, "comptage_exact": exact,
+                      "laureats": source_fingerprint(laureats) if laureats else None,
+                      "aides": source_fingerprint(aides) if aides else None})
+
+
+def _is_done(out: str, annee: int, horizon: int, empreinte: str, parametres: dict) -> bool:
+    # À jour : même source ET mêmes paramètres (α, réplications, bootstrap, fichiers d'aides)
+    path = os.path.join(out, "json", f"{_task_name(annee, horizon)}.json")
+    if not os.path.exists(path):
+        return False
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    return report.get("empreinte") == empreinte and report.get("parametres") == parametres
+
+
+# --------------------------------------------
+# Orchestration
+# --------------------------------------------
+def run(source: str, out: str, annees=None, horizons=None, alphas=ALPHAS, workers: int = 1,
+        exact: bool = False, n_resamples: int = DEFAULT_RESAMPLES, n_boot: int = DEFAULT_BOOTSTRAP,
+        laureats: str = None, aides: str = AIDES_PATH, force: bool = False, log=print) -> dict:
+    """Écrit les rapports de toutes les (année, horizon) demandées ; retourne un résumé."""
+    t0 = time.perf_counter()
+    empreinte = source_fingerprint(source)
+    for sub in ("json", "html", "parquet"):
+        os.makedirs(os.path.join(out, sub), exist_ok=True)
+
+    # Une seule préparation : table partagée matérialisée, cube à jour, index des lauréats
+    open_shared_table(source, empreinte)
+    cube = load_or_build_cube(source, exact=exact)
+    aid_index = load_aid_index(laureats) if laureats else None
+    aides = aides if aides and os.path.exists(aides) else None
+
+    # Partie 1 (toutes années) et Partie 3 par catégorie : une fois
+    fermetures = closures(cube)
+    partie1 = {"empreinte": empreinte, "approche": is_approximate(cube), "kpi": fermetures["kpi"],
+               "tables": {f"fermetures_{k}": v for k, v in fermetures.items() if k != "kpi"}}
+    if aides:
+        dfa = read_aides_etat(aides)
+        aides_cat = aid_by_category(dfa)
+        if aides_cat:
+            partie1["kpi"].update({f"aides_{k}": v for k, v in aides_cat["kpi"].items()})
+            partie1["tables"]["aides_par_categorie"] = aides_cat["par_categorie"]
+        for key, value in aid_measures(dfa).items():
+            if isinstance(value, pd.DataFrame):
+                partie1["tables"][f"aides_mesures_{key}"] = value
+            else:
+                partie1["kpi"][f"aides_mesures_{key}"] = value
+    for table_name, table in partie1["tables"].items():
+        _frame(table).to_parquet(os.path.join(out, "parquet", f"{table_name}.parquet"), index=False)
+    _write_atomic(os.path.join(out, "partie1.json"), json.dumps(_jsonable(partie1), ensure_ascii=False, indent=1))
+    _write_atomic(os.path.join(out, "partie1.html"),
+                  _html_page("Partie 1 — fermetures et aides par catégorie", partie1["kpi"], partie1["tables"]))
+
+    cohortes = view(cube, "cohorte")
+    annees = list(annees) if annees else sorted(cohortes["annee"].dropna().astype(int).unique().tolist())
+    horizons = list(horizons) if horizons else sorted(cohortes["horizon"].dropna().astype(int).unique().tolist())
+    tasks = [(int(a), int(h)) for a in annees for h in horizons]
+    parametres = _parameters(alphas, n_resamples, n_boot, exact, laureats, aides)
+    todo = [t for t in tasks if force or not _is_done(out, *t, empreinte, parametres)]
+    log(f"{len(tasks)} rapports de cohorte ({len(tasks) - len(todo)} déjà à jour), {workers} processus")
+
+    options = {"source": source, "empreinte": empreinte, "exact": exact, "aides": aides, "aid_index": aid_index,
+               "alphas": tuple(alphas), "n_resamples": n_resamples, "n_boot": n_boot, "parametres": parametres}
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+            futures = {pool.submit(run_cohort, t): t for t in todo}
+            for future in as_completed(futures):
+                report = future.result()
+                write_report(report, out)
+                write_index(out)
+                log(f"  {_task_name(report['annee'], report['horizon'])} ({report['duree_s']} s)")
+    else:
+        _init_worker(options)
+        for t in todo:
+            report = run_cohort(t)
+            write_report(report, out)
+            write_index(out)
+            log(f"  {_task_name(report['annee'], report['horizon'])} ({report['duree_s']} s)")
+    write_index(out)
+    return {"rapports": len(tasks), "calcules": len(todo), "duree_s": round(time.perf_counter() - t0, 2)}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Rapports Parties 1 à 4 sans Streamlit (JSON, Parquet, HTML).")
+    p.add_argument("--source", default=None, help="dataset (défaut : data_parquet, sinon data.csv)")
+    p.add_argument("--sortie", default="rapports", help="dossier des rapports")
+    p.add_argument("--annees", type=int, nargs="+", default=None, help="années de cohorte (défaut : toutes)")
+    p.add_argument("--horizons", type=int, nargs="+", default=None, help="horizons en mois (défaut : tous)")
+    p.add_argument("--alpha", type=float, nargs="+", default=list(ALPHAS), help="seuils de décision")
+    p.add_argument("--workers", type=int, default=1, help="processus parallèles (1 = série)")
+    p.add_argument("--exact", action="store_true", help="siren distincts exacts (Partie 1) plutôt qu'estimés")
+    p.add_argument("--replications", type=int, default=DEFAULT_RESAMPLES, help="permutations / bootstrap (Partie 4)")
+    p.add_argument("--bootstrap-effet", type=int, default=DEFAULT_BOOTSTRAP,
+                   help="réplications bootstrap PSM / AIPW (0 = pas d'estimation d'effet)")
+    p.add_argument("--laureats", default=None, help="fichier des lauréats (défaut : détecté)")
+    p.add_argument("--force", action="store_true", help="recalculer les rapports déjà écrits")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    stats = run(args.source or resolve_source(), args.sortie, args.annees, args.horizons, args.alpha,
+                args.workers, args.exact, args.replications, args.bootstrap_effet,
+                args.laureats or resolve_laureates(), force=args.force)
+    print(f"{stats['calcules']} / {stats['rapports']} rapports calculés en {stats['duree_s']} s → {args.sortie}")
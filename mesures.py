@@ -0,0 +1,216 @@
+# ======================================================
+# DÉCOUPAGE DES CHAMPS MESURE / MESURE_LIGHT (Aho–Corasick)
+# ======================================================
+#
+# Dans df_participationEtat.csv, MESURE et MESURE_LIGHT concatènent plusieurs
+# noms de mesures sans séparateur (« …liés au COVID-19Fonds de soutien… »).
+# Avec un dictionnaire des mesures, un automate d'Aho–Corasick repère toutes
+# les occurrences en UNE passe sur le texte, quel que soit le nombre de
+# mesures ; on retient ensuite les occurrences les plus à gauche et les plus
+# longues, sans chevauchement (« Nucléaire - Compétences » plutôt que
+# « Nucléaire »). Le texte non couvert est signalé (mesure absente du
+# dictionnaire).
+#
+# Les cellules se répètent beaucoup (export par projet) : chaque valeur
+# distincte n'est découpée qu'une fois, puis le résultat est propagé.
+#
+# Dictionnaire : MESURES (mesures du fichier fourni), complétable par un CSV
+# `mesures.csv` (colonnes mesure, mesure_light).
+
+import logging
+import os
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DICTIONARY_PATH = "mesures.csv"
+
+# Nom complet (MESURE) → libellé court (MESURE_LIGHT)
+MESURES = {
+    "AMI Capacity, portant sur des capacités de production de produits thérapeutiques liés au COVID-19":
+        "Santé - Capacités Covid",
+    "Fonds de soutien aux investissements du secteur nucléaire": "Nucléaire",
+    "Renforcement des compétences": "Nucléaire - Compétences",
+    "Soutien à la chaleur bas carbone": "Soutien à la chaleur bas carbone",
+    "Efficacité énergétique et évolution des procédés dans l’industrie": "Efficacité énergétique",
+    "(Re)localisation dans les secteurs critiques": "Relocalisation",
+    "Modernisation de la filière aéronautique": "Aéronautique",
+    "Modernisation de la filière automobile": "Automobile",
+    "Soutien à l’investissement industriel dans les territoires": "Projets territoriaux",
+}
+
+# Séparateurs tolérés entre deux mesures (non signalés comme texte inconnu)
+_SEPARATORS = " ,;/|-\n\t"
+
+
+def _normalize(text: str) -> str:
+    """Apostrophes et espaces uniformisés (le dictionnaire et les cellules varient)."""
+    return " ".join(str(text).replace("’", "'").replace(" ", " ").split())
+
+
+def load_dictionary(path: str = DICTIONARY_PATH) -> dict:
+    """MESURES, complété par `path` (colonnes mesure, mesure_light) s'il existe."""
+    dictionary = dict(MESURES)
+    if path and os.path.exists(path):
+        extra = pd.read_csv(path, dtype=str).dropna(subset=["mesure"])
+        light = extra["mesure_light"] if "mesure_light" in extra.columns else extra["mesure"]
+        dictionary.update(zip(extra["mesure"].str.strip(), light.fillna(extra["mesure"]).str.strip()))
+    return dictionary
+
+
+def light_names(values, dictionary: dict = None) -> pd.Series:
+    """Libellé court des noms complets connus du dictionnaire (valeur d'origine sinon)."""
+    dictionary = dictionary or load_dictionary()
+    lookup = {_normalize(name): light for name, light in dictionary.items()}
+    values = pd.Series(values)
+    return values.map(lambda v: lookup.get(_normalize(v), v))
+
+
+# --------------------------------------------
+# Automate
+# --------------------------------------------
+@dataclass
+class Automaton:
+    """Trie des motifs + liens d'échec ; `outputs[état]` = motifs reconnus en fin d'état."""
+    patterns: list
+    goto: list = field(default_factory=lambda: [{}])
+    fail: list = field(default_factory=lambda: [0])
+    outputs: list = field(default_factory=lambda: [[]])
+
+
+def build_automaton(patterns) -> Automaton:
+    """Automate d'Aho–Corasick des `patterns` (normalisés)."""
+    auto = Automaton(patterns=[_normalize(p) for p in patterns])
+    for pid, pattern in enumerate(auto.patterns):
+        state = 0
+        for ch in pattern:
+            nxt = auto.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(auto.goto)
+                auto.goto[state][ch] = nxt
+                auto.goto.append({})
+                auto.fail.append(0)
+                auto.outputs.append([])
+            state = nxt
+        auto.outputs[state].append(pid)
+
+    # Liens d'échec en largeur : plus long suffixe propre qui est aussi un préfixe
+    queue = deque(auto.goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, nxt in auto.goto[state].items():
+            queue.append(nxt)
+            f = auto.fail[state]
+            while f and ch not in auto.goto[f]:
+                f = auto.fail[f]
+            auto.fail[nxt] = auto.goto[f].get(ch, 0)
+            auto.outputs[nxt] = auto.outputs[nxt] + auto.outputs[auto.fail[nxt]]
+    return auto
+
+
+def find_all(auto: Automaton, text: str) -> list:
+    """Toutes les occurrences (début, fin, motif) en une passe sur `text` (normalisé)."""
+    matches = []
+    state = 0
+    goto, fail, outputs, patterns = auto.goto, auto.fail, auto.outputs, auto.patterns
+    for i, ch in enumerate(text):
+        while state and ch not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(ch, 0)
+        for pid in outputs[state]:
+            matches.append((i + 1 - len(patterns[pid]), i + 1, pid))
+    return matches
+
+
+def tokenize(auto: Automaton, text: str):
+    """
+    Motifs de `text`, dans l'ordre, sans chevauchement (le plus à gauche puis
+    le plus long) ; retourne aussi le texte non reconnu.
+    """
+    text = _normalize(text)
+    tokens, residue, end = [], [], 0
+    for start, stop, pid in sorted(find_all(auto, text), key=lambda m: (m[0], m[0] - m[1])):
+        if start < end:
+            continue
+        residue.append(text[end:start])
+        tokens.append(pid)
+        end = stop
+    residue.append(text[end:])
+    return tokens, "".join(r.strip(_SEPARATORS) for r in residue)
+
+
+# --------------------------------------------
+# Éclatement d'une table d'aides
+# --------------------------------------------
+def explode_measures(df: pd.DataFrame, column: str = "mesure", light_column: str = "mesure_light",
+                     dictionary: dict = None) -> pd.DataFrame:
+    """
+    Une ligne par ligne source × mesure : `mesure` (nom complet), `mesure_light`,
+    `rang` (position dans la cellule) et `nb_mesures` (mesures de la cellule).
+    Découpe `column` (noms complets) ; à défaut, `light_column`.
+    """
+    dictionary = dictionary or load_dictionary()
+    full = list(dictionary)
+    lights = list(dict.fromkeys(dictionary.values()))
+    light_to_full = {}
+    for name, light in dictionary.items():
+        light_to_full.setdefault(light, name)
+
+    if column in df.columns:
+        auto, names = build_automaton(full), full
+    elif light_column in df.columns:
+        auto, names = build_automaton(lights), [light_to_full[lt] for lt in lights]
+        column = light_column
+    else:
+        raise ValueError(f"Colonne '{column}' ou '{light_column}' absente de la table d'aides.")
+
+    # Découpage de chaque valeur distincte, une seule fois
+    codes, uniques = pd.factorize(df[column], use_na_sentinel=True)
+    tokens = []
+    for value in uniques:
+        found, residue = tokenize(auto, value)
+        if residue:
+            logger.warning("Texte non reconnu comme mesure (dictionnaire incomplet ?) : %r", residue[:120])
+        tokens.append(found)
+    counts = np.array([len(t) for t in tokens] + [0], dtype=np.int64)  # dernier : cellules vides
+    n = counts[codes]
+
+    rows = np.repeat(np.arange(len(df)), n)
+    flat = np.concatenate([np.asarray(t, dtype=np.int64) for t in tokens] + [np.zeros(0, dtype=np.int64)])
+    offsets = np.concatenate([[0], np.cumsum(counts[:-1])])
+    # Position de chaque jeton dans sa cellule, puis jeton correspondant
+    rang = np.arange(len(rows)) - np.repeat(np.cumsum(n) - n, n)
+    pid = flat[offsets[codes[rows]] + rang] if len(rows) else flat
+
+    out = df.drop(columns=[c for c in (column, light_column, "mesure", "mesure_light") if c in df.columns])
+    out = out.iloc[rows].reset_index(drop=True)
+    mesure = np.asarray(names, dtype=object)[pid] if len(names) else np.array([], dtype=object)
+    out["mesure"] = mesure
+    out["mesure_light"] = [dictionary[m] for m in mesure]
+    out["rang"] = rang
+    out["nb_mesures"] = n[rows]
+    return out
+
+
+def measure_breakdown(exploded: pd.DataFrame, group: str = "categorieEntreprise",
+                      amount: str = "montant_participation_etat") -> dict:
+    """
+    Ventilation par mesure d'une table éclatée :
+    - `presence` : lignes source par groupe × mesure ;
+    - `montants` : montant par mesure des lignes à mesure UNIQUE (seul cas où le
+      montant est attribuable), avec `part_attribuable` du montant total.
+    """
+    out = {}
+    if group in exploded.columns:
+        out["presence"] = pd.crosstab(exploded[group], exploded["mesure_light"])
+    if amount in exploded.columns:
+        single = exploded["nb_mesures"] == 1
+        out["montants"] = (exploded.loc[single].groupby("mesure_light")[amount].sum()
+                           .sort_values(ascending=False).reset_index(name="participation_etat"))
+        total = exploded.loc[exploded["rang"] == 0, amount].sum()
+        out["part_attribuable"] = float(exploded.loc[single, amount].sum() / total) if total else 0.0
+    return out
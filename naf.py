@@ -0,0 +1,119 @@
+# ======================================================
+# NOMENCLATURE D'ACTIVITÉS (NAF) : NIVEAUX ET AGRÉGATION ASCENDANTE
+# ======================================================
+#
+# Le code APE d'une unité légale se lit dans sa nomenclature
+# (nomenclatureActivitePrincipaleUniteLegale) ; Sirene mêle plusieurs
+# révisions, que l'on garde côte à côte sans table de passage :
+#   - NAF rév. 2 (NAFRev2, depuis 2008) : « 62.01Z » = section J,
+#     division 62, groupe 62.0, classe 62.01 (sous-classe 62.01Z) ;
+#   - NAF rév. 1 (NAFRev1, 2003) et NAF 1993 (NAF1993) : « 74.1A » = section K,
+#     division 74, groupe 74.1, classe 74.1A.
+# Nomenclature absente : déduite du format du code. Les autres nomenclatures
+# (NAP…) et les codes illisibles n'ont pas de niveau NAF.
+#
+# Le cube (cube.py) ne stocke que le niveau le plus fin (nomenclature × classe) ;
+# section, division et groupe en sont déduits par sommation (rollup) : les
+# comptages sont additifs, chaque ligne n'ayant qu'un code.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+NAF_COLUMN = "activitePrincipaleUniteLegale"
+NOMENCLATURE_COLUMN = "nomenclatureActivitePrincipaleUniteLegale"
+
+LEVELS = ["section", "division", "groupe", "classe"]
+NOMENCLATURES = {"NAFRev2": "NAF rév. 2 (2008)", "NAFRev1": "NAF rév. 1 (2003)", "NAF1993": "NAF 1993"}
+
+# Première division de chaque section
+_SECTIONS = {"A": 1, "B": 5, "C": 10, "D": 35, "E": 36, "F": 41, "G": 45, "H": 49, "I": 55, "J": 58, "K": 64,
+             "L": 68, "M": 69, "N": 77, "O": 84, "P": 85, "Q": 86, "R": 90, "S": 94, "T": 97, "U": 99}
+_SECTIONS_REV1 = {"A": 1, "B": 5, "C": 10, "D": 15, "E": 40, "F": 45, "G": 50, "H": 55, "I": 60, "J": 65,
+                  "K": 70, "L": 75, "M": 80, "N": 85, "O": 90, "P": 95, "Q": 99}
+
+# Format de la classe : 4 chiffres (rév. 2, lettre de sous-classe ignorée), 3 chiffres + lettre (rév. 1)
+_FORMATS = {"NAFRev2": re.compile(r"^(\d{2})(\d)(\d)[A-Z]?$"), "NAFRev1": re.compile(r"^(\d{2})(\d)([A-Z])$")}
+_FORMATS["NAF1993"] = _FORMATS["NAFRev1"]
+_SECTION_TABLES = {"NAFRev2": _SECTIONS, "NAFRev1": _SECTIONS_REV1, "NAF1993": _SECTIONS_REV1}
+
+
+def _section(division: int, sections: dict):
+    pos = np.searchsorted(np.array(list(sections.values())), division, side="right") - 1
+    return list(sections)[pos] if pos >= 0 else None
+
+
+def parse(code, nomenclature=None):
+    """(nomenclature, section, division, groupe, classe) d'un code APE ; None si illisible."""
+    if not isinstance(code, str):
+        return None
+    clean = code.strip().upper().replace(".", "")
+    if not isinstance(nomenclature, str) or not nomenclature.strip():
+        nomenclature = "NAFRev2" if _FORMATS["NAFRev2"].match(clean) else "NAFRev1"
+    nomenclature = nomenclature.strip()
+    match = _FORMATS[nomenclature].match(clean) if nomenclature in _FORMATS else None
+    if match is None:
+        return None
+    division, groupe, fin = match.groups()
+    section = _section(int(division), _SECTION_TABLES[nomenclature])
+    return nomenclature, section, division, f"{division}.{groupe}", f"{division}.{groupe}{fin}"
+
+
+def classify(codes, nomenclatures=None) -> pd.DataFrame:
+    """
+    Nomenclature et classe de chaque code APE (colonnes nomenclature, naf ; NaN
+    si illisible), calculées sur les seuls couples (code, nomenclature) distincts.
+    """
+    codes = pd.Series(codes)
+    nomenclatures = (pd.Series(nomenclatures, index=codes.index) if nomenclatures is not None
+                     else pd.Series(None, index=codes.index, dtype=object))
+    idx_code, u_code = pd.factorize(codes)
+    idx_nom, u_nom = pd.factorize(nomenclatures)
+    pairs, inverse = np.unique(np.stack([idx_code, idx_nom]), axis=1, return_inverse=True)
+    nom, classe = [], []
+    for c, n in pairs.T:
+        parsed = parse(u_code[c] if c >= 0 else None, u_nom[n] if n >= 0 else None)
+        nom.append(parsed[0] if parsed else None)
+        classe.append(parsed[4] if parsed else None)
+    inverse = inverse.ravel()
+    return pd.DataFrame({"nomenclature": np.array(nom, dtype=object)[inverse],
+                         "naf": np.array(classe, dtype=object)[inverse]}, index=codes.index)
+
+
+def naf_section(codes, nomenclatures=None) -> pd.Series:
+    """Section NAF d'après la division du code APE (rév. 2 par défaut) ; NaN si le code est illisible."""
+    codes = pd.Series(codes)
+    if nomenclatures is not None:
+        return hierarchy(classify(codes, nomenclatures))["section"].set_axis(codes.index).rename(codes.name)
+    idx, uniques = pd.factorize(codes)
+    division = pd.to_numeric(pd.Series(uniques, dtype="string").str.strip().str[:2], errors="coerce").to_numpy()
+    pos = np.searchsorted(np.array(list(_SECTIONS.values())), np.nan_to_num(division), side="right") - 1
+    letters = np.where(np.isfinite(division) & (pos >= 0), np.array(list(_SECTIONS))[np.maximum(pos, 0)], None)
+    out = np.append(letters, None)[np.where(idx >= 0, idx, len(letters))]
+    return pd.Series(out, index=codes.index, name=codes.name, dtype=object)
+
+
+def hierarchy(cells: pd.DataFrame) -> pd.DataFrame:
+    """Ajoute section, division et groupe à des cellules (nomenclature, naf = classe)."""
+    keys = cells[["nomenclature", "naf"]].drop_duplicates().dropna()
+    levels = [parse(code, nom) or (nom, None, None, None, code) for nom, code in zip(keys["nomenclature"], keys["naf"])]
+    keys = pd.DataFrame(levels, columns=["nomenclature"] + LEVELS, dtype=object).rename(columns={"classe": "naf"})
+    out = cells.drop(columns=[c for c in LEVELS[:-1] if c in cells.columns])
+    out = out.merge(keys, on=["nomenclature", "naf"], how="left")
+    out["classe"] = out["naf"]
+    return out
+
+
+def rollup(cells: pd.DataFrame, level: str, parents: dict = None, measures=None) -> pd.DataFrame:
+    """
+    Sommes des mesures des cellules les plus fines (nomenclature × classe) au
+    niveau `level`, restreintes aux `parents` ({niveau: code}, ex. {"section": "J"}).
+    """
+    measures = measures or [c for c in cells.columns if c.startswith("nb_")]
+    out = hierarchy(cells)
+    for parent, code in (parents or {}).items():
+        out = out.loc[out[parent] == code]
+    return (out.dropna(subset=[level])
+               .groupby(["nomenclature", level], sort=True)[measures].sum()
+               .reset_index())
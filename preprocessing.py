@@ -0,0 +1,538 @@
+# ======================================================
+# PRÉTRAITEMENT EN FLUX (remplace Preprocessing.ipynb)
+# ======================================================
+#
+# Reproduit le notebook (concat stock + historique, dédoublonnage, année de
+# début de période, une ligne par siren × année) sans jamais charger les
+# fichiers Sirene entiers ; l'état d'une ligne siren × année est celui en
+# vigueur au 31/12 de l'année (index as-of, asof.py), et non celui d'une
+# ligne quelconque de l'année :
+#   1. découpage : les fichiers sont lus par lots Arrow (row groups) ; chaque
+#      lot est ventilé en N partitions selon `siren % N` et écrit sur disque ;
+#   2. traitement : chaque partition (≈ 1/N des données) est traitée seule.
+#      Toutes les lignes d'un siren tombent dans la même partition, donc le
+#      dédoublonnage par partition est exact.
+# La mémoire est bornée par la taille d'un lot et d'une partition.
+#
+# Mode parallèle (--workers K) : le découpage est réparti par plages de row
+# groups, le traitement par partition, sur un pool de K processus. Chaque
+# plage écrit ses propres fichiers intermédiaires, relus dans l'ordre des
+# row groups : le résultat est identique au mode série (K = 1). Mémoire
+# bornée par K partitions simultanées.
+#
+# Mode incrémental (--incremental) : à chaque publication mensuelle, seuls
+# les siren dont la ligne du stock a changé (dateDebut ou contenu, d'après
+# l'instantané `_snapshot/` écrit à la construction précédente) sont
+# retraités ; leurs lignes sont remplacées dans les fichiers de partition
+# concernés et le cube d'agrégats (--cube) est corrigé par différence.
+#
+# Géographie (--etablissements StockEtablissement_utf8.parquet, optionnel) :
+# les établissements (siren, nic, commune) sont ventilés dans les mêmes
+# partitions `siren % N` que le stock, puis joints sur (siren, nic du siège)
+# partition par partition (geo.py) : commune et département du siège, le
+# département devenant une colonne triée dans chaque fichier d'année (filtre
+# poussé au lecteur par row group, voir data_loader.py).
+#
+# Sortie : dataset Parquet partitionné par `annee` (lu par data_loader.py),
+# avec `anciennete` (année − année de création) et `Survie_12m` … `Survie_48m`
+# (moteur vectorisé de survival.py). L'historique trié (siren, dateDebut, état,
+# catégorie, tranche, année de création) est aussi écrit dans `_historique/`
+# pour dériver d'autres horizons et les cohortes « as-of » à la demande.
+#
+#     python preprocessing.py --stock StockUniteLegale_utf8.parquet \
+#         --historique StockUniteLegaleHistorique_utf8.parquet --sortie data_parquet \
+#         [--etablissements StockEtablissement_utf8.parquet]
+
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from asof import ATTRIBUTES, CREATION, as_of, build_asof, creation_years
+from cube import patch_cube, read_cube_fingerprint, source_fingerprint, write_cube
+from data_loader import PARTITIONING, geo_write_options
+from geo import COMMUNE, DEPARTEMENT, ETAB_COLUMNS, departement_of, head_office_communes
+from schema import apply_schema
+from survival import HISTORY_DIR, SURVIVAL_COLUMNS, reference_dates, survival_table
+
+STOCK_COLUMNS = ["siren", "dateCreationUniteLegale", "trancheEffectifsUniteLegale", "categorieEntreprise",
+                 "dateDebut", "etatAdministratifUniteLegale", "nomUniteLegale", "activitePrincipaleUniteLegale",
+                 "categorieJuridiqueUniteLegale", "nomenclatureActivitePrincipaleUniteLegale", "nicSiegeUniteLegale"]
+HISTORY_COLUMNS = ["siren", "dateDebut", "etatAdministratifUniteLegale"]
+
+# Attributs de l'unité légale (stock courant), propagés à toutes ses années
+ATTRIBUTE_COLUMNS = ["dateCreationUniteLegale", "trancheEffectifsUniteLegale", "categorieEntreprise",
+                     "activitePrincipaleUniteLegale", "categorieJuridiqueUniteLegale",
+                     "nomenclatureActivitePrincipaleUniteLegale", "nicSiegeUniteLegale"]
+
+OUTPUT_COLUMNS = ["siren", "annee", "etatAdministratifUniteLegale", "categorieEntreprise",
+                  "trancheEffectifsUniteLegale", "anciennete", *SURVIVAL_COLUMNS,
+                  "activitePrincipaleUniteLegale", "nomenclatureActivitePrincipaleUniteLegale",
+                  "categorieJuridiqueUniteLegale", "nicSiegeUniteLegale"]
+# Colonnes ajoutées avec la géographie
+GEO_COLUMNS = [COMMUNE, DEPARTEMENT]
+
+DEFAULT_PARTITIONS = 64
+DEFAULT_BATCH_SIZE = 500_000
+
+# Instantané du stock traité (ignoré par les lecteurs Arrow grâce au préfixe « _ »)
+SNAPSHOT_DIR = "_snapshot"
+
+
+def peak_rss_mb() -> float:
+    """Pic de mémoire résidente (Mo) du processus ou du plus gros processus fils."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / 1024 if sys.platform != "darwin" else peak / 1024 ** 2
+
+
+# --------------------------------------------
+# 1) Découpage en partitions par siren
+# --------------------------------------------
+def _spill_schema(columns) -> pa.Schema:
+    return pa.schema([("siren", pa.int64())] + [(c, pa.string()) for c in columns if c != "siren"])
+
+
+def _prepare_batch(batch: pa.RecordBatch, schema: pa.Schema, sirens=None) -> pa.Table:
+    """
+    Typage stable des lots + suppression des lignes sans siren / état / date de début
+    (établissements : sans nic) et, si `sirens` est fourni, des siren hors de cette liste.
+    """
+    table = pa.Table.from_batches([batch])
+    table = table.select(schema.names).cast(schema)
+    valid = pc.is_valid(table["siren"])
+    for col in ("dateDebut", "etatAdministratifUniteLegale", "nic"):
+        if col in schema.names:
+            valid = pc.and_(valid, pc.is_valid(table[col]))
+    if sirens is not None:
+        valid = pc.and_(valid, pc.is_in(table["siren"], value_set=sirens))
+    return table.filter(valid)
+
+
+def split_to_buckets(path: str, columns, kind: str, workdir: str, n_partitions: int,
+                     batch_size: int = DEFAULT_BATCH_SIZE, row_groups=None, part: int = 0,
+                     sirens=None) -> int:
+    """
+    Lit `path` (ou seulement ses `row_groups`) par lots et ventile chaque ligne dans
+    `workdir/<kind>-<partition>-<part>.parquet` selon `siren % n_partitions`
+    (ordre des lignes conservé). Retourne le nombre de lignes lues.
+    `sirens` (pa.Array int64) restreint la ventilation à ces siren.
+    """
+    schema = _spill_schema(columns)
+    writers = {}
+    n_rows = 0
+    try:
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=columns, row_groups=row_groups):
+            n_rows += batch.num_rows
+            table = _prepare_batch(batch, schema, sirens)
+            bucket = np.asarray(table["siren"]) % n_partitions
+            order = np.argsort(bucket, kind="stable")
+            counts = np.bincount(bucket, minlength=n_partitions)
+            table = table.take(order)
+            offset = 0
+            for b in np.flatnonzero(counts):
+                if b not in writers:
+                    writers[b] = pq.ParquetWriter(os.path.join(workdir, f"{kind}-{b:04d}-{part:04d}.parquet"), schema)
+                writers[b].write_table(table.slice(offset, counts[b]))
+                offset += counts[b]
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return n_rows
+
+
+# --------------------------------------------
+# 2) Traitement d'une partition
+# --------------------------------------------
+def process_bucket(stock: pd.DataFrame, hist: pd.DataFrame):
+    """
+    Étapes du notebook sur une partition : une ligne par siren × année, avec l'état
+    en vigueur au 31/12 de l'année (index as-of) plutôt qu'une ligne quelconque.
+    Retourne aussi l'historique dédoublonné (siren, dateDebut, état, attributs) de la partition.
+    """
+    df = pd.concat([stock, hist], ignore_index=True)
+
+    # Suppression des lignes strictement identiques
+    df = df.drop_duplicates()
+
+    # Année de début de période
+    df["dateDebut"] = pd.to_datetime(df["dateDebut"], errors="coerce")
+    df = df.dropna(subset=["dateDebut"])
+    # Tri stable : à date égale, la ligne du stock l'emporte (priorité au stock, comme dans le notebook)
+    df["_stock"] = df.index < len(stock)
+    events = (df[["siren", "dateDebut", "etatAdministratifUniteLegale", "_stock"]]
+                .sort_values(["siren", "dateDebut", "_stock"], kind="stable", ignore_index=True)
+                .drop(columns="_stock"))
+
+    # Attributs du stock courant (non historisés par l'INSEE), reportés sur toutes les périodes
+    geo = [COMMUNE] if COMMUNE in stock.columns else []
+    attrs = stock.drop_duplicates(subset=["siren"])[["siren"] + ATTRIBUTE_COLUMNS + geo]
+    events = events.merge(attrs[["siren", *ATTRIBUTES, "dateCreationUniteLegale"]], on="siren", how="left")
+    events[CREATION] = creation_years(events.pop("dateCreationUniteLegale"))
+    index = build_asof(events)
+
+    # Une ligne par siren et par année de début de période ; état en vigueur au 31/12 de l'année
+    df = events[["siren"]].assign(annee=events["dateDebut"].dt.year).drop_duplicates(ignore_index=True)
+    etat = as_of(index, df["siren"], reference_dates(df["annee"], 0))["etatAdministratifUniteLegale"]
+    df["etatAdministratifUniteLegale"] = etat.to_numpy()
+    df = df.merge(attrs, on="siren", how="left")
+
+    creation = pd.to_datetime(df["dateCreationUniteLegale"], errors="coerce").dt.year
+    df["anciennete"] = (df["annee"] - creation).where(lambda a: a >= 0)
+    # Tous les horizons en une passe sur l'historique trié
+    flags = survival_table(index.events, df["siren"], df["annee"])
+    df[SURVIVAL_COLUMNS] = flags.to_numpy()
+    if geo:
+        df[DEPARTEMENT] = departement_of(df[COMMUNE])
+    return df[OUTPUT_COLUMNS + (GEO_COLUMNS if geo else [])].sort_values(["annee", "siren"], ignore_index=True), events
+
+
+def _read_spill(workdir: str, kind: str, bucket: int, columns) -> pd.DataFrame:
+    """Fichiers intermédiaires d'une partition, dans l'ordre des plages de row groups."""
+    paths = sorted(glob.glob(os.path.join(workdir, f"{kind}-{bucket:04d}-*.parquet")))
+    if not paths:
+        return pd.DataFrame({c: pd.Series(dtype="int64" if c == "siren" else "str") for c in columns})
+    return pa.concat_tables([pq.read_table(p) for p in paths]).to_pandas()
+
+
+def write_bucket(df: pd.DataFrame, out: str, bucket: int) -> None:
+    """Écrit une partition traitée dans le dataset partitionné par `annee` (triée par département si géographie)."""
+    df, options = geo_write_options(apply_schema(df))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table, out, format="parquet", partitioning=PARTITIONING,
+        basename_template=f"part-{bucket:04d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore", **options,
+    )
+
+
+def _history_path(out: str, bucket: int) -> str:
+    return os.path.join(out, HISTORY_DIR, f"part-{bucket:04d}.parquet")
+
+
+def write_history(events: pd.DataFrame, out: str, bucket: int) -> None:
+    """Historique trié d'une partition, attributs compris (lu par asof.load_asof / survival.load_history)."""
+    columns = {
+        "siren": pa.array(events["siren"].to_numpy(dtype=np.uint32)),
+        "dateDebut": pa.array(events["dateDebut"].to_numpy().astype("datetime64[D]")),
+        "etatAdministratifUniteLegale": pa.array(events["etatAdministratifUniteLegale"].astype(str)
+                                                 .to_numpy()).dictionary_encode(),
+    }
+    for col in ATTRIBUTES:
+        if col in events.columns:
+            columns[col] = pa.array(events[col].astype("string").to_numpy(na_value=None)).dictionary_encode()
+    if CREATION in events.columns:
+        columns[CREATION] = pa.array(creation_years(events[CREATION]))
+    os.makedirs(os.path.join(out, HISTORY_DIR), exist_ok=True)
+    pq.write_table(pa.table(columns), _history_path(out, bucket))
+
+
+def read_history(out: str, bucket: int) -> pd.DataFrame:
+    path = _history_path(out, bucket)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    events = pq.read_table(path).to_pandas()
+    events["dateDebut"] = pd.to_datetime(events["dateDebut"])
+    return events
+
+
+def read_stock(workdir: str, bucket: int, geo: bool = False) -> pd.DataFrame:
+    """Stock d'une partition ; avec `geo`, commune du siège jointe depuis les établissements de la partition."""
+    stock = _read_spill(workdir, "stock", bucket, STOCK_COLUMNS)
+    if geo:
+        stock[COMMUNE] = head_office_communes(stock, _read_spill(workdir, "etablissement", bucket, ETAB_COLUMNS))
+    return stock
+
+
+def run_bucket(workdir: str, out: str, bucket: int, geo: bool = False) -> int:
+    stock = read_stock(workdir, bucket, geo)
+    hist = _read_spill(workdir, "historique", bucket, HISTORY_COLUMNS)
+    write_snapshot(stock_snapshot(stock), out, bucket)
+    if stock.empty and hist.empty:
+        return 0
+    df, events = process_bucket(stock, hist)
+    write_bucket(df, out, bucket)
+    write_history(events, out, bucket)
+    return len(df)
+
+
+# --------------------------------------------
+# Instantané du stock (mode incrémental)
+# --------------------------------------------
+def stock_snapshot(stock: pd.DataFrame) -> pd.DataFrame:
+    """
+    Clé de comparaison d'une publication à l'autre : siren, dateDebut, empreinte
+    de la ligne (commune du siège comprise si elle est jointe).
+    """
+    columns = STOCK_COLUMNS + ([COMMUNE] if COMMUNE in stock.columns else [])
+    return pd.DataFrame({
+        "siren": stock["siren"].to_numpy(dtype=np.int64),
+        "dateDebut": stock["dateDebut"].to_numpy(),
+        "empreinte": pd.util.hash_pandas_object(stock[columns], index=False).to_numpy(),
+    })
+
+
+def _snapshot_path(out: str, bucket: int) -> str:
+    return os.path.join(out, SNAPSHOT_DIR, f"stock-{bucket:04d}.parquet")
+
+
+def write_snapshot(snapshot: pd.DataFrame, out: str, bucket: int) -> None:
+    os.makedirs(os.path.join(out, SNAPSHOT_DIR), exist_ok=True)
+    snapshot.to_parquet(_snapshot_path(out, bucket), index=False)
+
+
+def read_snapshot(out: str, bucket: int) -> pd.DataFrame:
+    path = _snapshot_path(out, bucket)
+    if not os.path.exists(path):
+        return pd.DataFrame({"siren": pd.Series(dtype="int64"), "dateDebut": pd.Series(dtype="str"),
+                             "empreinte": pd.Series(dtype="uint64")})
+    return pd.read_parquet(path)
+
+
+def changed_sirens(old: pd.DataFrame, new: pd.DataFrame) -> np.ndarray:
+    """Siren ajoutés, retirés ou dont la ligne du stock (dateDebut / contenu) a changé."""
+    both = old.merge(new, on="siren", how="outer", suffixes=("_old", "_new"), indicator=True)
+    changed = (
+        (both["_merge"] != "both")
+        | (both["dateDebut_old"] != both["dateDebut_new"])
+        | (both["empreinte_old"] != both["empreinte_new"])
+    )
+    return np.sort(both.loc[changed, "siren"].to_numpy(dtype=np.int64))
+
+
+def _bucket_files(out: str, bucket: int) -> list:
+    return sorted(glob.glob(os.path.join(out, "annee=*", f"part-{bucket:04d}-*.parquet")))
+
+
+def read_bucket(out: str, bucket: int) -> pd.DataFrame:
+    """Lignes déjà écrites d'une partition (toutes années)."""
+    files = _bucket_files(out, bucket)
+    if not files:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+    dataset = ds.dataset(files, format="parquet", partitioning=PARTITIONING, partition_base_dir=out)
+    df = apply_schema(dataset.to_table().to_pandas())
+    return df[OUTPUT_COLUMNS + [c for c in GEO_COLUMNS if c in df.columns]]
+
+
+def _write_meta(out: str, n_partitions: int, geo: bool = False) -> None:
+    with open(os.path.join(out, SNAPSHOT_DIR, "meta.json"), "w") as f:
+        json.dump({"partitions": n_partitions, "geographie": geo}, f)
+
+
+def _read_meta(out: str) -> dict:
+    with open(os.path.join(out, SNAPSHOT_DIR, "meta.json")) as f:
+        return json.load(f)
+
+
+# --------------------------------------------
+# Pipeline complet
+# --------------------------------------------
+def split_tasks(path: str, columns, kind: str, n_parts: int) -> list:
+    """Plages contiguës de row groups de `path` (une tâche de découpage par plage)."""
+    n_groups = pq.ParquetFile(path).num_row_groups
+    ranges = [r for r in np.array_split(np.arange(n_groups), max(1, min(n_parts, n_groups))) if len(r)]
+    return [(path, columns, kind, [int(g) for g in r], part) for part, r in enumerate(ranges)]
+
+
+def _split_task(task, workdir, n_partitions, batch_size) -> int:
+    path, columns, kind, row_groups, part = task
+    return split_to_buckets(path, columns, kind, workdir, n_partitions, batch_size, row_groups, part)
+
+
+def _staging_dir(out: str) -> str:
+    """
+    Dossier de construction voisin de `out` (même système de fichiers), aux droits
+    d'un dossier ordinaire : mkdtemp crée en 0700, qui rendrait le dataset publié
+    illisible par les autres utilisateurs (dashboard, rapports).
+    """
+    path = tempfile.mkdtemp(prefix=f".{os.path.basename(os.path.normpath(out))}-",
+                            dir=os.path.dirname(os.path.abspath(out)))
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(path, 0o777 & ~umask)
+    return path
+
+
+def _swap_dataset(built: str, out: str) -> None:
+    """Remplace `out` par le dataset construit dans `built` (renommages, même système de fichiers)."""
+    old = None
+    if os.path.exists(out):
+        old = f"{built}.ancien"
+        os.replace(out, old)
+    os.replace(built, out)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def run(stock: str, historique: str, out: str, n_partitions: int = DEFAULT_PARTITIONS,
+        batch_size: int = DEFAULT_BATCH_SIZE, tmpdir: str = None, workers: int = 1,
+        etablissements: str = None) -> dict:
+    t0 = time.perf_counter()
+    geo = etablissements is not None
+    tasks = (split_tasks(stock, STOCK_COLUMNS, "stock", workers)
+             + split_tasks(historique, HISTORY_COLUMNS, "historique", workers)
+             + (split_tasks(etablissements, ETAB_COLUMNS, "etablissement", workers) if geo else []))
+    # Construction dans un dossier voisin, mis en place seulement en cas de succès :
+    # un échec en cours de route laisse le dataset précédent intact
+    final, out = out, _staging_dir(out)
+    workdir = tempfile.mkdtemp(prefix="sirene-", dir=tmpdir)
+    buckets = range(n_partitions)
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                n_in = sum(pool.map(partial(_split_task, workdir=workdir, n_partitions=n_partitions,
+                                            batch_size=batch_size), tasks))
+                t_split = time.perf_counter() - t0
+                n_out = sum(pool.map(partial(run_bucket, workdir, out, geo=geo), buckets))
+        else:
+            n_in = sum(_split_task(t, workdir, n_partitions, batch_size) for t in tasks)
+            t_split = time.perf_counter() - t0
+            n_out = sum(run_bucket(workdir, out, b, geo) for b in buckets)
+        _write_meta(out, n_partitions, geo)
+        _swap_dataset(out, final)
+    except BaseException:
+        shutil.rmtree(out, ignore_errors=True)
+        raise
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    elapsed = time.perf_counter() - t0
+    return {
+        "workers": workers, "lignes_lues": n_in, "lignes_ecrites": n_out,
+        "duree_decoupage_s": round(t_split, 2), "duree_s": round(elapsed, 2),
+        "lignes_par_s": round(n_in / elapsed) if elapsed else None,
+        "pic_rss_mo": round(peak_rss_mb(), 1),
+    }
+
+
+def run_incremental(stock: str, historique: str, out: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                    tmpdir: str = None, cube: str = None, etablissements: str = None) -> dict:
+    """
+    Applique une nouvelle publication du stock à un dataset déjà construit :
+    seuls les siren modifiés sont retraités et remplacés (cube corrigé par différence).
+    Un dataset construit avec la géographie exige le StockEtablissement de la même
+    publication (un siège qui change de commune compte comme une modification).
+    """
+    t0 = time.perf_counter()
+    meta = _read_meta(out)
+    n_partitions, geo = meta["partitions"], meta.get("geographie", False)
+    if geo != (etablissements is not None):
+        raise ValueError("--etablissements doit être fourni si et seulement si le dataset a été construit avec "
+                         "(sinon reconstruire le dataset complet).")
+    cube_ok = cube is not None and read_cube_fingerprint(cube) == source_fingerprint(out)
+    workdir = tempfile.mkdtemp(prefix="sirene-inc-", dir=tmpdir)
+    removed, added = [], []
+    n_changed = 0
+    touched = 0
+    try:
+        # 1) Nouveau stock ventilé par partition, comparé à l'instantané
+        n_in = split_to_buckets(stock, STOCK_COLUMNS, "stock", workdir, n_partitions, batch_size)
+        if geo:
+            n_in += split_to_buckets(etablissements, ETAB_COLUMNS, "etablissement", workdir, n_partitions, batch_size)
+        changes = {}
+        for b in range(n_partitions):
+            new_stock = read_stock(workdir, b, geo)
+            snapshot = stock_snapshot(new_stock)
+            sirens = changed_sirens(read_snapshot(out, b), snapshot)
+            if len(sirens):
+                changes[b] = (sirens, snapshot)
+        if changes:
+            all_changed = pa.array(np.concatenate([c[0] for c in changes.values()]), type=pa.int64())
+            n_changed = len(all_changed)
+
+            # 2) Historique des seuls siren modifiés
+            n_in += split_to_buckets(historique, HISTORY_COLUMNS, "historique", workdir, n_partitions,
+                                     batch_size, sirens=all_changed)
+
+            # 3) Retraitement et remplacement dans les fichiers de partition concernés
+            for b, (sirens, snapshot) in changes.items():
+                new_stock = read_stock(workdir, b, geo)
+                new_stock = new_stock.loc[new_stock["siren"].isin(sirens)]
+                hist = _read_spill(workdir, "historique", b, HISTORY_COLUMNS)
+                if len(new_stock) or len(hist):
+                    fresh, events = process_bucket(new_stock, hist)
+                    fresh = apply_schema(fresh)
+                else:
+                    fresh = pd.DataFrame(columns=OUTPUT_COLUMNS + (GEO_COLUMNS if geo else []))
+                    events = pd.DataFrame(columns=HISTORY_COLUMNS)
+                old = read_bucket(out, b)
+                stale = old["siren"].isin(sirens)
+                removed.append(old.loc[stale])
+                added.append(fresh)
+                merged = pd.concat([old.loc[~stale], fresh], ignore_index=True)
+                for path in _bucket_files(out, b):
+                    os.remove(path)
+                if len(merged):
+                    write_bucket(merged.sort_values(["annee", "siren"], ignore_index=True), out, b)
+                old_events = read_history(out, b)
+                events = pd.concat([old_events.loc[~old_events["siren"].isin(sirens)], events], ignore_index=True)
+                if len(events):
+                    write_history(events.sort_values(["siren", "dateDebut"], kind="stable"), out, b)
+                elif os.path.exists(_history_path(out, b)):
+                    os.remove(_history_path(out, b))
+                write_snapshot(snapshot, out, b)
+                touched += 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # 4) Agrégats dérivés
+    if cube_ok:
+        current = pq.read_table(cube).to_pandas()
+        if removed:
+            current = patch_cube(current, pd.concat(removed, ignore_index=True),
+                                 pd.concat(added, ignore_index=True))
+        write_cube(current, cube, source_fingerprint(out))
+    elapsed = time.perf_counter() - t0
+    return {
+        "workers": 1, "siren_modifies": n_changed, "partitions_reecrites": touched,
+        "lignes_lues": n_in, "lignes_ecrites": int(sum(len(a) for a in added)),
+        "duree_s": round(elapsed, 2),
+        "lignes_par_s": round(n_in / elapsed) if elapsed else None,
+        "pic_rss_mo": round(peak_rss_mb(), 1),
+        "cube_corrige": bool(cube_ok),
+    }
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Prétraitement Sirene en flux (mémoire bornée).")
+    p.add_argument("--stock", required=True, help="StockUniteLegale (Parquet)")
+    p.add_argument("--historique", required=True, help="StockUniteLegaleHistorique (Parquet)")
+    p.add_argument("--sortie", default="data_parquet", help="dataset Parquet partitionné par année")
+    p.add_argument("--etablissements", default=None,
+                   help="StockEtablissement (Parquet, optionnel) : commune et département du siège")
+    p.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS, help="nombre de partitions par siren")
+    p.add_argument("--taille-lot", type=int, default=DEFAULT_BATCH_SIZE, help="lignes par lot Arrow")
+    p.add_argument("--tmp", default=None, help="dossier des fichiers intermédiaires")
+    p.add_argument("--workers", type=int, default=1, help="processus parallèles (1 = série)")
+    p.add_argument("--incremental", action="store_true",
+                   help="ne retraiter que les siren modifiés depuis la dernière construction")
+    p.add_argument("--cube", default=None, help="cube d'agrégats à corriger en mode incrémental")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.incremental:
+        stats = run_incremental(args.stock, args.historique, args.sortie, args.taille_lot, args.tmp, args.cube,
+                                args.etablissements)
+        print(f"{stats['siren_modifies']:,} siren modifiés, {stats['partitions_reecrites']} partitions réécrites"
+              + (", cube corrigé" if stats["cube_corrige"] else ""))
+    else:
+        stats = run(args.stock, args.historique, args.sortie, args.partitions, args.taille_lot, args.tmp, args.workers,
+                    args.etablissements)
+    print(f"{stats['lignes_lues']:,} lignes lues → {stats['lignes_ecrites']:,} lignes écrites "
+          f"en {stats['duree_s']} s avec {stats['workers']} processus ({stats['lignes_par_s']:,} lignes/s), pic RSS {stats['pic_rss_mo']} Mo")
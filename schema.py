@@ -0,0 +1,130 @@
+# ======================================================
+# SCHÉMA COMPACT DU DATASET « UNITÉS LÉGALES »
+# ======================================================
+#
+# Une ligne par siren × année : on évite toute colonne `object`.
+# - siren : uint32 (9 chiffres < 2**32)
+# - annee : int16
+# - codes INSEE (état, catégorie, tranche d'effectif) : catégories fixes,
+#   les groupby tournent donc sur les codes entiers et non sur des chaînes.
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from survival import SURVIVAL_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+ETATS = ["A", "C"]
+CATEGORIES = ["PME", "ETI", "GE"]
+TRANCHES = ["NN", "00", "01", "02", "03", "11", "12", "21", "22",
+            "31", "32", "41", "42", "51", "52", "53"]
+
+# Libellés des tranches d'effectif salarié (hors NN & 00)
+TRANCHE_LABELS = {
+    "01": "1–2", "02": "3–5", "03": "6–9",
+    "11": "10–19", "12": "20–49", "21": "50–99", "22": "100–199",
+    "31": "200–249", "32": "250–499", "41": "500–999",
+    "42": "1 000–1 999", "51": "2 000–4 999", "52": "5 000–9 999", "53": "10 000+",
+}
+ORDRE_TRANCHES = ["1–2", "3–5", "6–9", "10–19", "20–49", "50–99", "100–199",
+                  "200–249", "250–499", "500–999", "1 000–1 999", "2 000–4 999", "5 000–9 999", "10 000+"]
+TRANCHE_AUTRE = "Autre/NA"
+
+# Tranches d'ancienneté (années)
+BINS_AGE = [0, 5, 10, 20, 30, 50, 100, np.inf]
+LABELS_AGE = ["0–5", "5–10", "10–20", "20–30", "30–50", "50–100", "100+"]
+
+ETAT_DTYPE = pd.CategoricalDtype(ETATS)
+CATEGORIE_DTYPE = pd.CategoricalDtype(CATEGORIES)
+TRANCHE_DTYPE = pd.CategoricalDtype(TRANCHES)
+
+SCHEMA = {
+    "siren": "uint32",
+    "annee": "int16",
+    "anciennete": "float32",
+    **{col: "int8" for col in SURVIVAL_COLUMNS},  # Survie_12m … Survie_48m
+    "etatAdministratifUniteLegale": ETAT_DTYPE,
+    "categorieEntreprise": CATEGORIE_DTYPE,
+    "trancheEffectifsUniteLegale": TRANCHE_DTYPE,
+}
+
+# Code de tranche → position du libellé dans ORDRE_TRANCHES + [TRANCHE_AUTRE]
+_TRANCHE_TO_LABEL = np.array(
+    [ORDRE_TRANCHES.index(TRANCHE_LABELS[t]) if t in TRANCHE_LABELS else len(ORDRE_TRANCHES)
+     for t in TRANCHES] + [len(ORDRE_TRANCHES)],  # dernier slot : code -1 (NaN)
+    dtype=np.int8,
+)
+
+
+def memory_footprint(df: pd.DataFrame) -> int:
+    """Empreinte mémoire réelle (octets), chaînes comprises."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def _to_codes(s: pd.Series, dtype: pd.CategoricalDtype) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Déjà catégoriel (dictionnaire Parquet) : on ne nettoie que les catégories
+        cleaned = s.cat.categories.astype(str).str.strip().str.upper()
+        if cleaned.is_unique:
+            return s.cat.rename_categories(cleaned).astype(dtype)
+    return s.astype("string").str.strip().str.upper().astype(dtype)
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convertit `df` au schéma compact (colonnes présentes uniquement).
+    Les lignes sans siren ou sans année sont écartées (types non nullables).
+    Journalise l'empreinte mémoire avant / après conversion.
+    """
+    before = memory_footprint(df)
+    n_before = len(df)
+
+    for col in ("siren", "annee"):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    keys = [c for c in ("siren", "annee") if c in df.columns]
+    if keys:
+        df = df.dropna(subset=keys)
+
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = _to_codes(df[col], dtype)
+        elif col == "anciennete":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        elif col in SURVIVAL_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).clip(0, 1).astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    df = df.reset_index(drop=True)
+
+    after = memory_footprint(df)
+    df.attrs["memoire"] = {"avant": before, "apres": after, "lignes_ecartees": n_before - len(df)}
+    logger.info(
+        "Schéma compact : %.1f Mo → %.1f Mo (%d lignes, %d écartées sans siren/année)",
+        before / 1e6, after / 1e6, len(df), n_before - len(df),
+    )
+    return df
+
+
+def tranche_labels(s: pd.Series) -> pd.Series:
+    """
+    Libellés ordonnés des tranches d'effectif, calculés sur les codes
+    catégoriels (NN, 00, inconnu ou manquant → « Autre/NA »).
+    """
+    if not isinstance(s.dtype, pd.CategoricalDtype) or list(s.cat.categories) != TRANCHES:
+        s = _to_codes(s, TRANCHE_DTYPE)
+    codes = _TRANCHE_TO_LABEL[s.cat.codes.to_numpy()]
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=ORDRE_TRANCHES + [TRANCHE_AUTRE], ordered=True),
+        index=s.index, name=s.name,
+    )
+
+
+def age_bins(s: pd.Series) -> pd.Series:
+    """Tranche d'ancienneté ordonnée (catégorielle)."""
+    return pd.cut(s, bins=BINS_AGE, labels=LABELS_AGE, include_lowest=True, right=False)
@@ -0,0 +1,126 @@
+# ======================================================
+# CROQUIS HYPERLOGLOG : SIREN DISTINCTS APPROCHÉS ET FUSIONNABLES
+# ======================================================
+#
+# Un nunique() exact sur siren exige toute la colonne en mémoire et ses
+# résultats ne s'additionnent pas d'un bloc de données à l'autre (un même
+# siren apparaît dans plusieurs années). Un croquis HyperLogLog résume un
+# ensemble de siren en m = 2^p registres de 8 bits :
+#   - construction vectorisée : hachage 64 bits, les p bits de poids fort
+#     choisissent le registre, le rang du premier bit à 1 du reste y est
+#     conservé (maximum) ;
+#   - fusion exacte : maximum registre par registre (union des ensembles),
+#     quel que soit le découpage (années, blocs CSV, partitions) ;
+#   - estimation : estimateur amélioré d'Ertl (2017), sans biais sur toute la
+#     plage de cardinalités et sans table de correction empirique.
+# Erreur type relative ≈ 1,04 / √m, configurable par SKETCH_ERROR (défaut 1 %,
+# soit p = 14 et 16 Ko par croquis).
+
+import math
+import os
+
+import numpy as np
+
+SKETCH_ERROR = float(os.environ.get("SKETCH_ERROR", "0.01"))
+MIN_PRECISION, MAX_PRECISION = 4, 18
+
+
+def precision_for(error: float = SKETCH_ERROR) -> int:
+    """Plus petite précision p dont l'erreur type 1,04 / √(2^p) est ≤ `error`."""
+    if not error > 0:
+        raise ValueError(f"Erreur relative invalide : {error!r}")
+    p = math.ceil(math.log2((1.04 / error) ** 2))
+    return min(max(p, MIN_PRECISION), MAX_PRECISION)
+
+
+def standard_error(p: int) -> float:
+    return 1.04 / math.sqrt(1 << p)
+
+
+# --------------------------------------------
+# Construction
+# --------------------------------------------
+def hash64(values) -> np.ndarray:
+    """Hachage 64 bits (finaliseur splitmix64) d'entiers, bien réparti sur tous les bits."""
+    z = np.asarray(values).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Nombre de bits significatifs d'entiers uint64 (calcul exact en deux moitiés de 32 bits)."""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+def sketch_cells(cells, sirens, n_cells: int, p: int) -> np.ndarray:
+    """Registres (n_cells, 2^p) : un croquis par cellule, `cells` = numéro de cellule de chaque siren."""
+    h = hash64(sirens)
+    q = 64 - p
+    index = (h >> np.uint64(q)).astype(np.int64)
+    rank = (q + 1 - _bit_length(h & np.uint64((1 << q) - 1))).astype(np.uint8)
+    registers = np.zeros(n_cells << p, dtype=np.uint8)
+    np.maximum.at(registers, (np.asarray(cells, dtype=np.int64) << p) + index, rank)
+    return registers.reshape(n_cells, 1 << p)
+
+
+def sketch(sirens, p: int) -> np.ndarray:
+    """Croquis d'un seul ensemble de siren."""
+    return sketch_cells(np.zeros(len(sirens), dtype=np.int64), sirens, 1, p)[0]
+
+
+def merge(*sketches) -> np.ndarray:
+    """Union : maximum registre par registre (croquis de même précision)."""
+    return np.maximum.reduce([np.asarray(s, dtype=np.uint8) for s in sketches])
+
+
+# --------------------------------------------
+# Estimation
+# --------------------------------------------
+def _sigma(x: float) -> float:
+    if x == 1.0:
+        return math.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        z_old = z
+        z += x * y
+        y += y
+        if z == z_old:
+            return z
+
+
+def _tau(x: float) -> float:
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y, z = 1.0, 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        z_old = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == z_old:
+            return z / 3
+
+
+def estimate(registers) -> float:
+    """Cardinalité estimée d'un croquis (estimateur amélioré d'Ertl)."""
+    registers = np.asarray(registers, dtype=np.uint8)
+    m = len(registers)
+    q = 64 - int(m).bit_length() + 1
+    counts = np.bincount(registers, minlength=q + 2).astype(np.float64)
+    z = m * _tau(1 - counts[q + 1] / m)
+    for k in range(q, 0, -1):
+        z = 0.5 * (z + counts[k])
+    z += m * _sigma(counts[0] / m)
+    return m * m / (2 * math.log(2)) / z
+
+
+def to_bytes(registers) -> bytes:
+    return np.asarray(registers, dtype=np.uint8).tobytes()
+
+
+def from_bytes(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.uint8)
@@ -0,0 +1,222 @@
+# ======================================================
+# BACKEND SQL (DuckDB) POUR LE CUBE D'AGRÉGATS — OPTIONNEL
+# ======================================================
+#
+# Calcule les mêmes vues que cube.build_cube, mais en SQL directement sur les
+# fichiers Parquet (ou le CSV) : DuckDB lit en colonnes, en parallèle sur tous
+# les cœurs, ne décode que les colonnes utiles et pousse les filtres au
+# lecteur. Seules les petites tables de résultats remontent en pandas.
+#
+# Le nettoyage reproduit schema.apply_schema (codes INSEE normalisés, lignes
+# sans siren / année écartées, Survie_<h>m bornées à 0/1), d'où des chiffres
+# identiques au chemin pandas (contrôle : benchmarks/bench_sql.py).
+#
+# Activation : CUBE_BACKEND=duckdb (python cube.py ou dashboard) ; sans le
+# paquet `duckdb`, le cube est construit en pandas.
+
+import os
+
+import pandas as pd
+
+from cube import _to_long
+from data_loader import is_parquet_source, source_columns
+from geo import DEPARTEMENT
+from naf import NAF_COLUMN, NOMENCLATURE_COLUMN, classify
+from schema import BINS_AGE, CATEGORIES, ETATS, LABELS_AGE, TRANCHE_AUTRE, TRANCHE_LABELS, TRANCHES
+from survival import HORIZONS, survival_column
+
+try:
+    import duckdb
+except ImportError:  # dépendance optionnelle
+    duckdb = None
+
+
+def available() -> bool:
+    return duckdb is not None
+
+
+# --------------------------------------------
+# Fragments SQL
+# --------------------------------------------
+def _quote(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _source_sql(path: str) -> str:
+    if os.path.isdir(path):
+        # Partitions Hive uniquement (`_historique/`, `_snapshot/` exclus)
+        pattern = os.path.join(path, "annee=*", "*.parquet")
+        return f"read_parquet({_quote(pattern)}, hive_partitioning = true, hive_types = {{'annee': SMALLINT}})"
+    if is_parquet_source(path):
+        return f"read_parquet({_quote(path)})"
+    return f"read_csv({_quote(path)}, header = true)"
+
+
+def _code_sql(col: str, codes) -> str:
+    """Code INSEE nettoyé (trim + majuscules), NULL hors liste — comme _to_codes."""
+    clean = f'upper(trim(CAST("{col}" AS VARCHAR)))'
+    return f"CASE WHEN {clean} IN ({', '.join(map(_quote, codes))}) THEN {clean} END"
+
+
+def _age_sql() -> str:
+    """Tranche d'ancienneté [borne, borne suivante) — comme schema.age_bins."""
+    cases = " ".join(
+        f"WHEN anciennete >= {lo} AND anciennete < {hi} THEN {_quote(label)}" if hi != float("inf")
+        else f"WHEN anciennete >= {lo} THEN {_quote(label)}"
+        for lo, hi, label in zip(BINS_AGE[:-1], BINS_AGE[1:], LABELS_AGE)
+    )
+    return f"CASE {cases} END"
+
+
+def _tranche_label_sql() -> str:
+    cases = " ".join(f"WHEN {_quote(code)} THEN {_quote(label)}" for code, label in TRANCHE_LABELS.items())
+    return f"CASE trancheEffectifsUniteLegale {cases} ELSE {_quote(TRANCHE_AUTRE)} END"
+
+
+def _base_sql(path: str, columns) -> str:
+    """Lignes nettoyées + dimensions dérivées (age_bin, trancheEffectifs_label), calculées une fois."""
+    select = [
+        'TRY_CAST("siren" AS BIGINT) AS siren',
+        'TRY_CAST("annee" AS INTEGER) AS annee',
+        f"{_code_sql('etatAdministratifUniteLegale', ETATS)} AS etatAdministratifUniteLegale",
+    ]
+    if "categorieEntreprise" in columns:
+        select.append(f"{_code_sql('categorieEntreprise', CATEGORIES)} AS categorieEntreprise")
+    if "trancheEffectifsUniteLegale" in columns:
+        select.append(f"{_code_sql('trancheEffectifsUniteLegale', TRANCHES)} AS trancheEffectifsUniteLegale")
+    if "anciennete" in columns:
+        select.append('CAST(TRY_CAST("anciennete" AS DOUBLE) AS FLOAT) AS anciennete')
+    for h in HORIZONS:
+        col = survival_column(h)
+        if col in columns:
+            select.append(f'CAST(trunc(least(greatest(coalesce(TRY_CAST("{col}" AS DOUBLE), 0), 0), 1)) AS TINYINT) AS "{col}"')
+    for col in (NAF_COLUMN, NOMENCLATURE_COLUMN):
+        if col in columns:
+            select.append(f'CAST("{col}" AS VARCHAR) AS {col}')
+    if DEPARTEMENT in columns:
+        select.append(f"CAST({DEPARTEMENT} AS VARCHAR) AS {DEPARTEMENT}")
+    clean = (f"SELECT {', '.join(select)} FROM {_source_sql(path)} "
+             f'WHERE TRY_CAST("siren" AS BIGINT) IS NOT NULL AND TRY_CAST("annee" AS INTEGER) IS NOT NULL')
+    derived = []
+    if "anciennete" in columns:
+        derived.append(f"{_age_sql()} AS age_bin")
+    if "trancheEffectifsUniteLegale" in columns:
+        derived.append(f"{_tranche_label_sql()} AS trancheEffectifs_label")
+    return f"SELECT *{''.join(', ' + d for d in derived)} FROM ({clean})"
+
+
+# --------------------------------------------
+# Vues du cube
+# --------------------------------------------
+def _closures(con, columns) -> dict:
+    ferme = "etatAdministratifUniteLegale = 'C'"
+    views = {
+        "global": con.sql(f"""
+            SELECT count(DISTINCT siren) AS nb_siren,
+                   count(DISTINCT siren) FILTER (WHERE {ferme}) AS nb_siren_fermees,
+                   count(*) AS nb_lignes,
+                   count(*) FILTER (WHERE {ferme}) AS nb_fermees
+            FROM base""").df(),
+        "annee_etat": con.sql("""
+            SELECT annee, etatAdministratifUniteLegale, count(*) AS nb_lignes
+            FROM base WHERE etatAdministratifUniteLegale IS NOT NULL
+            GROUP BY ALL""").df(),
+    }
+    if "categorieEntreprise" in columns:
+        views["categorie"] = con.sql(f"""
+            SELECT categorieEntreprise, count(DISTINCT siren) AS nb_siren_fermees
+            FROM base WHERE {ferme} GROUP BY ALL""").df()
+    if "anciennete" in columns and con.sql("SELECT count(anciennete) FROM base").fetchone()[0]:
+        views["age"] = con.sql(f"""
+            SELECT age_bin, count(DISTINCT siren) AS nb_siren,
+                   count(*) FILTER (WHERE {ferme}) AS nb_fermees
+            FROM base GROUP BY ALL""").df()
+    if "trancheEffectifsUniteLegale" in columns:
+        views["tranche"] = con.sql(f"""
+            SELECT trancheEffectifs_label, count(DISTINCT siren) AS nb_siren,
+                   count(*) FILTER (WHERE {ferme}) AS nb_fermees
+            FROM base WHERE trancheEffectifsUniteLegale IS NULL OR trancheEffectifsUniteLegale NOT IN ('NN', '00')
+            GROUP BY ALL""").df()
+    if NAF_COLUMN in columns:
+        views["naf"] = _naf_classes(con.sql(f"""
+            SELECT annee, {', '.join(_naf_dims(columns))}, count(*) AS nb_lignes,
+                   count(*) FILTER (WHERE {ferme}) AS nb_fermees
+            FROM base GROUP BY ALL""").df(), ["annee"])
+    if DEPARTEMENT in columns:
+        views["departement"] = con.sql(f"""
+            SELECT annee, {DEPARTEMENT}, count(*) AS nb_lignes, count(*) FILTER (WHERE {ferme}) AS nb_fermees
+            FROM base WHERE {DEPARTEMENT} IS NOT NULL GROUP BY ALL""").df()
+    return views
+
+
+def _naf_dims(columns) -> list:
+    return [c for c in (NAF_COLUMN, NOMENCLATURE_COLUMN) if c in columns]
+
+
+def _naf_classes(frame: pd.DataFrame, dims) -> pd.DataFrame:
+    """Codes APE bruts → classes NAF (naf.classify, sur les seuls codes distincts), puis sommes par classe."""
+    naf = classify(frame[NAF_COLUMN], frame[NOMENCLATURE_COLUMN] if NOMENCLATURE_COLUMN in frame.columns else None)
+    measures = [c for c in frame.columns if c.startswith("nb_")]
+    return (pd.concat([frame[dims + measures], naf], axis=1)
+              .dropna(subset=["naf"])
+              .groupby(dims + ["nomenclature", "naf"], sort=False)[measures].sum()
+              .reset_index())
+
+
+def _cohorts(con, columns) -> dict:
+    horizons = [h for h in HORIZONS if survival_column(h) in columns]
+    # Une ligne par siren et par année de cohorte : la première de la source (rowid), comme
+    # en pandas. Le dédoublonnage (fenêtre) n'est exécuté que s'il y a des doublons.
+    doublons = con.sql("SELECT count(*) FROM (SELECT 1 FROM base GROUP BY annee, siren HAVING count(*) > 1)").fetchone()[0]
+    if doublons:
+        con.execute("CREATE TEMP TABLE cohorte AS "
+                    "SELECT * FROM base QUALIFY row_number() OVER (PARTITION BY annee, siren ORDER BY rowid) = 1")
+    else:
+        con.execute("CREATE TEMP VIEW cohorte AS SELECT * FROM base")
+
+    def agg(dims, where: str = "TRUE"):
+        # Tous les horizons en une requête ; siren uniques par année ⇒ nb_siren = nb_lignes
+        sums = ", ".join(f'sum("{survival_column(h)}") AS s{h}' for h in horizons)
+        wide = con.sql(f"SELECT {', '.join(dims)}, count(*) AS nb_lignes, {sums} "
+                       f"FROM cohorte WHERE {where} GROUP BY ALL").df()
+        return pd.concat([
+            wide[dims].assign(horizon=h, nb_siren=wide["nb_lignes"], nb_lignes=wide["nb_lignes"],
+                              nb_survivantes=wide[f"s{h}"])
+            for h in horizons
+        ], ignore_index=True)
+
+    views = {"cohorte": agg(["annee"])}
+    if "categorieEntreprise" in columns:
+        views["cohorte_categorie"] = agg(["annee", "categorieEntreprise"])
+    if "anciennete" in columns and con.sql("SELECT count(anciennete) FROM cohorte").fetchone()[0]:
+        views["cohorte_age"] = agg(["annee", "age_bin"])
+    if "trancheEffectifsUniteLegale" in columns:
+        views["cohorte_tranche"] = agg(
+            ["annee", "trancheEffectifs_label"],
+            "trancheEffectifsUniteLegale IS NULL OR trancheEffectifsUniteLegale NOT IN ('NN', '00')",
+        )
+    if NAF_COLUMN in columns:
+        views["cohorte_naf"] = _naf_classes(agg(["annee", *_naf_dims(columns)]), ["annee", "horizon"])
+    if DEPARTEMENT in columns:
+        views["cohorte_departement"] = agg(["annee", DEPARTEMENT], f"{DEPARTEMENT} IS NOT NULL")
+    return views
+
+
+def build_cube_sql(path: str, threads: int = None) -> pd.DataFrame:
+    """Équivalent SQL de cube.build_cube(read_table(path)) : mêmes vues, mêmes comptages."""
+    if duckdb is None:
+        raise ImportError("Le backend SQL nécessite le paquet `duckdb` (pip install duckdb).")
+    columns = set(source_columns(path))
+    con = duckdb.connect()
+    try:
+        if threads:
+            con.execute(f"SET threads = {int(threads)}")
+        # Une seule lecture des fichiers (colonnes utiles), ordre de la source conservé
+        con.execute("SET preserve_insertion_order = true")
+        con.execute(f"CREATE TEMP TABLE base AS {_base_sql(path, columns)}")
+        views = _closures(con, columns)
+        if any(survival_column(h) in columns for h in HORIZONS):
+            views.update(_cohorts(con, columns))
+    finally:
+        con.close()
+    return _to_long(views)
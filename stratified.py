@@ -0,0 +1,232 @@
+# ======================================================
+# TESTS D'INDÉPENDANCE STRATIFIÉS, PAR LOTS (Partie 4)
+# ======================================================
+#
+# Survie × groupe d'intensité d'aide testée DANS chaque strate catégorie ×
+# tranche d'effectif × section NAF : des milliers de petites tables k × 2,
+# traitées comme un seul tableau (strates × groupes) plutôt qu'un appel SciPy
+# par strate :
+#   - tables de contingence : un seul passage (np.bincount sur strate × groupe) ;
+#   - Chi² de Pearson de toutes les strates à la fois ;
+#   - test exact de Fisher (premier groupe présent dans la strate contre les
+#     autres) : loi hypergéométrique de chaque strate sur une grille commune,
+#     par blocs ;
+#   - Cochran–Mantel–Haenszel : association générale k × 2 sur l'ensemble des
+#     strates, et odds ratio commun de Mantel–Haenszel ;
+#   - correction de Benjamini–Hochberg (taux de fausses découvertes) des
+#     p-values par strate.
+# SciPy (optionnel) ne sert qu'à la loi du Chi² (un appel vectorisé) ; sans lui,
+# chaque strate est jugée par le test exact.
+
+import numpy as np
+import pandas as pd
+
+from inference import chi2_statistic
+from naf import NAF_COLUMN, NOMENCLATURE_COLUMN, naf_section
+from schema import tranche_labels
+
+STRATA = ("categorieEntreprise", "trancheEffectifsUniteLegale", NAF_COLUMN)
+MIN_EXPECTED = 5  # règle de Cochran : en dessous, le Chi² cède la place au test exact
+GRID_CELLS = 4_000_000  # taille des blocs strates × support (test exact)
+
+
+def _chi2_sf(stat, ddl) -> np.ndarray:
+    """P(Chi²(ddl) ≥ stat), vectorisé ; NaN sans SciPy."""
+    stat = np.asarray(stat, dtype=np.float64)
+    try:
+        from scipy.special import chdtrc
+    except ImportError:
+        return np.full(stat.shape, np.nan)
+    return np.where(np.asarray(ddl) > 0, chdtrc(np.maximum(ddl, 1), stat), np.nan)
+
+
+def _dimension_labels(dim: str, values) -> pd.Series:
+    """Libellés lisibles des valeurs distinctes d'une dimension (tranche, section NAF)."""
+    values = pd.Series(values)
+    if dim == "trancheEffectifsUniteLegale":
+        return pd.Series(tranche_labels(values), index=values.index)
+    if dim == NAF_COLUMN:
+        return naf_section(values)
+    return values
+
+
+def strata_codes(df: pd.DataFrame, dims=STRATA):
+    """
+    Strate de chaque ligne (codes 0…S-1, dans l'ordre des libellés) et libellés
+    des S strates ; « n/d » si manquant. Libellés calculés sur les valeurs distinctes.
+    Section NAF selon la nomenclature de chaque ligne (NOMENCLATURE_COLUMN) si présente.
+    """
+    dims = [d for d in dims if d in df.columns]
+    names = {"trancheEffectifsUniteLegale": "tranche", NAF_COLUMN: "section"}
+    codes, levels = np.zeros(len(df), dtype=np.int64), []
+    for dim in dims:
+        if dim == NAF_COLUMN and NOMENCLATURE_COLUMN in df.columns:
+            # Codes rév. 1 et rév. 2 mêlés : même code, section différente selon la nomenclature
+            idx, labels = pd.factorize(naf_section(df[dim], df[NOMENCLATURE_COLUMN]))
+            labels = pd.Series(labels, dtype=object)
+        else:
+            idx, uniques = pd.factorize(df[dim])
+            labels = _dimension_labels(dim, uniques)
+        labels = labels.astype(object).fillna("n/d").astype(str).to_numpy()
+        lab_idx, lab_uniques = pd.factorize(np.append(labels, "n/d"), sort=True)
+        codes = codes * len(lab_uniques) + lab_idx[np.where(idx >= 0, idx, len(labels))]
+        levels.append(lab_uniques)
+    strata_ids, strata = np.unique(codes, return_inverse=True)
+    used, out = strata_ids, {}
+    for dim, lab in zip(reversed(dims), reversed(levels)):
+        used, pos = np.divmod(used, len(lab))
+        out[names.get(dim, dim)] = lab[pos]
+    return strata.ravel(), pd.DataFrame({k: out[k] for k in reversed(list(out))}, index=range(len(strata_ids)))
+
+
+def strata_labels(df: pd.DataFrame, dims=STRATA) -> pd.DataFrame:
+    """Libellés de strate de chaque ligne (tranche et section NAF lisibles) ; « n/d » si manquant."""
+    strata, labels = strata_codes(df, dims)
+    return labels.iloc[strata].set_index(df.index)
+
+
+def contingency_tables(strata: np.ndarray, groups: np.ndarray, outcome: np.ndarray, n_strata: int, k: int):
+    """(effectifs, survivantes) de chaque strate × groupe, matrices (strates, k), en un passage."""
+    cells = strata.astype(np.int64) * k + groups
+    n = np.bincount(cells, minlength=n_strata * k).reshape(n_strata, k)
+    survivors = np.bincount(cells, weights=outcome, minlength=n_strata * k).round().astype(np.int64)
+    return n, survivors.reshape(n_strata, k)
+
+
+def chi2_tests(n: np.ndarray, survivors: np.ndarray) -> pd.DataFrame:
+    """Chi² de Pearson, ddl, plus petit effectif attendu et p-value de chaque table k × 2."""
+    total = n.sum(axis=1)
+    surv = survivors.sum(axis=1)
+    groupes = (n > 0).sum(axis=1)
+    ddl = np.where((surv > 0) & (surv < total), groupes - 1, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = n * (surv / total)[:, None]
+        low = np.where(n > 0, np.minimum(expected, n - expected), np.inf).min(axis=1)
+    chi2 = chi2_statistic(n, survivors)
+    return pd.DataFrame({"chi2": chi2, "ddl": ddl, "attendu_min": low, "p_chi2": _chi2_sf(chi2, ddl)})
+
+
+def _log_factorials(n_max: int) -> np.ndarray:
+    return np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, n_max + 1, dtype=np.float64)))])
+
+
+def _hypergeom_logpmf(x, lf, r, c, t):
+    """log P(X = x), X hypergéométrique : `c` tirages parmi `t` dont `r` marqués."""
+    return lf[r] + lf[t - r] + lf[c] + lf[t - c] - lf[t] - lf[x] - lf[r - x] - lf[c - x] - lf[t - r - c + x]
+
+
+def fisher_exact(a, row, col, total) -> np.ndarray:
+    """
+    Test exact de Fisher bilatéral de tables 2 × 2 (a = case haut-gauche, marges
+    `row` et `col`, effectif `total`) : somme des probabilités hypergéométriques
+    ≤ celle de la table observée, comme scipy.stats.fisher_exact.
+    """
+    a, row, col, total = (np.asarray(x, dtype=np.int64) for x in (a, row, col, total))
+    lo = np.maximum(0, row + col - total)
+    hi = np.minimum(row, col)
+    p = np.full(len(a), np.nan)
+    if not len(a):
+        return p
+    lf = _log_factorials(int(total.max()))
+    # Strates triées par largeur du support, en blocs d'au plus GRID_CELLS cases (strates × largeur maximale)
+    order = np.argsort(hi - lo, kind="stable")
+    width = (hi - lo + 1)[order]
+    start = 0
+    while start < len(order):
+        cells = np.arange(1, len(order) - start + 1) * width[start:]
+        stop = start + max(1, int(np.searchsorted(cells, GRID_CELLS, side="right")))
+        i = order[start:stop]
+        margins = lf, row[i, None], col[i, None], total[i, None]
+        x = lo[i, None] + np.arange(width[stop - 1])
+        valid = x <= hi[i, None]
+        logp = _hypergeom_logpmf(np.where(valid, x, lo[i, None]), *margins)
+        # Tolérance relative de SciPy (1 + 1e-7) sur les probabilités
+        keep = valid & (logp <= _hypergeom_logpmf(a[i, None], *margins) + np.log1p(1e-7))
+        p[i] = np.minimum(1.0, np.where(keep, np.exp(logp), 0.0).sum(axis=1))
+        start = stop
+    return p
+
+
+def cochran_mantel_haenszel(n: np.ndarray, survivors: np.ndarray) -> dict:
+    """
+    Test de Cochran–Mantel–Haenszel (association générale, tables k × 2 de toutes
+    les strates) et odds ratio commun de Mantel–Haenszel des tables 2 × 2 « autres
+    groupes » contre « groupe de référence » (colonne 0) : > 1 si les autres survivent mieux.
+    """
+    n = n.astype(np.float64)
+    survivors = survivors.astype(np.float64)
+    total = n.sum(axis=1)
+    surv = survivors.sum(axis=1)
+    keep = total > 1
+    n, survivors, total, surv = n[keep], survivors[keep], total[keep], surv[keep]
+    # Écarts observé − attendu et covariance hypergéométrique, sommés sur les strates
+    ecart = (survivors - n * (surv / total)[:, None]).sum(axis=0)
+    facteur = surv * (total - surv) / (total ** 2 * (total - 1))
+    cov = np.einsum("s,sij->ij", facteur, total[:, None, None] * np.eye(n.shape[1]) * n[:, None, :]
+                    - n[:, :, None] * n[:, None, :])
+    stat = float(ecart @ np.linalg.pinv(cov) @ ecart) if len(n) else np.nan
+    ddl = int(np.linalg.matrix_rank(cov)) if len(n) else 0
+    # Odds ratio commun : a, b = survivantes / fermées du groupe de référence ; c, d = des autres
+    a, b = survivors[:, 0], n[:, 0] - survivors[:, 0]
+    c, d = surv - a, (total - surv) - b
+    num, den = (c * b / total).sum(), (a * d / total).sum()
+    return {"cmh": stat, "ddl": ddl, "p_value": float(_chi2_sf(stat, ddl)) if ddl else np.nan,
+            "odds_ratio_mh": num / den if den > 0 else np.nan, "strates": int(keep.sum())}
+
+
+def benjamini_hochberg(p) -> np.ndarray:
+    """q-values de Benjamini–Hochberg (NaN ignorés : strates non testables)."""
+    p = np.asarray(p, dtype=np.float64)
+    q = np.full(p.shape, np.nan)
+    idx = np.flatnonzero(~np.isnan(p))
+    if not len(idx):
+        return q
+    order = idx[np.argsort(p[idx], kind="stable")]
+    ranked = p[order] * len(order) / np.arange(1, len(order) + 1)
+    q[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return q
+
+
+def stratified_tests(grouped: pd.DataFrame, col_survie: str, dims=STRATA,
+                     groupe: str = "groupe_intensite") -> dict:
+    """
+    Tests survie × groupe d'intensité dans chaque strate de `dims` :
+    {"strates": table classée par q-value croissante, "cmh": test global}.
+    Test retenu par strate : Fisher exact si la table est 2 × 2 ou si un effectif
+    attendu est < MIN_EXPECTED (ou sans SciPy), Chi² sinon. La table 2 × 2 de
+    Fisher oppose le premier groupe présent dans la strate (`groupe_ref`) aux
+    autres : une strate sans le groupe de référence global reste testée.
+    """
+    base = grouped.dropna(subset=[col_survie, groupe])
+    strata, out = strata_codes(base, dims)
+    keys = list(out.columns)
+    group_codes, group_names = pd.factorize(base[groupe], sort=True)
+    n, survivors = contingency_tables(strata, group_codes, base[col_survie].to_numpy(dtype=np.float64),
+                                      len(out), len(group_names))
+    tests = chi2_tests(n, survivors)
+    total, surv = n.sum(axis=1), survivors.sum(axis=1)
+    # Groupe de référence de chaque strate : le premier groupe non vide
+    first = np.argmax(n > 0, axis=1) if n.size else np.zeros(len(n), dtype=np.int64)
+    rows = np.arange(len(n))
+    ref, surv_ref = n[rows, first], survivors[rows, first]
+    p_fisher = np.where((ref > 0) & (ref < total), fisher_exact(surv_ref, ref, surv, total), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = out.assign(
+            nb=total, nb_survivantes=surv, groupes=(n > 0).sum(axis=1),
+            groupe_ref=np.asarray(group_names, dtype=object)[first],
+            **{"taux_survie_ref_%": 100 * surv_ref / ref,
+               "taux_survie_autres_%": 100 * (surv - surv_ref) / (total - ref)},
+            chi2=tests["chi2"], ddl=tests["ddl"], attendu_min=tests["attendu_min"],
+            p_chi2=tests["p_chi2"], p_fisher=p_fisher,
+        )
+    exact = (out["groupes"] == 2) | (out["attendu_min"] < MIN_EXPECTED) | out["p_chi2"].isna()
+    # Fisher impossible (table 2 × 2 sans ligne « référence » ou « autres ») : Chi² s'il existe
+    fisher = exact & out["p_fisher"].notna()
+    testable = (out["ddl"] > 0) & (fisher | out["p_chi2"].notna())
+    out["test"] = np.where(testable, np.where(fisher, "fisher", "chi2"), "non testable")
+    out["p_value"] = np.where(testable, np.where(fisher, out["p_fisher"], out["p_chi2"]), np.nan)
+    out["q_value"] = benjamini_hochberg(out["p_value"])
+    out = out.sort_values(["q_value", "p_value", "nb"], ascending=[True, True, False], na_position="last",
+                          ignore_index=True)
+    return {"strates": out, "cmh": cochran_mantel_haenszel(n, survivors), "groupes": list(group_names),
+            "dimensions": keys}
@@ -0,0 +1,250 @@
+# ======================================================
+# MOTEUR DE SURVIE VECTORISÉ (toute cohorte, tout horizon)
+# ======================================================
+#
+# Dérive les indicateurs Survie_<h>m directement de l'historique
+# (siren, dateDebut, etatAdministratifUniteLegale) au lieu d'une colonne
+# précalculée, pour n'importe quelle année de cohorte et n'importe quel horizon.
+#
+# L'historique est trié une fois par (siren, dateDebut) en tableaux NumPy
+# (EventIndex). Une requête « état de ces siren à ces dates » est une seule
+# recherche dichotomique vectorisée (np.searchsorted) sur la clé composite
+# (rang du siren << 32 | jour) : aucune boucle Python par ligne.
+#
+# Convention : une unité légale observée l'année A survit à h mois si la
+# dernière période connue au 31/12/A + h mois est à l'état « A » (actif).
+#
+# Courbes de Kaplan–Meier : origine au 31/12 de l'année de cohorte (unités
+# actives à cette date), événement = première fermeture (état « C ») après
+# l'origine, censure à la fin des données. Durées en mois entiers ; toutes
+# les strates sont estimées en une passe (np.bincount sur strate × mois).
+
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+HORIZONS = (12, 24, 36, 48)
+
+# Sous-dossier de l'historique trié dans le dataset (ignoré par les lecteurs Arrow)
+HISTORY_DIR = "_historique"
+
+ETAT_CODES = {"A": 0, "C": 1}
+_COLUMN_RE = re.compile(r"Survie_(\d+)m")
+_DAY_BIAS = 1 << 31  # les jours avant 1970 restent positifs dans la clé composite
+
+
+def survival_column(months: int) -> str:
+    return f"Survie_{months}m"
+
+
+SURVIVAL_COLUMNS = [survival_column(h) for h in HORIZONS]
+
+
+def column_horizon(name: str):
+    """Horizon (mois) d'une colonne « Survie_<h>m », None sinon."""
+    match = _COLUMN_RE.fullmatch(str(name))
+    return int(match.group(1)) if match else None
+
+
+@dataclass(frozen=True)
+class EventIndex:
+    """Historique trié : siren uniques, bornes par siren, jours et états des périodes."""
+    sirens: np.ndarray   # uint32, trié, unique
+    offsets: np.ndarray  # int64, len(sirens) + 1 : périodes du siren i = [offsets[i], offsets[i+1])
+    days: np.ndarray     # int32, jours depuis 1970-01-01 (dateDebut)
+    etats: np.ndarray    # int8, code de ETAT_CODES (-1 si inconnu)
+    keys: np.ndarray     # int64, (rang du siren << 32) | (jour + biais), trié
+
+    @property
+    def cutoff(self) -> np.datetime64:
+        """Date de la dernière période connue (fin des données)."""
+        return np.datetime64(int(self.days.max()), "D") if len(self.days) else np.datetime64("NaT")
+
+
+def _etat_codes(etat: pd.Series) -> np.ndarray:
+    return pd.Categorical(etat, categories=list(ETAT_CODES)).codes.astype(np.int8)
+
+
+def build_index(events: pd.DataFrame) -> EventIndex:
+    """
+    Construit l'index depuis un DataFrame (siren, dateDebut, etatAdministratifUniteLegale).
+    À date égale pour un même siren, l'ordre d'entrée est conservé (la dernière ligne l'emporte).
+    """
+    siren = events["siren"].to_numpy().astype(np.uint32)
+    days = pd.to_datetime(events["dateDebut"]).to_numpy().astype("datetime64[D]").astype(np.int64).astype(np.int32)
+    etats = _etat_codes(events["etatAdministratifUniteLegale"])
+    order = np.lexsort((days, siren))  # stable
+    siren, days, etats = siren[order], days[order], etats[order]
+
+    change = np.ones(len(siren), dtype=bool)
+    change[1:] = siren[1:] != siren[:-1]
+    starts = np.flatnonzero(change)
+    rank = np.cumsum(change) - 1
+    keys = (rank.astype(np.int64) << 32) | (days.astype(np.int64) + _DAY_BIAS)
+    return EventIndex(
+        sirens=siren[starts],
+        offsets=np.append(starts, len(siren)).astype(np.int64),
+        days=days, etats=etats, keys=keys,
+    )
+
+
+def load_history(path: str) -> EventIndex:
+    """Index de l'historique écrit par preprocessing.py dans `<dataset>/_historique`."""
+    table = ds.dataset(os.path.join(path, HISTORY_DIR), format="parquet").to_table()
+    return build_index(table.to_pandas())
+
+
+def has_history(path: str) -> bool:
+    return os.path.isdir(os.path.join(str(path), HISTORY_DIR))
+
+
+def _ranks(index: EventIndex, sirens: np.ndarray):
+    """Rang de chaque siren dans l'index (borné) et masque des siren présents."""
+    rank = np.searchsorted(index.sirens, sirens)
+    rank_c = np.minimum(rank, max(len(index.sirens) - 1, 0))
+    known = (rank < len(index.sirens)) & (index.sirens[rank_c] == sirens) if len(index.sirens) else \
+        np.zeros(len(sirens), dtype=bool)
+    return rank_c.astype(np.int64), known
+
+
+def locate(index: EventIndex, sirens, dates):
+    """
+    Période en vigueur de chaque siren à la date correspondante (dernière période
+    dont dateDebut <= date) : (positions dans l'index, masque des périodes trouvées).
+    """
+    sirens = np.asarray(sirens, dtype=np.uint32)
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    rank_c, known = _ranks(index, sirens)
+    qkeys = (rank_c << 32) | (days + _DAY_BIAS)
+    pos = np.searchsorted(index.keys, qkeys, side="right") - 1
+    return pos, known & (pos >= index.offsets[rank_c])
+
+
+def state_at(index: EventIndex, sirens, dates) -> np.ndarray:
+    """
+    État (code ETAT_CODES, -1 si aucune période connue) de chaque siren à la date
+    correspondante : dernière période dont dateDebut <= date.
+    """
+    pos, found = locate(index, sirens, dates)
+    out = np.full(len(pos), -1, dtype=np.int8)
+    out[found] = index.etats[pos[found]]
+    return out
+
+
+def reference_dates(years, months: int) -> np.ndarray:
+    """31 décembre de l'année de cohorte + `months` mois (dernier jour du mois atteint)."""
+    years = np.asarray(years, dtype=np.int64)
+    first_next = ((years + 1 - 1970) * 12 + months).astype("datetime64[M]").astype("datetime64[D]")
+    return first_next - np.timedelta64(1, "D")
+
+
+def survival_flags(index: EventIndex, sirens, years, months: int = 24) -> np.ndarray:
+    """1 si actif au 31/12/année + `months` mois, sinon 0 (int8)."""
+    return (state_at(index, sirens, reference_dates(years, months)) == ETAT_CODES["A"]).astype(np.int8)
+
+
+def survival_table(index: EventIndex, sirens, years, horizons=HORIZONS) -> pd.DataFrame:
+    """
+    Toutes les combinaisons cohorte × horizon en une seule recherche : une colonne
+    Survie_<h>m par horizon pour chaque couple (siren, année) fourni.
+    """
+    sirens = np.asarray(sirens, dtype=np.uint32)
+    years = np.asarray(years, dtype=np.int64)
+    n = len(sirens)
+    all_dates = np.concatenate([reference_dates(years, h) for h in horizons])
+    states = state_at(index, np.tile(sirens, len(horizons)), all_dates)
+    flags = (states == ETAT_CODES["A"]).astype(np.int8)
+    return pd.DataFrame({survival_column(h): flags[i * n:(i + 1) * n] for i, h in enumerate(horizons)})
+
+
+def censored(index: EventIndex, year: int, months: int) -> bool:
+    """Vrai si la date de référence dépasse la fin des données (survie non encore observable)."""
+    return bool(reference_dates([year], months)[0] > index.cutoff)
+
+
+# --------------------------------------------
+# Kaplan–Meier (fermeture, censure à la fin des données)
+# --------------------------------------------
+_DAYS_PER_MONTH = 365.25 / 12
+
+
+def closure_durations(index: EventIndex, sirens, dates):
+    """
+    Jours entre `dates` et la première fermeture strictement postérieure de
+    chaque siren, ou jusqu'à la fin des données (censure). Retourne (durées, fermé).
+    """
+    sirens = np.asarray(sirens, dtype=np.uint32)
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    rank_c, known = _ranks(index, sirens)
+    closures = index.keys[index.etats == ETAT_CODES["C"]]  # reste trié
+    pos = np.searchsorted(closures, (rank_c << 32) | (days + _DAY_BIAS), side="right")
+    pos_c = np.minimum(pos, max(len(closures) - 1, 0))
+    closed = known & (pos < len(closures))
+    if len(closures):
+        closed &= (closures[pos_c] >> 32) == rank_c
+    closure_day = (closures[pos_c] & 0xFFFFFFFF) - _DAY_BIAS if len(closures) else np.zeros(len(days), np.int64)
+    end = np.where(closed, closure_day, int(index.days.max()) if len(index.days) else 0)
+    return end - days, closed
+
+
+def kaplan_meier(months, closed, strata=None, n_strata: int = 1) -> pd.DataFrame:
+    """
+    Estimateur de Kaplan–Meier par strate (codes 0..n_strata-1) sur des durées en
+    mois entiers. Une ligne par strate × mois tant qu'il reste des unités à risque :
+    a_risque, fermetures, censures, survie et IC à 95 % (Greenwood, log-log).
+    """
+    months = np.asarray(months, dtype=np.int64)
+    closed = np.asarray(closed, dtype=bool)
+    strata = np.zeros(len(months), dtype=np.int64) if strata is None else np.asarray(strata, dtype=np.int64)
+    horizon = int(months.max()) + 1 if len(months) else 1
+    cell = strata * horizon + months
+    size = n_strata * horizon
+    exits = np.bincount(cell, minlength=size).reshape(n_strata, horizon)
+    deaths = np.bincount(cell, weights=closed, minlength=size).reshape(n_strata, horizon)
+    at_risk = exits[:, ::-1].cumsum(axis=1)[:, ::-1]  # encore suivies au début du mois
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hazard = np.where(at_risk > 0, deaths / at_risk, 0.0)
+        surv = np.cumprod(1 - hazard, axis=1)
+        greenwood = np.cumsum(np.where(at_risk > deaths, deaths / (at_risk * (at_risk - deaths)), 0.0), axis=1)
+        # IC log(-log) : reste dans [0, 1]
+        log_s = np.log(surv)
+        se = np.sqrt(greenwood) / np.abs(log_s)
+        low = np.where(surv < 1, surv ** np.exp(1.96 * se), 1.0)
+        high = np.where(surv < 1, surv ** np.exp(-1.96 * se), 1.0)
+    low = np.where(surv > 0, low, 0.0)
+    high = np.where(surv > 0, high, 0.0)
+
+    keep = at_risk > 0
+    strate, mois = np.nonzero(keep)
+    return pd.DataFrame({
+        "strate": strate, "mois": mois,
+        "a_risque": at_risk[keep], "fermetures": deaths[keep].astype(np.int64),
+        "censures": (exits - deaths)[keep].astype(np.int64),
+        "survie": surv[keep], "ic_bas": low[keep], "ic_haut": high[keep],
+    })
+
+
+def cohort_kaplan_meier(index: EventIndex, sirens, year: int, strata: pd.Series = None) -> pd.DataFrame:
+    """
+    Courbes de survie de la cohorte `year` (unités actives au 31/12/year), par
+    modalité de `strata` (alignée sur `sirens` ; NaN = hors strate).
+    """
+    sirens = np.asarray(sirens, dtype=np.uint32)
+    origin = reference_dates(np.full(len(sirens), year), 0)
+    at_risk = state_at(index, sirens, origin) == ETAT_CODES["A"]
+    if strata is None:
+        codes, labels = np.zeros(len(sirens), dtype=np.int64), pd.Index(["Ensemble"])
+    else:
+        cat = pd.Categorical(strata)
+        codes, labels = cat.codes.astype(np.int64), cat.categories
+        at_risk &= codes >= 0
+    days, closed = closure_durations(index, sirens[at_risk], origin[at_risk])
+    months = np.floor(np.maximum(days, 0) / _DAYS_PER_MONTH).astype(np.int64)
+    out = kaplan_meier(months, closed, codes[at_risk], n_strata=max(len(labels), 1))
+    out["strate"] = pd.Categorical.from_codes(out["strate"], categories=labels)
+    return out